@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("albums", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="album",
+            name="version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,15 +1,15 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.db import models, transaction
-from editions.models import Sticker
+from django.db.models import Exists, OuterRef, Prefetch, prefetch_related_objects
 from datetime import date
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
-from editions.models import Edition, Pack, Sticker
-from collection_manager.models import Collection
+from editions.models import Edition, EditionStats, Pack, Sticker
+from collection_manager.models import Collection, Coordinate
 
 from collection_manager.models import StandardPrize
 
-
 User = get_user_model()
 
 
@@ -18,6 +18,11 @@ class Album(models.Model):
     collection = models.ForeignKey(
         Collection, on_delete=models.CASCADE, related_name="albums"
     )
+    # bumped by every change to what AlbumSerializer shows, see bump_version
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    # seconds the version and the serialized snapshots stay cached
+    SNAPSHOT_TIMEOUT = 300
 
     def __str__(self):
         return f"Álbum {self.collection}"
@@ -26,6 +31,85 @@ class Album(models.Model):
         verbose_name_plural = "Albums"
         unique_together = ("collector", "collection")
 
+    @staticmethod
+    def version_key(collector_id, collection_id):
+        return f"album_version_{collector_id}_{collection_id}"
+
+    @staticmethod
+    def snapshot_key(album_id, version):
+        return f"album_{album_id}_v{version}_snapshot"
+
+    @classmethod
+    def bump_version(cls, collector_id, collection_id):
+        """
+        Increments the version of an album inside the caller's transaction
+        and writes it through to the cache once it commits, so snapshots of
+        older versions are not served again.
+        """
+        albums = cls.objects.filter(
+            collector_id=collector_id, collection_id=collection_id
+        )
+
+        if not albums.update(version=models.F("version") + 1):
+            return
+
+        current = albums.values_list("id", "version").get()
+        transaction.on_commit(
+            lambda: cache.set(
+                cls.version_key(collector_id, collection_id),
+                current,
+                cls.SNAPSHOT_TIMEOUT,
+            )
+        )
+
+    @classmethod
+    def bump_versions(cls, collector_ids, collection_id):
+        """
+        bump_version for the albums of many collectors in a collection, with
+        one update and one read whatever their number. collector_ids may be
+        a queryset of ids.
+        """
+        albums = cls.objects.filter(
+            collector_id__in=collector_ids, collection_id=collection_id
+        )
+
+        if not albums.update(version=models.F("version") + 1):
+            return
+
+        current = {
+            cls.version_key(collector_id, collection_id): (album_id, version)
+            for collector_id, album_id, version in albums.values_list(
+                "collector_id", "id", "version"
+            )
+        }
+        transaction.on_commit(lambda: cache.set_many(current, cls.SNAPSHOT_TIMEOUT))
+
+    @classmethod
+    def current_version(cls, collector_id, collection_id):
+        """
+        (album id, version) of an album from the cache, or from the database
+        when it is not cached, None if the collector has no such album.
+        """
+        key = cls.version_key(collector_id, collection_id)
+        current = cache.get(key)
+
+        if current is None:
+            current = (
+                cls.objects.filter(
+                    collector_id=collector_id, collection_id=collection_id
+                )
+                .values_list("id", "version")
+                .first()
+            )
+
+            if current is None:
+                return None
+
+            # add, a version written through meanwhile is newer
+            cache.add(key, current, cls.SNAPSHOT_TIMEOUT)
+
+        return tuple(current)
+
     @property
     def image(self):
         return self.collection.album_template.image
@@ -42,41 +126,169 @@ class Album(models.Model):
 
     @transaction.atomic
     def save(self, *args, **kwargs):
+        adding = self._state.adding
         super(Album, self).save(*args, **kwargs)
-        self.create_pages()
-        self.number_slots()
 
-    def create_pages(self):
-        pages = self.collection.album_template.layout.PAGES
-        counter = 1
+        if adding:
+            Album.create_pages([self], self.collection)
 
-        while counter <= pages:
-            Page.objects.create(album=self, number=counter)
-            counter += 1
+    @classmethod
+    def create_pages(cls, albums, collection):
+        """
+        Builds the pages and slots of saved albums of a collection in memory,
+        slot numbers and images resolved from one coordinate query, and
+        inserts them with one bulk insert for pages and one for slots.
+        """
+        template = collection.album_template
+        layout = template.layout
+        images = dict(
+            template.coordinates.filter(absolute_number__gt=0).values_list(
+                "absolute_number", "image"
+            )
+        )
+        missing = set(range(1, layout.PAGES * layout.SLOTS_PER_PAGE + 1)) - set(images)
 
-    def number_slots(self):
-        slots = Slot.objects.filter(page__album=self).order_by("id")
-        counter = 1
+        if missing:
+            raise Coordinate.DoesNotExist(
+                f"La plantilla no tiene las barajitas nº {', '.join(map(str, sorted(missing)))}"
+            )
+
+        pages = Page.objects.bulk_create(
+            Page(album=album, number=number)
+            for album in albums
+            for number in range(1, layout.PAGES + 1)
+        )
+        slots = []
+
+        for page in pages:
+            for number in range(1, layout.SLOTS_PER_PAGE + 1):
+                absolute_number = (page.number - 1) * layout.SLOTS_PER_PAGE + number
+                slots.append(
+                    Slot(
+                        page=page,
+                        number=number,
+                        absolute_number=absolute_number,
+                        image=images[absolute_number],
+                    )
+                )
+
+        Slot.objects.bulk_create(slots, batch_size=Edition.BATCH_SIZE)
+
+    @classmethod
+    @transaction.atomic
+    def provision(cls, collection, collectors):
+        """
+        Creates the missing albums of collectors (users) for a collection,
+        with their pages and slots, returning how many were created.
+        """
+        existing = set(
+            cls.objects.filter(
+                collection=collection, collector__in=collectors
+            ).values_list("collector_id", flat=True)
+        )
+        albums = cls.objects.bulk_create(
+            cls(collector=collector, collection=collection)
+            for collector in collectors
+            if collector.pk not in existing
+        )
+
+        if albums:
+            cls.create_pages(albums, collection)
 
-        for each_slot in slots:
-            coordinate = self.collection.album_template.coordinates.get(
-                absolute_number=counter
+        return len(albums)
+
+    @classmethod
+    def prefetch_for_read(cls, albums):
+        """
+        Loads everything AlbumSerializer reads for albums in a fixed number
+        of queries, whatever their pages, inbox or stickers: pages with their
+        prize and annotated fill and claim flags, slots, and then the sealed
+        packs (with their stickers when they have no packed contents), the
+        stickers on the board and the undiscovered prize stickers of all the
+        albums at once. The last three are set as inbox, board and prized,
+        shaped like pack_inbox, stickers_on_the_board and prized_stickers
+        return them.
+        """
+        albums = list(albums)
+
+        if not albums:
+            return albums
+
+        prefetch_related_objects(
+            albums,
+            "collection__album_template",
+            Prefetch(
+                "pages",
+                queryset=Page.objects.select_related(
+                    "page_prize__prize__collection__album_template"
+                )
+                .annotate(
+                    filled=~Exists(
+                        Slot.objects.filter(page=OuterRef("pk"), sticker__isnull=True)
+                    ),
+                    claimed=Exists(
+                        PagePrize.objects.filter(
+                            page=OuterRef("pk"), claimed_by__isnull=False
+                        )
+                    ),
+                )
+                .prefetch_related("slots"),
+            ),
+        )
+        collectors = {album.collector_id for album in albums}
+        collections = {album.collection_id for album in albums}
+        stickers = Sticker.objects.filter(
+            collector__in=collectors, edition__collection__in=collections
+        ).select_related("edition", "coordinate", "prize__prize")
+        packs = list(
+            Pack.objects.filter(
+                collector__in=collectors,
+                edition__collection__in=collections,
+                is_open=False,
             )
-            each_slot.absolute_number = counter
-            each_slot.image = coordinate.image
-            each_slot.save()
-            counter += 1
+            .select_related("edition")
+            .order_by("pk")
+        )
+        # sealed packs are listed from their contents, only packs without
+        # packed contents need their stickers
+        prefetch_related_objects(
+            [pack for pack in packs if pack.contents is None],
+            Prefetch(
+                "stickers",
+                queryset=Sticker.objects.select_related("coordinate", "prize__prize"),
+            ),
+        )
+        board = stickers.filter(
+            coordinate__absolute_number__gte=1, on_the_board=True
+        ).order_by("coordinate__absolute_number")
+        prized = stickers.filter(
+            coordinate__absolute_number=0, prize__isnull=True, on_the_board=False
+        ).order_by("pk")
+        grouped = {}
+
+        for name, rows in (("inbox", packs), ("board", board), ("prized", prized)):
+            for row in rows:
+                key = (name, row.collector_id, row.edition.collection_id)
+                grouped.setdefault(key, []).append(row)
+
+        for album in albums:
+            key = (album.collector_id, album.collection_id)
+            album.inbox = grouped.get(("inbox", *key)) or None
+            album.board = grouped.get(("board", *key)) or None
+            album.prized = grouped.get(("prized", *key), [])
+
+        return albums
 
     def pack_inbox(self):
         try:
             if Pack.objects.filter(
                 collector=self.collector,
-                box__edition__collection=self.collection,
+                edition__collection=self.collection,
                 is_open=False,
             ).exists():
                 return Pack.objects.filter(
                     collector=self.collector,
-                    box__edition__collection=self.collection,
+                    edition__collection=self.collection,
                     is_open=False,
                 )
             else:
@@ -93,13 +305,13 @@ class Album(models.Model):
 
             if Sticker.objects.filter(
                 collector=self.collector,
-                pack__box__edition__collection=self.collection,
+                edition__collection=self.collection,
                 coordinate__absolute_number__gte=1,
                 on_the_board=True,
             ).exists():
                 return Sticker.objects.filter(
                     collector=self.collector,
-                    pack__box__edition__collection=self.collection,
+                    edition__collection=self.collection,
                     coordinate__absolute_number__gte=1,
                     on_the_board=True,
                 ).order_by("coordinate__absolute_number")
@@ -116,7 +328,7 @@ class Album(models.Model):
 
         query = Sticker.objects.filter(
             collector=self.collector,
-            pack__box__edition__collection=self.collection,
+            edition__collection=self.collection,
             coordinate__absolute_number=0,
             prize__isnull=True,
             on_the_board=False,
@@ -155,6 +367,7 @@ class Page(models.Model):
     class Meta:
         ordering = ["number"]
 
+    @transaction.atomic
     def create_prize(self):
         if hasattr(self, "page_prize"):
             raise ValidationError("Esta página ya tiene un premio asignado")
@@ -163,7 +376,10 @@ class Page(models.Model):
             collection=self.album.collection, page=self.number
         )
 
-        return PagePrize.objects.create(page=self, prize=prize)
+        page_prize = PagePrize.objects.create(page=self, prize=prize)
+        Album.bump_version(self.album.collector_id, self.album.collection_id)
+
+        return page_prize
 
     def create_slots(self):
         slot_list = []
@@ -200,6 +416,8 @@ class Slot(models.Model):
         self.save()
         sticker.on_the_board = False
         sticker.save()
+        EditionStats.increment(sticker.edition_id, stickers_placed=1)
+        Album.bump_version(self.page.album.collector_id, self.page.album.collection_id)
         return True
 
     def _validate_sticker_placement(self, sticker):
@@ -219,11 +437,11 @@ class Slot(models.Model):
 
     @property
     def is_empty(self):
-        return self.sticker is None
+        return self.sticker_id is None
 
     @property
     def status(self):
-        return "filled" if self.sticker else "empty"
+        return "empty" if self.is_empty else "filled"
 
 
 class PagePrize(models.Model):
@@ -244,6 +462,7 @@ class PagePrize(models.Model):
     claimed_date = models.DateField(null=True, blank=True)
     status = models.SmallIntegerField(choices=PAGEPRIZE_STATUS, default=1)
 
+    @transaction.atomic
     def claim(self, user):
         if self.claimed:
             raise ValidationError("Este premio ya ha sido reclamado")
@@ -256,6 +475,7 @@ class PagePrize(models.Model):
         self.claimed_date = date.today()
         self.status = 2
         self.save()
+        Album.bump_version(self.page.album.collector_id, self.page.album.collection_id)
 
     def clean(self):
         if self.page and not self.page.is_full:
@@ -32,24 +32,49 @@ class PagePrizeSerializer(serializers.ModelSerializer):
 class PageSerializer(serializers.ModelSerializer):
     page_prize = PagePrizeSerializer(read_only=True)
     slots = SlotSerializer(many=True, read_only=True)
-    is_full = serializers.BooleanField(read_only=True)
-    prize_was_claimed = serializers.BooleanField(read_only=True)
+    is_full = serializers.SerializerMethodField()
+    prize_was_claimed = serializers.SerializerMethodField()
 
     class Meta:
         model = Page
         fields = ("id", "page_prize", "number", "slots", "is_full", "prize_was_claimed")
 
+    # pages loaded by Album.prefetch_for_read carry both flags annotated
+    def get_is_full(self, obj):
+        if hasattr(obj, "filled"):
+            return obj.filled
+
+        return obj.is_full
+
+    def get_prize_was_claimed(self, obj):
+        if hasattr(obj, "claimed"):
+            return obj.claimed
+
+        return obj.prize_was_claimed.exists()
+
+
+class AlbumListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        albums = data.all() if hasattr(data, "all") else data
+
+        return super().to_representation(Album.prefetch_for_read(albums))
+
 
 class AlbumSerializer(serializers.ModelSerializer):
+    """
+    Reads an album in a fixed number of queries, see Album.prefetch_for_read
+    """
+
     pages = PageSerializer(many=True, read_only=True)
     collector = serializers.PrimaryKeyRelatedField(read_only=True)
-    pack_inbox = PackSerializer(many=True, read_only=True)
-    stickers_on_the_board = StickerSerializer(many=True, read_only=True)
-    prized_stickers = StickerSerializer(many=True, read_only=True)
+    pack_inbox = PackSerializer(source="inbox", many=True, read_only=True)
+    stickers_on_the_board = StickerSerializer(source="board", many=True, read_only=True)
+    prized_stickers = StickerSerializer(source="prized", many=True, read_only=True)
     image = serializers.SerializerMethodField()
 
     class Meta:
         model = Album
+        list_serializer_class = AlbumListSerializer
         fields = (
             "id",
             "collection",
@@ -75,3 +100,9 @@ class AlbumSerializer(serializers.ModelSerializer):
         except Exception as e:
             print(f"Error getting image: {e}")
             return None
+
+    def to_representation(self, instance):
+        if not hasattr(instance, "inbox"):
+            Album.prefetch_for_read([instance])
+
+        return super().to_representation(instance)
@@ -0,0 +1,48 @@
+from celery import shared_task
+import logging
+from django.contrib.auth import get_user_model
+from collection_manager.models import Collection
+from promotions.models import Promotion
+from .models import Album
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+# collectors whose albums are created in one transaction
+PROVISION_BATCH_SIZE = 500
+
+
+@shared_task
+def provision_albums(promotion_id=None):
+    """
+    Creates the albums collectors are still missing for the collections of
+    a promotion, the current one by default, so they are ready when the
+    collections go live. Runs every night from CELERY_BEAT_SCHEDULE and
+    only creates what is missing.
+    """
+    if promotion_id:
+        promotion = Promotion.objects.filter(pk=promotion_id).first()
+    else:
+        promotion = Promotion.objects.get_current()
+
+    if not promotion:
+        logger.info("No promotion to provision albums for")
+        return 0
+
+    collectors = User.objects.filter(baseprofile__collector__isnull=False).order_by(
+        "pk"
+    )
+    created = 0
+
+    for collection in Collection.objects.filter(promotion=promotion).select_related(
+        "album_template"
+    ):
+        last_pk = 0
+
+        while batch := list(collectors.filter(pk__gt=last_pk)[:PROVISION_BATCH_SIZE]):
+            created += Album.provision(collection, batch)
+            last_pk = batch[-1].pk
+
+    logger.info(f"{created} albums provisioned for promotion {promotion.id}")
+
+    return created
@@ -4,6 +4,7 @@ from django.test.utils import override_settings
 import tempfile
 
 from datetime import date
+from django.core.cache import cache
 from django.db import IntegrityError
 from django.core.exceptions import ValidationError
 from django.test import TestCase
@@ -17,7 +18,7 @@ from collection_manager.models import Coordinate, StandardPrize
 from collection_manager.test.factories import CollectionFactory
 from users.test.factories import CollectorFactory, DealerFactory
 
-from ..models import Slot, Page, Pack
+from ..models import Album, Slot, Page, Pack
 from .factories import AlbumFactory
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp()
@@ -55,6 +56,76 @@ class AlbumTestCase(TestCase):
         self.assertIsNone(self.album.stickers_on_the_board(), 0)
         self.assertQuerySetEqual(self.album.prized_stickers(), [])
 
+    def test_slots_are_numbered_from_the_coordinates(self):
+        for slot in Slot.objects.filter(page__album=self.album).select_related("page"):
+            coordinate = self.album.collection.album_template.coordinates.get(
+                absolute_number=slot.absolute_number
+            )
+
+            self.assertEqual(
+                slot.absolute_number, (slot.page.number - 1) * self.slots + slot.number
+            )
+            self.assertEqual(slot.image.name, coordinate.image.name)
+
+    def test_album_creation_queries(self):
+        collector = UserFactory()
+
+        # savepoint, album, coordinates, pages, slots, release
+        with self.assertNumQueries(6):
+            AlbumFactory(collector=collector, collection=self.album.collection)
+
+    def test_provision_creates_missing_albums(self):
+        collectors = [CollectorFactory(user=UserFactory()).user for _ in range(3)]
+        collectors.append(self.album.collector)
+
+        created = Album.provision(self.album.collection, collectors)
+
+        self.assertEqual(created, 3)
+        self.assertEqual(Album.objects.count(), 4)
+        self.assertEqual(Slot.objects.count(), 4 * self.total_slots)
+        self.assertEqual(Album.provision(self.album.collection, collectors), 0)
+
+    def test_bump_version_writes_through_to_the_cache(self):
+        cache.clear()
+        collector_id, collection_id = (
+            self.album.collector_id,
+            self.album.collection_id,
+        )
+
+        self.assertEqual(
+            Album.current_version(collector_id, collection_id), (self.album.id, 0)
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Album.bump_version(collector_id, collection_id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                Album.current_version(collector_id, collection_id),
+                (self.album.id, 1),
+            )
+
+    def test_bump_versions_writes_every_album_through_to_the_cache(self):
+        cache.clear()
+        collection_id = self.album.collection_id
+        other = AlbumFactory(
+            collector=CollectorFactory(user=UserFactory()).user,
+            collection=self.album.collection,
+        )
+        collector_ids = Album.objects.values("collector_id")
+
+        # update, read
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(2):
+                Album.bump_versions(collector_ids, collection_id)
+
+        with self.assertNumQueries(0):
+            for album in (self.album, other):
+                self.assertEqual(
+                    Album.current_version(album.collector_id, collection_id),
+                    (album.id, 1),
+                )
+
     def test_unique_constraint(self):
 
         with self.assertRaises(IntegrityError):
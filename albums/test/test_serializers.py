@@ -10,7 +10,7 @@ from django.test import TestCase
 
 
 from authentication.test.factories import UserFactory
-from editions.models import Pack
+from editions.models import Pack, Sticker
 from editions.test.factories import EditionFactory
 from collection_manager.models import StandardPrize
 from collection_manager.test.factories import CollectionFactory
@@ -88,6 +88,102 @@ class AlbumSerializerTest(APITestCase):
             serializer.data["pack_inbox"][0]["collector"], self.collector.user.id
         )
 
+    def test_query_budget_does_not_grow_with_the_album(self):
+        packs = list(Pack.objects.order_by("id")[:12])
+        Pack.objects.filter(pk__in=[pack.pk for pack in packs]).update(
+            collector=self.collector.user
+        )
+        Pack.open_many(
+            self.collector.user,
+            self.album.collection_id,
+            [pack.pk for pack in packs[:6]],
+        )
+        sticker = Sticker.objects.filter(
+            collector=self.collector.user, on_the_board=True
+        ).first()
+        Slot.objects.get(
+            page__album=self.album, absolute_number=sticker.number
+        ).place_sticker(sticker)
+        # legacy packs list their stickers instead of their contents
+        Pack.objects.filter(pk=packs[6].pk).update(contents=None)
+
+        def serialize():
+            album = Album.objects.select_related("collection__album_template").get(
+                pk=self.album.pk
+            )
+            return AlbumSerializer(instance=album).data
+
+        # album, pages, slots, sealed packs, the stickers of the legacy pack,
+        # contents coordinates, stickers on the board, prize stickers
+        with self.assertNumQueries(8):
+            data = serialize()
+
+        self.assertEqual(len(data["pack_inbox"]), 6)
+        self.assertTrue(data["stickers_on_the_board"])
+        self.assertEqual(
+            [
+                len(pack["stickers"])
+                for pack in data["pack_inbox"]
+                if pack["id"] == packs[6].pk
+            ],
+            [packs[6].stickers.count()],
+        )
+        filled = [
+            slot
+            for page in data["pages"]
+            for slot in page["slots"]
+            if not slot["is_empty"]
+        ]
+        self.assertEqual([slot["absolute_number"] for slot in filled], [sticker.number])
+
+        # sealed packs with packed contents do not read their stickers
+        Pack.objects.filter(pk=packs[6].pk).update(
+            contents=Pack.encode_contents(
+                packs[6]
+                .stickers.order_by("ordinal")
+                .values_list("coordinate__absolute_number", flat=True)
+            )
+        )
+
+        with self.assertNumQueries(7):
+            data = serialize()
+
+        self.assertEqual(len(data["pack_inbox"]), 6)
+        self.assertEqual(
+            {len(pack["contents"]) for pack in data["pack_inbox"]},
+            {packs[6].stickers.count()},
+        )
+
+        Pack.open_many(self.collector.user, self.album.collection_id)
+
+        with self.assertNumQueries(6):
+            data = serialize()
+
+        self.assertIsNone(data["pack_inbox"])
+
+    def test_list_query_budget_does_not_grow_with_albums(self):
+        albums = [self.album]
+
+        for _ in range(3):
+            albums.append(
+                Album.objects.create(
+                    collector=CollectorFactory(user=UserFactory()).user,
+                    collection=self.album.collection,
+                )
+            )
+
+        # albums, pages, slots, sealed packs, stickers on the board, prize
+        # stickers
+        with self.assertNumQueries(6):
+            data = AlbumSerializer(
+                Album.objects.select_related("collection__album_template").filter(
+                    pk__in=[album.pk for album in albums]
+                ),
+                many=True,
+            ).data
+
+        self.assertEqual(len(data), 4)
+
     def test_collector_serialization(self):
         serializer = AlbumSerializer(instance=self.album)
         self.assertEqual(serializer.data["collector"], self.collector.user.id)
@@ -0,0 +1,66 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from authentication.test.factories import UserFactory
+from collection_manager.test.factories import CollectionFactory
+from promotions.test.factories import PromotionFactory
+from users.test.factories import CollectorFactory
+from ..models import Album, Slot
+from ..tasks import provision_albums
+from .factories import AlbumFactory
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ProvisionAlbumsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.promotion = PromotionFactory()
+        cls.collections = [
+            CollectionFactory(
+                album_template__name=name, album_template__with_coordinate_images=True
+            )
+            for name in ("Minecraft", "Fortnite")
+        ]
+        cls.collectors = [CollectorFactory(user=UserFactory()).user for _ in range(3)]
+        cls.basic_user = UserFactory()
+        AlbumFactory(collector=cls.collectors[0], collection=cls.collections[0])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_every_collector_gets_an_album_per_collection(self):
+        self.assertEqual(provision_albums(), 5)
+
+        for collection in self.collections:
+            self.assertEqual(
+                set(
+                    Album.objects.filter(collection=collection).values_list(
+                        "collector", flat=True
+                    )
+                ),
+                {collector.pk for collector in self.collectors},
+            )
+
+        layout = self.collections[0].album_template.layout
+        self.assertEqual(Slot.objects.count(), 6 * layout.PAGES * layout.SLOTS_PER_PAGE)
+        self.assertFalse(Album.objects.filter(collector=self.basic_user).exists())
+
+    def test_provisioning_is_scheduled(self):
+        self.assertIn(
+            provision_albums.name,
+            {entry["task"] for entry in settings.CELERY_BEAT_SCHEDULE.values()},
+        )
+
+    def test_provisioning_again_creates_nothing(self):
+        provision_albums(self.promotion.pk)
+
+        self.assertEqual(provision_albums(self.promotion.pk), 0)
+        self.assertEqual(Album.objects.count(), 6)
@@ -5,8 +5,10 @@ import tempfile
 
 from rest_framework.test import APIRequestFactory, force_authenticate
 from albums.views import RescuePoolView
-from django.db import IntegrityError, models
+from django.db import IntegrityError, connection, models
 from unittest.mock import patch
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status, mixins
@@ -53,6 +55,8 @@ class UserAlbumListRetrieveViewAPITestCase(APITestCase):
         super().tearDownClass()
 
     def setUp(self):
+        # cached snapshots outlive the rows each test rolls back
+        cache.clear()
         self.album = AlbumFactory(
             collector=self.collector.user, collection=self.edition.collection
         )
@@ -653,6 +657,101 @@ class UserAlbumListRetrieveViewAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class AlbumSnapshotViewTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client = APIClient()
+        PromotionFactory()
+        cls.collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+        cls.edition = EditionFactory(collection=cls.collection)
+        cls.collector = CollectorFactory(user=UserFactory())
+        cls.pack = Pack.objects.order_by("id").first()
+        cls.pack.collector = cls.collector.user
+        cls.pack.save()
+        cls.url = reverse(
+            "user-albums-retrieve", kwargs={"collection_id": cls.collection.id}
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.album = AlbumFactory(
+            collector=self.collector.user, collection=self.collection
+        )
+        self.client.force_authenticate(user=self.collector.user)
+
+    def test_unchanged_album_is_not_modified(self):
+        response = self.client.get(self.url)
+        etag = response.headers["ETag"]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.headers["ETag"], etag)
+
+    def test_repeat_polls_do_not_build_the_album(self):
+        first = self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as context:
+            second = self.client.get(self.url)
+
+        self.assertEqual(second.data, first.data)
+        self.assertFalse(
+            [
+                query
+                for query in context.captured_queries
+                if "albums_" in query["sql"] or "editions_" in query["sql"]
+            ]
+        )
+
+    def test_changes_bump_the_version(self):
+        etag = self.client.get(self.url).headers["ETag"]
+
+        # the version reaches the cache once the change commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("open-pack", kwargs={"pk": self.pack.pk}))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertIsNone(response.data["pack_inbox"])
+        self.assertTrue(response.data["stickers_on_the_board"])
+
+        sticker = Sticker.objects.filter(
+            collector=self.collector.user, on_the_board=True
+        ).first()
+        slot = Slot.objects.get(page__album=self.album, absolute_number=sticker.number)
+        etag = response.headers["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("place-sticker", kwargs={"sticker_id": sticker.id}),
+                {"slot_id": slot.id},
+            )
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            [
+                each_slot
+                for page in response.data["pages"]
+                for each_slot in page["slots"]
+                if each_slot["id"] == slot.id
+            ][0]["is_empty"]
+        )
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class UserAlbumCreateViewAPITestCase(APITestCase):
     @classmethod
@@ -1102,7 +1201,16 @@ class OpenPackViewTest(APITestCase):
         cls.superuser = UserFactory(is_superuser=True)
         cls.basic_user = UserFactory()
         cls.collector = CollectorFactory(user=UserFactory())
-        cls.pack = Pack.objects.first()
+        # repeated copies within a pack stay off the board, the layout is random
+        cls.pack = (
+            Pack.objects.annotate(
+                copies=models.Count("stickers"),
+                coordinates=models.Count("stickers__coordinate", distinct=True),
+            )
+            .filter(copies=models.F("coordinates"))
+            .order_by("pk")
+            .first()
+        )
         cls.pack.collector = cls.collector.user
         cls.pack.save()
         cls.url = reverse("open-pack", kwargs={"pk": cls.pack.pk})
@@ -1191,6 +1299,126 @@ class OpenPackViewTest(APITestCase):
         self.assertEqual(response.data["detail"], 'Método "GET" no permitido.')
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class OpenPacksViewTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client = APIClient()
+        PromotionFactory()
+        cls.collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+        cls.edition = EditionFactory(collection=cls.collection)
+        cls.collector = CollectorFactory(user=UserFactory())
+        cls.packs = list(Pack.objects.order_by("id")[:6])
+        Pack.objects.filter(pk__in=[pack.pk for pack in cls.packs]).update(
+            collector=cls.collector.user
+        )
+        cls.url = reverse("open-packs")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.collector.user)
+
+    def test_open_every_sealed_pack(self):
+        response = self.client.post(
+            self.url, {"collection": self.collection.id}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [pack["id"] for pack in response.data],
+            list(
+                Pack.objects.filter(collector=self.collector.user)
+                .order_by("box_id", "ordinal")
+                .values_list("id", flat=True)
+            ),
+        )
+        self.assertFalse(
+            Pack.objects.filter(collector=self.collector.user, is_open=False).exists()
+        )
+        self.assertEqual(
+            sum(len(pack["stickers"]) for pack in response.data),
+            Sticker.objects.filter(collector=self.collector.user).count(),
+        )
+
+        stickers = Sticker.objects.filter(
+            collector=self.collector.user, coordinate__absolute_number__gt=0
+        )
+        # one copy of each coordinate goes to the board, the rest are repeated
+        self.assertEqual(
+            stickers.filter(on_the_board=True).count(),
+            stickers.values("coordinate").distinct().count(),
+        )
+
+    def test_open_the_given_packs(self):
+        response = self.client.post(
+            self.url,
+            {"collection": self.collection.id, "packs": [self.packs[0].id]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([pack["id"] for pack in response.data], [self.packs[0].id])
+        self.assertEqual(
+            Pack.objects.filter(collector=self.collector.user, is_open=True).count(),
+            1,
+        )
+
+    def test_queries_do_not_grow_with_packs(self):
+        queries = []
+
+        for packs in (self.packs[:1], self.packs[1:2], self.packs[2:]):
+            with CaptureQueriesContext(connection) as context:
+                self.client.post(
+                    self.url,
+                    {
+                        "collection": self.collection.id,
+                        "packs": [pack.id for pack in packs],
+                    },
+                    format="json",
+                )
+
+            queries.append(len(context))
+
+        # the first request also loads the collector profile
+        self.assertEqual(queries[1], queries[2])
+
+    def test_nothing_to_open(self):
+        Pack.objects.filter(collector=self.collector.user).update(is_open=True)
+        response = self.client.post(
+            self.url, {"collection": self.collection.id}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            response.data["detail"],
+            "No hay sobres cerrados que abrir en esta colección",
+        )
+
+    def test_invalid_payload(self):
+        for data in ({}, {"collection": "x"}, {"collection": 1, "packs": "1,2"}):
+            response = self.client.post(self.url, data, format="json")
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_someone_else_packs_are_not_opened(self):
+        other_collector = CollectorFactory(user=UserFactory())
+        self.client.force_authenticate(user=other_collector.user)
+        response = self.client.post(
+            self.url,
+            {"collection": self.collection.id, "packs": [self.packs[0].id]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Pack.objects.filter(is_open=True).exists())
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PlaceStickerViewTest(APITestCase):
     @classmethod
@@ -4,6 +4,7 @@ from .views import (
     UserAlbumCreateView,
     AlbumDetailView,
     OpenPackView,
+    OpenPacksView,
     PlaceStickerView,
     DiscoverStickerPrizeView,
     CreatePagePrizeView,
@@ -11,7 +12,6 @@ from .views import (
     RescuePoolView,
 )
 
-
 urlpatterns = [
     path("user-albums/", UserAlbumListRetrieveView.as_view(), name="user-albums-list"),
     path(
@@ -24,6 +24,7 @@ urlpatterns = [
     ),
     path("albums/<int:pk>/", AlbumDetailView.as_view(), name="album-detail"),
     path("packs/<int:pk>/open/", OpenPackView.as_view(), name="open-pack"),
+    path("packs/open/", OpenPacksView.as_view(), name="open-packs"),
     path(
         "stickers/<int:sticker_id>/place/",
         PlaceStickerView.as_view(),
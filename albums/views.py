@@ -1,15 +1,16 @@
+from django.core.cache import cache
 from django.db import transaction
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import IntegrityError
-from django.db.models import Min
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils.http import parse_etags, quote_etag
 from rest_framework.exceptions import NotFound, ValidationError
-from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.generics import GenericAPIView, RetrieveAPIView, ListAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status, mixins
 from collection_manager.models import Collection
-from editions.models import Pack, Sticker
+from editions.models import Ownership, Pack, Sticker
 from editions.serializers import (
     PackSerializer,
     StickerPrizeSerializer,
@@ -42,7 +43,9 @@ class UserAlbumListRetrieveView(
     lookup_url_kwarg = lookup_field
 
     def get_queryset(self):
-        return Album.objects.filter(collector=self.request.user)
+        return Album.objects.filter(collector=self.request.user).select_related(
+            "collection__album_template"
+        )
 
     def get(self, request, *args, **kwargs):
         promotion = Promotion.objects.get_current()
@@ -65,10 +68,35 @@ class UserAlbumListRetrieveView(
 
                 raise NotFound("No existe ninguna colección con el id suministrado")
 
-            return self.retrieve(request, *args, **kwargs)
+            return self.retrieve_snapshot(request, *args, **kwargs)
 
         return self.list(request, *args, **kwargs)
 
+    def retrieve_snapshot(self, request, *args, **kwargs):
+        """
+        Serves the album from the snapshot cached for its current version,
+        or 304 when the client already holds it (If-None-Match).
+        """
+        current = Album.current_version(request.user.id, kwargs["collection_id"])
+
+        if current is None:
+            return self.retrieve(request, *args, **kwargs)
+
+        album_id, version = current
+        etag = quote_etag(f"album-{album_id}-{version}")
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        key = Album.snapshot_key(album_id, version)
+        data = cache.get(key)
+
+        if data is None:
+            data = self.get_serializer(self.get_object()).data
+            cache.set(key, data, Album.SNAPSHOT_TIMEOUT)
+
+        return Response(data, headers={"ETag": etag})
+
     def handle_exception(self, exc):
         return Response({"detail": str(exc)}, status=exc.status_code)
 
@@ -144,7 +172,9 @@ class AlbumDetailView(RetrieveAPIView):
     permission_classes = [IsAuthenticatedCollector]
 
     def get_queryset(self):
-        return Album.objects.filter(collector=self.request.user)
+        return Album.objects.filter(collector=self.request.user).select_related(
+            "collection__album_template"
+        )
 
 
 class OpenPackView(APIView):
@@ -168,6 +198,57 @@ class OpenPackView(APIView):
         return Response(serializer.data)
 
 
+class OpenPacksView(APIView):
+    """
+    Abre de una vez los sobres cerrados del coleccionista para una colección.
+    POST /api/packs/open/ => {"collection": id, "packs": [ids]}, packs es
+    opcional y limita la apertura a esos sobres.
+    Permisos - collector autenticado.
+    """
+
+    permission_classes = [IsAuthenticatedCollector]
+
+    def post(self, request):
+        pack_ids = request.data.get("packs")
+
+        try:
+            collection_id = int(request.data["collection"])
+        except (KeyError, TypeError, ValueError):
+            return Response(
+                {"detail": "El campo collection es requerido."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if pack_ids is not None and (
+            not isinstance(pack_ids, list)
+            or not all(isinstance(pk, int) for pk in pack_ids)
+        ):
+            return Response(
+                {"detail": "El campo packs debe ser una lista de ids de sobres."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        packs = Pack.open_many(request.user, collection_id, pack_ids)
+
+        if not packs:
+            return Response(
+                {"detail": "No hay sobres cerrados que abrir en esta colección"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        prefetch_related_objects(
+            packs,
+            Prefetch(
+                "stickers",
+                queryset=Sticker.objects.select_related(
+                    "coordinate", "prize__prize"
+                ).order_by("ordinal"),
+            ),
+        )
+        serializer = PackSerializer(packs, many=True)
+        return Response(serializer.data)
+
+
 class PlaceStickerView(APIView):
     permission_classes = [IsAuthenticatedCollector]
 
@@ -317,11 +398,7 @@ class RescuePoolView(ListAPIView):
 
         user = self.request.user
 
-        user_coordinates = set(
-            user.stickers.filter(pack__box__edition__collection=collection).values_list(
-                "coordinate", flat=True
-            )
-        )
+        user_coordinates = set(Ownership.counts(user, collection.id))
 
         with transaction.atomic():
             collector_profile = Collector.objects.select_for_update().get(user=user)
@@ -333,24 +410,22 @@ class RescuePoolView(ListAPIView):
             distinct_coordinates = (
                 Sticker.objects.filter(
                     is_repeated=True,
-                    pack__box__edition__collection=collection,
+                    edition__collection=collection,
                 )
                 .exclude(collector=user)
+                .exclude(coordinate__in=user_coordinates)
                 .values_list("coordinate", flat=True)
                 .distinct()
             )
 
             for coordinate in distinct_coordinates:
-                if coordinate in user_coordinates:
-                    continue  # Skip if user already has this coordinate
-
                 # Get the first sticker with this coordinate
                 sticker = (
                     Sticker.objects.select_for_update()
                     .filter(
                         coordinate=coordinate,
                         is_repeated=True,
-                        pack__box__edition__collection=collection,
+                        edition__collection=collection,
                     )
                     .exclude(collector=user)
                     .first()
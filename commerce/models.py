@@ -13,12 +13,12 @@ from django.db.models.signals import post_delete
 from django.db.models import Q
 from django.utils import timezone
 
+from albums.models import Album
 from users.models import Collector
 from collection_manager.models import Collection
-from editions.models import Edition, Box, Pack
+from editions.models import Edition, EditionStats, Box, Pack
 from promotions.models import Promotion
 
-
 User = get_user_model()
 
 
@@ -51,7 +51,7 @@ class Sale(models.Model):
     def get_available_packs(self):
         return Pack.objects.filter(
             sale__isnull=True,
-            box__edition__collection=self.collection,
+            edition__collection=self.collection,
             box__order__dealer=self.dealer,
         ).order_by("ordinal")
 
@@ -90,6 +90,18 @@ class Sale(models.Model):
             pack.is_open = False
 
         Pack.objects.bulk_update(available_packs, fields=["collector", "is_open"])
+
+        sold_per_edition = {}
+        for pack in available_packs:
+            sold_per_edition[pack.edition_id] = (
+                sold_per_edition.get(pack.edition_id, 0) + 1
+            )
+
+        for edition_id, sold in sold_per_edition.items():
+            EditionStats.increment(edition_id, packs_sold=sold)
+
+        # the packs show up in the collector's album inbox
+        Album.bump_version(self.collector_id, self.collection_id)
         collector = self.collector.baseprofile.collector
         collector.rescue_tickets += self.quantity
         collector.save(update_fields=["rescue_tickets"])
@@ -169,10 +181,15 @@ class Order(models.Model):
 
     @transaction.atomic
     def save(self, *args, **kwargs):
-        if not self.pk:
+        is_new = not self.pk
+
+        if is_new:
             self.full_clean()
         super(Order, self).save(*args, **kwargs)
 
+        if is_new and self.box_id:
+            EditionStats.increment(self.box.edition_id, boxes_ordered=1)
+
     @classmethod
     def create(cls, **kwargs):
         # Asegurarse de que 'box' no está en los datos, incluso si alguien intenta incluirlo
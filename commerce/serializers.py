@@ -151,7 +151,7 @@ class SaleSerializer(serializers.ModelSerializer):
         available_packs = (
             Pack.objects.filter(
                 sale__isnull=True,
-                box__edition__collection=data["collection"],
+                edition__collection=data["collection"],
                 box__order__dealer=dealer,
             )
             .order_by("ordinal")
@@ -13,7 +13,7 @@ from django.utils import timezone
 from authentication.test.factories import UserFactory
 from collection_manager.test.factories import CollectionFactory
 from collection_manager.models import Collection
-from editions.models import Edition
+from editions.models import Edition, EditionStats
 from editions.test.factories import EditionFactory
 from promotions.test.factories import PromotionFactory
 from users.test.factories import DealerFactory, CollectorFactory
@@ -47,11 +47,13 @@ class SaleTestCase(TestCase):
         cls.order = OrderFactory(
             dealer=cls.dealer.user, collection=cls.edition.collection
         )
-        cls.sale = SaleFactory(
-            collection=cls.edition.collection,
-            dealer=cls.dealer.user,
-            collector=cls.collector.user,
-        )
+        # stats are incremented once the sale commits
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.sale = SaleFactory(
+                collection=cls.edition.collection,
+                dealer=cls.dealer.user,
+                collector=cls.collector.user,
+            )
         cls.collector.refresh_from_db()
 
     @classmethod
@@ -78,6 +80,9 @@ class SaleTestCase(TestCase):
 
         self.assertEqual(self.collector.rescue_tickets, 1)
 
+    def test_sale_increments_stats(self):
+        self.assertEqual(EditionStats.objects.get(edition=self.edition).packs_sold, 1)
+
     def test_validation_not_raised(self):
         self.sale.clean()
 
@@ -134,6 +139,9 @@ class OrderTestCase(TestCase):
         self.assertEqual(order.pack_cost, 1.5)
         self.assertEqual(order.__str__(), f"{order.id} / {order.date}")
         self.assertEqual(order.amount, amount)
+        self.assertEqual(
+            EditionStats.objects.get(edition=self.edition).boxes_ordered, 1
+        )
 
     def test_create_order_without_current_promotion(self):
         self.promotion.delete()
@@ -1,6 +1,277 @@
-from django.contrib import admin
+import json
+
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from django.utils.html import format_html
-from .models import Edition, Box, Pack, Sticker, StickerPrize
+from collection_manager.models import Coordinate
+from .models import (
+    Edition,
+    EditionGeneration,
+    EditionStats,
+    Box,
+    Pack,
+    Sticker,
+    StickerPrize,
+)
+from .tasks import generate_edition
+
+# query string parameter holding the last id of the previous keyset page
+AFTER_VAR = "after"
+
+
+def estimate_count(queryset):
+    """
+    Rows of queryset as estimated by PostgreSQL: the table statistics when
+    it is not filtered, the query plan otherwise. None on other databases.
+    """
+    connection = connections[queryset.db]
+
+    if connection.vendor != "postgresql":
+        return None
+
+    if not queryset.query.where:
+        table = queryset.model._meta.db_table
+
+        # a partitioned table keeps its statistics in the partitions
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT sum(greatest(reltuples, 0)) FROM pg_class "
+                "WHERE oid = to_regclass(%s) OR oid IN (SELECT inhrelid "
+                "FROM pg_inherits WHERE inhparent = to_regclass(%s))",
+                [table, table],
+            )
+            return int(cursor.fetchone()[0] or 0)
+
+    plan = json.loads(queryset.explain(format="json"))
+
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts huge tables from the PostgreSQL estimates instead of a COUNT(*)
+    over millions of rows, once they are above ESTIMATE_THRESHOLD.
+    """
+
+    ESTIMATE_THRESHOLD = 100000
+
+    @cached_property
+    def estimated(self):
+        estimate = estimate_count(self.object_list)
+
+        if estimate is None or estimate < self.ESTIMATE_THRESHOLD:
+            return None
+
+        return estimate
+
+    @cached_property
+    def count(self):
+        if self.estimated is not None:
+            return self.estimated
+
+        return super().count
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Pages a list ordered by id with WHERE id > last id of the previous page
+    instead of OFFSET, so every page costs the same as the first. Any other
+    ordering is paginated as usual.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.after = request.GET.get(AFTER_VAR)
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # filter, search and ordering links start again from the first page
+        return super().get_query_string(new_params, [*(remove or []), AFTER_VAR])
+
+    def get_results(self, request):
+        order_by = self.queryset.query.order_by
+        self.keyset = bool(order_by) and all(
+            field in ("id", "pk") for field in order_by
+        )
+
+        if not self.keyset:
+            return super().get_results(request)
+
+        paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        queryset = self.queryset
+
+        if self.after is not None:
+            try:
+                queryset = queryset.filter(pk__gt=int(self.after))
+            except ValueError:
+                raise IncorrectLookupParameters
+
+        page = list(queryset[: self.list_per_page + 1])
+        self.result_list = page[: self.list_per_page]
+        self.next_page_url = None
+        self.first_page_url = None
+
+        if len(page) > self.list_per_page:
+            self.next_page_url = self.get_query_string(
+                {AFTER_VAR: self.result_list[-1].pk}
+            )
+
+        if self.after is not None:
+            self.first_page_url = self.get_query_string()
+
+        self.result_count = paginator.count
+        self.result_count_estimated = getattr(paginator, "estimated", None) is not None
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = False
+        self.paginator = paginator
+
+
+class HugeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist for tables with millions of rows: estimated counts, keyset
+    pagination by id and no full result count.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = "admin/editions/keyset_change_list.html"
+    ordering = ("id",)
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def has_add_permission(self, request):
+        return False
+
+
+class InputFilter(admin.SimpleListFilter):
+    """
+    Filter typed as a value, for fields with too many distinct values to
+    list every one of them as a choice.
+    """
+
+    template = "admin/editions/input_filter.html"
+    placeholder = ""
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            "selected": self.value() is None,
+            "query_string": changelist.get_query_string(remove=[self.parameter_name]),
+            "display": "All",
+            "parameter_name": self.parameter_name,
+            "value": self.value(),
+            "placeholder": self.placeholder,
+            # the other filters, kept when this one is submitted
+            "hidden_params": [
+                (name, value)
+                for name, value in changelist.params.items()
+                if name not in (self.parameter_name, AFTER_VAR)
+            ],
+        }
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+
+        try:
+            return queryset.filter(**self.get_lookups(self.value().strip()))
+        except ValueError:
+            raise IncorrectLookupParameters
+
+    def get_lookups(self, value):
+        """Filter kwargs for the value typed, overridden by every filter"""
+        return {}
+
+
+class CollectorFilter(InputFilter):
+    title = "collector"
+    parameter_name = "collector"
+    placeholder = "Email or id"
+
+    def get_lookups(self, value):
+        if value.isdigit():
+            return {"collector_id": int(value)}
+
+        return {"collector__email": value}
+
+
+class RangeFilter(InputFilter):
+    """Filters field_path by a number or an inclusive range, as in 10-20"""
+
+    placeholder = "10 or 10-20"
+    field_path = None
+
+    def get_lookups(self, value):
+        low, _, high = value.partition("-")
+
+        return {f"{self.field_path}__range": (int(low), int(high or low))}
+
+
+class BoxOrdinalFilter(RangeFilter):
+    title = "box ordinal"
+    parameter_name = "box_ordinal"
+    field_path = "box__ordinal"
+
+
+class OrdinalFilter(RangeFilter):
+    title = "ordinal"
+    parameter_name = "ordinal"
+    field_path = "ordinal"
+
+
+class StickerBoxOrdinalFilter(BoxOrdinalFilter):
+    field_path = "pack__box__ordinal"
+
+
+class RarityFilter(admin.SimpleListFilter):
+    """Rarities read from the coordinates, not from distinct sticker rows"""
+
+    title = "rarity"
+    parameter_name = "rarity"
+
+    def lookups(self, request, model_admin):
+        rarities = (
+            Coordinate.objects.order_by("rarity_factor")
+            .values_list("rarity_factor", flat=True)
+            .distinct()
+        )
+
+        return [(str(rarity), str(rarity)) for rarity in rarities]
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+
+        return queryset.filter(coordinate__rarity_factor=self.value())
+
+
+class SaleFilter(InputFilter):
+    title = "sale"
+    parameter_name = "sale"
+    placeholder = "Sale id"
+
+    def get_lookups(self, value):
+        return {"sale__sale_id": int(value)}
 
 
 @admin.register(Edition)
@@ -9,13 +280,28 @@ class EditionAdmin(admin.ModelAdmin):
         "collection",
         "id",
         "circulation",
+        "generation_status",
+        "packs_sold",
+        "packs_opened",
         "distribution_status",
     )
-    readonly_fields = ["distribution_stats", "validation_details"]
+    list_select_related = (
+        "collection__album_template",
+        "collection__promotion",
+        "generation",
+        "stats",
+    )
+    readonly_fields = [
+        "generation_progress",
+        "distribution_stats",
+        "validation_details",
+    ]
+    actions = ["resume_generation"]
     list_filter = ("collection",)
-    search_fields = ["collection__name", "promotion__name"]
+    search_fields = ["=id", "collection__album_template__name"]
     fieldsets = (
-        (None, {"fields": ("collection", "circulation")}),
+        (None, {"fields": ("collection", "circulation", "is_virtual")}),
+        ("Generation", {"fields": ("generation_progress",)}),
         (
             "Distribution Information",
             {
@@ -25,9 +311,90 @@ class EditionAdmin(admin.ModelAdmin):
         ),
     )
 
+    def save_model(self, request, obj, form, change):
+        # generation runs in a Celery worker, so the request returns at once
+        obj.save(background=True)
+
+    def get_generation(self, obj):
+        try:
+            return obj.generation
+        except EditionGeneration.DoesNotExist:
+            return None
+
+    def generation_status(self, obj):
+        generation = self.get_generation(obj)
+
+        if generation is None:
+            return "-"
+
+        if generation.status == "running":
+            return f"{generation.stage} {generation.progress:.0%}"
+
+        return generation.get_status_display()
+
+    def generation_progress(self, obj):
+        generation = self.get_generation(obj)
+
+        if generation is None:
+            return "-"
+
+        eta = generation.eta_seconds
+
+        return format_html(
+            """
+            <div style="padding: 10px;">
+                <p><strong>Status:</strong> {0}</p>
+                <p><strong>Stage:</strong> {1}</p>
+                <p><strong>Rows:</strong> {2} / {3} ({4:.1%})</p>
+                <p><strong>Rate:</strong> {5:.0f} rows/s</p>
+                <p><strong>ETA:</strong> {6}</p>
+                <p style="color: red;">{7}</p>
+            </div>
+            """,
+            generation.get_status_display(),
+            generation.stage or "-",
+            generation.rows_done,
+            generation.rows_total,
+            generation.progress,
+            generation.rows_per_second,
+            "-" if eta is None else f"{eta}s",
+            generation.error,
+        )
+
+    @admin.action(description="Resume generation from the last checkpoint")
+    def resume_generation(self, request, queryset):
+        generations = EditionGeneration.objects.filter(
+            edition__in=queryset, status__in=["pending", "running", "failed"]
+        )
+
+        for generation in generations:
+            generate_edition.delay(generation.pk)
+
+        self.message_user(
+            request, f"{len(generations)} generations queued", messages.SUCCESS
+        )
+
+    def get_stats(self, obj):
+        try:
+            return obj.stats
+        except EditionStats.DoesNotExist:
+            return None
+
+    def packs_sold(self, obj):
+        stats = self.get_stats(obj)
+        return "-" if stats is None else stats.packs_sold
+
+    def packs_opened(self, obj):
+        stats = self.get_stats(obj)
+        return "-" if stats is None else stats.packs_opened
+
     def distribution_status(self, obj):
-        is_valid, results = obj.validate_distribution()
-        if is_valid:
+        # the changelist reads the count kept by validate_distribution instead
+        # of running the box validators for every row
+        stats = self.get_stats(obj)
+        if stats is None or stats.invalid_boxes is None:
+            return "-"
+        if stats.invalid_boxes == 0:
             return format_html('<span style="color: green;">✓ Valid</span>')
         return format_html('<span style="color: red;">✗ Invalid</span>')
 
@@ -55,51 +422,68 @@ class EditionAdmin(admin.ModelAdmin):
             status = "✓" if passed else "✗"
             color = "green" if passed else "red"
             html.append(f'<p style="color: {color}">{status} {check}</p>')
+
+        violations = obj.get_cached_box_violations()
+        for box_id, box_violations in list(violations.items())[:20]:
+            messages = "; ".join(message for _, message in box_violations)
+            html.append(f'<p style="color: red">Box {box_id}: {messages}</p>')
+
+        if len(violations) > 20:
+            html.append(f"<p>... {len(violations) - 20} more boxes with violations</p>")
         html.append("</div>")
         return format_html("".join(html))
 
+    generation_status.short_description = "Generation"
+    generation_progress.short_description = "Generation Progress"
+    packs_sold.short_description = "Packs Sold"
+    packs_opened.short_description = "Packs Opened"
     distribution_status.short_description = "Status"
     distribution_stats.short_description = "Distribution Statistics"
     validation_details.short_description = "Validation Details"
 
 
 @admin.register(Box)
-class BoxAdmin(admin.ModelAdmin):
+class BoxAdmin(HugeTableAdmin):
     list_display = ("edition", "edition_id", "id", "ordinal")
-    ordering = ("id",)
-    list_filter = ("edition", "ordinal")
-
-    def has_add_permission(self, request):
-        return False
+    list_select_related = (
+        "edition__collection__album_template",
+        "edition__collection__promotion",
+    )
+    list_filter = ("edition", OrdinalFilter)
+    search_fields = ("=id",)
 
 
 @admin.register(Pack)
-class PackAdmin(admin.ModelAdmin):
+class PackAdmin(HugeTableAdmin):
     list_display = (
         "id",
         "box",
         "edition",
         "ordinal",
-        "sale",
         "collector",
         "is_open",
+        "has_prize",
     )
     list_select_related = (
         "box",
-        "box__edition",
+        "edition__collection__album_template",
+        "edition__collection__promotion",
         "collector",
-        "sale",
     )
-    ordering = ("id",)
-    list_filter = ("box", "box__edition", "sale__sale", "collector", "is_open")
-    search_fields = ("box__edition__name",)
-
-    def has_add_permission(self, request):
-        return False
+    list_filter = (
+        "edition",
+        BoxOrdinalFilter,
+        CollectorFilter,
+        SaleFilter,
+        "is_open",
+        "has_prize",
+    )
+    search_fields = ("=id",)
+    autocomplete_fields = ("collector", "edition", "box")
 
 
 @admin.register(Sticker)
-class StickerAdmin(admin.ModelAdmin):
+class StickerAdmin(HugeTableAdmin):
     list_display = (
         "id",
         "number",
@@ -108,19 +492,25 @@ class StickerAdmin(admin.ModelAdmin):
         "pack",
         "collector",
         "on_the_board",
-        "pack__box__edition",
+        "edition",
+    )
+    list_select_related = (
+        "coordinate",
+        "pack",
+        "collector",
+        "edition__collection__album_template",
+        "edition__collection__promotion",
     )
-    ordering = ("id",)
     list_filter = (
-        "pack__box",
-        "coordinate__rarity_factor",
+        "edition",
+        StickerBoxOrdinalFilter,
+        RarityFilter,
         "on_the_board",
-        "collector",
-        "pack__box__edition",
+        CollectorFilter,
     )
-
-    def has_add_permission(self, request):
-        return False
+    search_fields = ("=id",)
+    autocomplete_fields = ("collector", "edition", "pack")
+    raw_id_fields = ("coordinate",)
 
 
 @admin.register(StickerPrize)
@@ -134,3 +524,11 @@ class StickerPrizeAdmin(admin.ModelAdmin):
         "claimed_by",
         "status",
     )
+    list_select_related = (
+        "sticker__coordinate",
+        "sticker__edition__collection__album_template",
+        "sticker__edition__collection__promotion",
+        "prize",
+        "claimed_by",
+    )
+    autocomplete_fields = ("sticker", "claimed_by")
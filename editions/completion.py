@@ -0,0 +1,201 @@
+import numpy as np
+
+from .generation import EditionPlanner
+
+
+class CompletionSimulator:
+    """
+    Monte-Carlo estimate of how many packs collectors open to complete each
+    page and the whole album of a collection.
+
+    A sticker is coordinate c with probability proportional to its printed
+    quota (rarity factor times circulation), drawing with replacement, which
+    holds while the circulation is much larger than what one collector opens.
+    Draws are Poissonized: the first copy of c reaches a collector after an
+    Exponential(p_c) number of stickers, independently per coordinate, so a
+    batch of collectors is one matrix of random draws and completing a set of
+    coordinates is the latest of their arrival times. No collector or pack is
+    simulated one at a time.
+
+    With rescue enabled, every RESCUE_TICKETS packs bought pay for one visit
+    to the rescue pool, where the collector takes the rarest sticker they
+    still miss. A sticker is only in the pool when somebody else has it
+    repeated: the availability of each coordinate is estimated on a pilot
+    batch from the repeats the collectors accumulate against the rescues
+    they ask for, see estimate_availability.
+    """
+
+    # tickets a visit to the rescue pool costs (see albums.views.RescuePoolView),
+    # one ticket is earned per pack bought
+    RESCUE_TICKETS = 3
+    # random draws held in memory at once, batches of collectors are sized
+    # from it and the number of coordinates
+    BATCH_DRAWS = 4_000_000
+    PERCENTILES = (50, 90, 99)
+    AVAILABILITY_ITERATIONS = 20
+
+    def __init__(self, collection, circulation=None, seed=None):
+        self.collection = collection
+        self.layout = collection.album_template.layout
+        self.random = np.random.default_rng(seed)
+        coordinates = list(
+            collection.album_template.coordinates.only(
+                "id", "template", "page", "absolute_number", "rarity_factor"
+            ).order_by("absolute_number")
+        )
+
+        if circulation:
+            from .models import Edition
+
+            edition = Edition(collection=collection, circulation=circulation)
+            quotas = EditionPlanner(edition).get_sticker_limits()
+            weights = [quotas[coordinate.id] for coordinate in coordinates]
+        else:
+            weights = [float(coordinate.rarity_factor) for coordinate in coordinates]
+
+        weights = np.array(weights, dtype=np.float64)
+        # prize stickers take room in packs but have no slot in the album
+        in_album = np.array(
+            [coordinate.absolute_number != 0 for coordinate in coordinates]
+        )
+        never_printed = [
+            coordinate.absolute_number
+            for coordinate, weight in zip(coordinates, weights)
+            if coordinate.absolute_number != 0 and weight <= 0
+        ]
+
+        if never_printed:
+            raise ValueError(
+                "El álbum no se puede completar, no se imprimen las barajitas "
+                f"nº {', '.join(map(str, never_printed))}"
+            )
+
+        self.probabilities = weights[in_album] / weights.sum()
+        self.pages = np.array(
+            [coordinate.page for coordinate in coordinates], dtype=np.int64
+        )[in_album]
+        self.batch_size = max(1, self.BATCH_DRAWS // len(self.probabilities))
+
+    def draw_arrivals(self, collectors):
+        """Sticker count at which each collector gets each coordinate first"""
+        return self.random.exponential(
+            1 / self.probabilities, size=(collectors, len(self.probabilities))
+        )
+
+    def complete(self, arrivals, rescuable=None):
+        """
+        Stickers each collector opens until every column of arrivals is
+        owned. A collector rescues their j-th sticker after buying
+        j * RESCUE_TICKETS packs, taking the latest arriving rescuable one.
+        """
+        if rescuable is None:
+            return arrivals.max(axis=1)
+
+        stickers_per_rescue = self.RESCUE_TICKETS * self.layout.STICKERS_PER_PACK
+        # coordinates nobody can rescue have to be opened
+        opened = np.where(rescuable, -np.inf, arrivals).max(axis=1)
+        rescue_candidates = -np.sort(-np.where(rescuable, arrivals, 0), axis=1)
+        rescue_candidates = np.concatenate(
+            (rescue_candidates, np.zeros((len(arrivals), 1))), axis=1
+        )
+        # after j rescues the collector waits for the (j+1)-th latest arrival
+        rescues = np.arange(rescue_candidates.shape[1])
+        completion = np.maximum(rescue_candidates, rescues * stickers_per_rescue).min(
+            axis=1
+        )
+
+        return np.maximum(completion, opened)
+
+    def estimate_availability(self, arrivals):
+        """
+        Share of the rescue requests for each coordinate the pool can serve.
+        Repeats grow with the stickers collectors open and requests shrink
+        with them, so starting from a full pool the availability is iterated
+        on a pilot batch towards the share where both balance.
+        """
+        availability = np.ones(len(self.probabilities))
+
+        for iteration in range(self.AVAILABILITY_ITERATIONS):
+            rescuable = self.random.random(arrivals.shape) < availability
+            stickers = self.complete(arrivals, rescuable)[:, None]
+            expected = self.probabilities * stickers
+            # repeats are the copies beyond the first, for a Poisson count
+            repeats = (expected - 1 + np.exp(-expected)).sum(axis=0)
+            requests = (arrivals > stickers).sum(axis=0)
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                estimate = np.minimum(
+                    np.where(requests > 0, repeats / requests, 1.0), 1.0
+                )
+
+            # averaged over the iterations, a full step swings between an
+            # empty and a full pool
+            availability += (estimate - availability) / (iteration + 2)
+
+        return availability
+
+    def to_packs(self, stickers):
+        return np.ceil(stickers / self.layout.STICKERS_PER_PACK).astype(np.int64)
+
+    def summarize(self, packs):
+        return {
+            "mean": round(float(packs.mean()), 2),
+            **{
+                f"p{percentile}": int(np.percentile(packs, percentile))
+                for percentile in self.PERCENTILES
+            },
+        }
+
+    def run(self, collectors, rescue=True):
+        """
+        Returns the packs opened to complete each page and the album, as mean
+        and percentiles over the simulated collectors.
+        """
+        pages = np.unique(self.pages)
+        album = []
+        by_page = {page: [] for page in pages.tolist()}
+        availability = None
+        simulated = 0
+
+        while simulated < collectors:
+            batch = min(self.batch_size, collectors - simulated)
+            arrivals = self.draw_arrivals(batch)
+            rescuable = None
+
+            if rescue:
+                if availability is None:
+                    availability = self.estimate_availability(arrivals)
+                rescuable = self.random.random(arrivals.shape) < availability
+
+            album.append(self.to_packs(self.complete(arrivals, rescuable)))
+
+            for page in by_page:
+                columns = self.pages == page
+                by_page[page].append(
+                    self.to_packs(
+                        self.complete(
+                            arrivals[:, columns],
+                            None if rescuable is None else rescuable[:, columns],
+                        )
+                    )
+                )
+
+            simulated += batch
+
+        return {
+            "collectors": collectors,
+            "rescue": rescue,
+            "album": self.summarize(np.concatenate(album)),
+            "pages": {
+                page: self.summarize(np.concatenate(packs))
+                for page, packs in by_page.items()
+            },
+            "rescue_availability": (
+                None
+                if availability is None
+                else {
+                    "min": round(float(availability.min()), 4),
+                    "mean": round(float(availability.mean()), 4),
+                }
+            ),
+        }
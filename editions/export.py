@@ -0,0 +1,163 @@
+import csv
+import gzip
+import io
+
+from itertools import islice
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import Pack, Sticker
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # parquet export is optional
+    pyarrow = None
+
+
+class ManifestExport:
+    """
+    Writes the print manifest of an edition, one row per sticker in box,
+    pack and sticker order, as numbered compressed parts in a storage.
+
+    Rows are read through a server-side cursor (QuerySet.iterator on
+    PostgreSQL) and every CHUNK_ROWS of them are compressed and saved as
+    one part, so memory holds a single chunk whatever the size of the
+    edition. Parts are independent files, gzipped CSV or Parquet, and the
+    default storage puts them on S3 in production.
+
+    The stickers of a virtual edition are not stored, they are derived from
+    the edition seed like when its packs are opened, without sticker ids.
+    """
+
+    FORMATS = ("csv", "parquet")
+    CHUNK_ROWS = 200000
+    COLUMNS = (
+        "box_id",
+        "box_ordinal",
+        "pack_id",
+        "pack_ordinal",
+        "has_prize",
+        "sticker_id",
+        "sticker_ordinal",
+        "page",
+        "slot_number",
+        "absolute_number",
+    )
+
+    def __init__(self, edition, format="csv", storage=None, chunk_rows=None):
+        if format not in self.FORMATS:
+            raise ValueError(f"Unknown manifest format {format}")
+
+        if format == "parquet" and pyarrow is None:
+            raise ValueError("Parquet export requires pyarrow")
+
+        self.edition = edition
+        self.format = format
+        self.storage = storage or default_storage
+        self.chunk_rows = chunk_rows or self.CHUNK_ROWS
+        self.prefix = (
+            f"manifests/edition_{edition.id}/"
+            f"{timezone.now().strftime('%Y%m%d%H%M%S')}"
+        )
+
+    def rows(self):
+        if self.edition.is_virtual:
+            return self.virtual_rows()
+
+        return (
+            Sticker.objects.filter(edition=self.edition, pack__isnull=False)
+            .order_by("pack__box__ordinal", "pack__ordinal", "ordinal")
+            .values_list(
+                "pack__box_id",
+                "pack__box__ordinal",
+                "pack_id",
+                "pack__ordinal",
+                "pack__has_prize",
+                "id",
+                "ordinal",
+                "coordinate__page",
+                "coordinate__slot_number",
+                "coordinate__absolute_number",
+            )
+            .iterator(chunk_size=self.chunk_rows)
+        )
+
+    def virtual_rows(self):
+        from .generation import VirtualEditionPlanner
+
+        planner = VirtualEditionPlanner(self.edition)
+        coordinates = {
+            coordinate.id: (
+                coordinate.page,
+                coordinate.slot_number,
+                coordinate.absolute_number,
+            )
+            for coordinate in self.edition.collection.album_template.coordinates.all()
+        }
+        packs = (
+            Pack.objects.filter(edition=self.edition)
+            .order_by("box__ordinal", "ordinal")
+            .values_list("box_id", "box__ordinal", "id", "ordinal", "has_prize")
+            .iterator(chunk_size=self.chunk_rows)
+        )
+
+        for pack in packs:
+            for coordinate_id, ordinal in planner.pack_stickers(pack[3]):
+                yield (*pack, None, ordinal, *coordinates[coordinate_id])
+
+    def run(self, progress=None):
+        """
+        Writes every part and returns their storage names. progress, when
+        given, is called with each part name and the rows written so far.
+        """
+        names = []
+        rows_done = 0
+        rows = self.rows()
+
+        while chunk := list(islice(rows, self.chunk_rows)):
+            name = self.storage.save(
+                f"{self.prefix}/part-{len(names):05d}.{self.extension}",
+                ContentFile(self.encode(chunk)),
+            )
+            names.append(name)
+            rows_done += len(chunk)
+
+            if progress:
+                progress(name, rows_done)
+
+        return names
+
+    @property
+    def extension(self):
+        return "csv.gz" if self.format == "csv" else "parquet"
+
+    def encode(self, chunk):
+        buffer = io.BytesIO()
+
+        if self.format == "csv":
+            with gzip.GzipFile(fileobj=buffer, mode="wb") as compressed:
+                text = io.TextIOWrapper(compressed, encoding="utf-8", newline="")
+                writer = csv.writer(text)
+                writer.writerow(self.COLUMNS)
+                writer.writerows(chunk)
+                text.flush()
+                text.detach()
+        else:
+            # explicit types, a virtual edition has no sticker ids to infer from
+            schema = pyarrow.schema(
+                (column, pyarrow.bool_() if column == "has_prize" else pyarrow.int64())
+                for column in self.COLUMNS
+            )
+            table = pyarrow.table(
+                {
+                    column: [row[index] for row in chunk]
+                    for index, column in enumerate(self.COLUMNS)
+                },
+                schema=schema,
+            )
+            pyarrow.parquet.write_table(table, buffer, compression="zstd")
+
+        return buffer.getvalue()
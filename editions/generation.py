@@ -0,0 +1,1115 @@
+import logging
+import multiprocessing
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_CEILING, ROUND_DOWN
+from itertools import islice
+
+import numpy as np
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from .loaders import chunked, get_loader
+from .models import Box, Edition, EditionStats, Pack, Sticker
+from .teardown import EditionTeardown
+
+logger = logging.getLogger(__name__)
+
+# keeps edition generation locks apart from any other advisory lock
+GENERATION_LOCK_NAMESPACE = 7301
+
+
+def ceil_div(dividend, divisor):
+    return -(-dividend // divisor)
+
+
+class EditionPlanner:
+    """
+    Computes the complete sticker -> pack -> box layout of an edition in memory
+    and then writes every Box, Pack and Sticker row exactly once, with its
+    final ordinal and foreign keys.
+
+    The planning stages mirror the historical database pipeline (create,
+    shuffle and fill stickers, packs and boxes) so the resulting distribution
+    keeps the same guarantees: rarity quotas per coordinate, at most one prize
+    sticker per pack and two spaced prize packs per box.
+
+    Per-sticker and per-pack data live in NumPy arrays and every shuffle is a
+    vectorized permutation, so planning scales linearly with circulation.
+    Ordinals are applied at insert time. Passing a seed makes the layout
+    reproducible.
+    """
+
+    # planning methods, in the order plan() runs them
+    STAGES = (
+        "create_stickers",
+        "shuffle_stickers",
+        "remove_excess_prize_stickers",
+        "create_packs",
+        "fill_packs",
+        "shuffle_packs",
+        "create_boxes",
+        "fill_boxes",
+        "shuffle_boxes",
+    )
+    # packs examined per vectorized step of fill_packs
+    FILL_BLOCK = 4096
+    # approximate planning memory: per sticker its coordinate, pack index,
+    # prize flag and running prize count; per pack its prize flag, ordinal,
+    # sort order and slot in a box list
+    PLANNER_BYTES_PER_STICKER = 33
+    PLANNER_BYTES_PER_PACK = 60
+
+    def __init__(self, edition, loader=None, seed=None):
+        self.edition = edition
+        self.loader = loader or get_loader()
+        self.random = np.random.default_rng(seed)
+        self.layout = edition.collection.album_template.layout
+        self.coordinates = list(
+            edition.collection.album_template.coordinates.only(
+                "id", "template", "absolute_number", "rarity_factor"
+            ).order_by("id")
+        )
+        self.prize_coordinates = np.array(
+            [
+                coordinate.id
+                for coordinate in self.coordinates
+                if coordinate.absolute_number == 0
+            ],
+            dtype=np.int64,
+        )
+        self.sticker_coordinates = np.empty(0, dtype=np.int64)
+        # pack index of every sticker, -1 while it is not packed
+        self.sticker_packs = np.empty(0, dtype=np.int64)
+        self.pack_count = 0
+        self.pack_has_prize = np.zeros(0, dtype=bool)
+        self.pack_ordinals = np.empty(0, dtype=np.int64)
+        self.box_packs = []
+        self.box_ordinals = np.empty(0, dtype=np.int64)
+        self.removed_prize_stickers = 0
+        self.dropped_prize_stickers = 0
+        self.first_sticker_ordinal = 1
+
+    @property
+    def box_count(self):
+        return len(self.box_packs)
+
+    @property
+    def sticker_count(self):
+        return len(self.sticker_coordinates) - self.dropped_prize_stickers
+
+    def plan(self):
+        for stage in self.STAGES:
+            getattr(self, stage)()
+
+        return self
+
+    def get_sticker_limits(self):
+        """Returns how many stickers are printed for each coordinate"""
+        prize_rarity = self.layout.PRIZE_STICKER_RARITY
+        circulation = Decimal(self.edition.circulation)
+
+        return {
+            coordinate.id: int(
+                (coordinate.rarity_factor * circulation).quantize(
+                    Decimal("1"),
+                    rounding=(
+                        ROUND_CEILING
+                        if coordinate.rarity_factor == prize_rarity
+                        else ROUND_DOWN
+                    ),
+                )
+            )
+            for coordinate in self.coordinates
+        }
+
+    def create_stickers(self):
+        limits = self.get_sticker_limits()
+        self.sticker_coordinates = np.repeat(
+            np.fromiter(limits.keys(), dtype=np.int64, count=len(limits)),
+            np.fromiter(limits.values(), dtype=np.int64, count=len(limits)),
+        )
+
+    def shuffle_stickers(self):
+        """The position of a sticker in the array becomes its final ordinal"""
+        self.random.shuffle(self.sticker_coordinates)
+
+    def get_prize_mask(self):
+        return np.isin(self.sticker_coordinates, self.prize_coordinates)
+
+    def settle_prize_stickers(self, total, prizes):
+        """
+        Returns the prize stickers kept out of prizes, and the packs and boxes
+        of the edition once the excess prize stickers are removed from total.
+        """
+        prize_packs_per_box = self.edition.PRIZE_PACKS_PER_BOX
+        kept_prizes = prizes
+
+        while True:
+            packs = ceil_div(total, self.layout.STICKERS_PER_PACK)
+            boxes = ceil_div(packs, self.layout.PACKS_PER_BOX)
+            excess = kept_prizes - boxes * prize_packs_per_box
+
+            if excess <= 0:
+                return kept_prizes, packs, boxes
+
+            total -= excess
+            kept_prizes -= excess
+
+    def remove_excess_prize_stickers(self):
+        """
+        Keeps at most two prize stickers per box. Removing stickers may shrink
+        the number of packs and boxes, so the count is settled before packing.
+        """
+        prize_positions = np.flatnonzero(self.get_prize_mask())
+        prizes = len(prize_positions)
+        kept_prizes = self.settle_prize_stickers(len(self.sticker_coordinates), prizes)[
+            0
+        ]
+        self.removed_prize_stickers = prizes - kept_prizes
+
+        if not self.removed_prize_stickers:
+            return
+
+        # stickers are already shuffled, so dropping the last prize stickers
+        # of the sequence removes a random subset of them
+        self.sticker_coordinates = np.delete(
+            self.sticker_coordinates, prize_positions[kept_prizes:]
+        )
+
+    def create_packs(self):
+        self.pack_count = ceil_div(
+            len(self.sticker_coordinates), self.layout.STICKERS_PER_PACK
+        )
+        self.pack_has_prize = np.zeros(self.pack_count, dtype=bool)
+
+    def fill_packs(self):
+        """
+        Assigns the shuffled stickers to packs in a single linear pass. A prize
+        sticker that would be the second one in a pack is deferred to the next
+        pack without a prize.
+
+        Runs of packs that hold at most one prize are assigned a block at a
+        time from a running count of prizes; only packs around a conflict are
+        filled sticker by sticker. Memory stays at a few bytes per sticker.
+        """
+        stickers_per_pack = self.layout.STICKERS_PER_PACK
+        is_prize = self.get_prize_mask()
+        total = len(is_prize)
+        prizes_before = np.concatenate(([0], np.cumsum(is_prize, dtype=np.int64)))
+        self.sticker_packs = np.full(total, -1, dtype=np.int64)
+        self.pack_has_prize = np.zeros(self.pack_count, dtype=bool)
+        deferred_prize_stickers = deque()
+        position = 0
+        pack = 0
+
+        while pack < self.pack_count:
+            if not deferred_prize_stickers:
+                block = min(self.FILL_BLOCK, self.pack_count - pack)
+                bounds = np.minimum(
+                    position + stickers_per_pack * np.arange(block + 1), total
+                )
+                prizes = prizes_before[bounds[1:]] - prizes_before[bounds[:-1]]
+                conflicts = np.flatnonzero(prizes > 1)
+                clean = int(conflicts[0]) if len(conflicts) else block
+
+                if clean:
+                    end = int(bounds[clean])
+                    self.sticker_packs[position:end] = pack + (
+                        np.arange(end - position) // stickers_per_pack
+                    )
+                    self.pack_has_prize[pack : pack + clean] = prizes[:clean] > 0
+                    pack += clean
+                    position = end
+                    continue
+
+            position = self._fill_single_pack(
+                pack, position, is_prize, deferred_prize_stickers
+            )
+            pack += 1
+
+        # only possible when the last stickers of the sequence are all prizes
+        self.dropped_prize_stickers = len(deferred_prize_stickers)
+
+    def _fill_single_pack(self, pack, position, is_prize, deferred_prize_stickers):
+        """Fills one pack sticker by sticker, returns the next stream position"""
+        total = len(is_prize)
+        stickers_in_pack = 0
+
+        while stickers_in_pack < self.layout.STICKERS_PER_PACK:
+            if deferred_prize_stickers and not self.pack_has_prize[pack]:
+                sticker = deferred_prize_stickers.popleft()
+            elif position < total:
+                sticker = position
+                position += 1
+            else:
+                break
+
+            if is_prize[sticker]:
+                if self.pack_has_prize[pack]:
+                    deferred_prize_stickers.append(sticker)
+                    continue
+                self.pack_has_prize[pack] = True
+
+            self.sticker_packs[sticker] = pack
+            stickers_in_pack += 1
+
+        return position
+
+    def shuffle_packs(self):
+        self.pack_ordinals = self.random.permutation(self.pack_count) + 1
+
+    def create_boxes(self):
+        self.box_packs = [
+            [] for _ in range(ceil_div(self.pack_count, self.layout.PACKS_PER_BOX))
+        ]
+
+    def _generate_prize_positions(self):
+        """Generate random positions for prize packs with significant spacing."""
+        positions = set()
+
+        while len(positions) < self.edition.PRIZE_PACKS_PER_BOX:
+            pos = int(self.random.integers(1, self.layout.PACKS_PER_BOX))
+            if not any(
+                abs(pos - p) <= self.edition.MIN_PRIZES_POSITON_GAP for p in positions
+            ):
+                positions.add(pos)
+        return sorted(positions)
+
+    def fill_boxes(self):
+        """
+        Distributes packs into boxes in ordinal order, placing prize packs
+        at spaced random positions. The last box can contain fewer packs.
+        """
+        # ordinals of a shard are a subset of the edition ordinals
+        packs_by_ordinal = np.argsort(self.pack_ordinals)
+        is_prize_pack = self.pack_has_prize[packs_by_ordinal]
+
+        prize_packs = deque(packs_by_ordinal[is_prize_pack].tolist())
+        standard_packs = deque(packs_by_ordinal[~is_prize_pack].tolist())
+
+        for box_packs in self.box_packs:
+            prize_positions = self._generate_prize_positions()
+            packs_to_place = min(
+                self.layout.PACKS_PER_BOX, len(standard_packs) + len(prize_packs)
+            )
+
+            for position in range(1, packs_to_place + 1):
+                if position in prize_positions and prize_packs:
+                    box_packs.append(prize_packs.popleft())
+                elif standard_packs:
+                    box_packs.append(standard_packs.popleft())
+                else:
+                    box_packs.append(prize_packs.popleft())
+
+    def shuffle_boxes(self):
+        self.box_ordinals = self.random.permutation(self.box_count) + 1
+
+    def placed_stickers(self):
+        """
+        Returns the coordinate ids and pack indexes of packed stickers, in
+        ordinal order (the ordinal is the position plus one).
+        """
+        placed = self.sticker_packs >= 0
+
+        return self.sticker_coordinates[placed], self.sticker_packs[placed]
+
+    def get_stats(self):
+        """Generation figures of the plan, as EditionStats fields"""
+        rarities = {
+            coordinate.id: str(coordinate.rarity_factor)
+            for coordinate in self.coordinates
+        }
+        coordinates, counts = np.unique(self.placed_stickers()[0], return_counts=True)
+        stickers_by_rarity = {}
+
+        for coordinate, count in zip(coordinates.tolist(), counts.tolist()):
+            rarity = rarities[coordinate]
+            stickers_by_rarity[rarity] = stickers_by_rarity.get(rarity, 0) + count
+
+        return {
+            "boxes": self.box_count,
+            "packs": self.pack_count,
+            "prize_packs": int(self.pack_has_prize.sum()),
+            "stickers": self.sticker_count,
+            "stickers_by_rarity": stickers_by_rarity,
+        }
+
+    def predict(self):
+        """
+        Predicts the figures of plan() from the sticker quotas alone: the
+        prize removal is settled by counting and the rest is arithmetic over
+        the per-coordinate arrays, so any circulation takes milliseconds and
+        no sticker is created. Stickers dropped at the very end of fill_packs
+        (only possible when the last ones are all prizes) are not predicted.
+        """
+        limits = self.get_sticker_limits()
+        printed = np.fromiter(limits.values(), dtype=np.int64, count=len(limits))
+        is_prize = np.isin(
+            np.fromiter(limits.keys(), dtype=np.int64, count=len(limits)),
+            self.prize_coordinates,
+        )
+        printed_prizes = int(printed[is_prize].sum())
+        kept_prizes, packs, boxes = self.settle_prize_stickers(
+            int(printed.sum()), printed_prizes
+        )
+        stickers = int(printed.sum()) - printed_prizes + kept_prizes
+
+        return self.get_prediction(
+            limits,
+            stickers=stickers,
+            prize_stickers=kept_prizes,
+            packs=packs,
+            boxes=boxes,
+            sticker_rows=stickers,
+            planner_bytes=stickers * self.PLANNER_BYTES_PER_STICKER
+            + packs * self.PLANNER_BYTES_PER_PACK,
+        )
+
+    def get_prediction(self, limits, stickers, prize_stickers, packs, boxes, **extra):
+        packs_per_box = self.layout.PACKS_PER_BOX
+        printed_prizes = sum(
+            limits[coordinate] for coordinate in self.prize_coordinates.tolist()
+        )
+        stickers_by_rarity = {}
+
+        for coordinate in self.coordinates:
+            rarity = str(coordinate.rarity_factor)
+            stickers_by_rarity[rarity] = (
+                stickers_by_rarity.get(rarity, 0) + limits[coordinate.id]
+            )
+
+        # every box is full but the last one
+        box_fill = {}
+
+        if boxes:
+            box_fill[packs_per_box] = boxes - 1
+            last_box = packs - (boxes - 1) * packs_per_box
+            box_fill[last_box] = box_fill.get(last_box, 0) + 1
+
+        return {
+            "stickers_per_coordinate": limits,
+            "printed_stickers_by_rarity": stickers_by_rarity,
+            "stickers": stickers,
+            "prize_stickers": prize_stickers,
+            "removed_prize_stickers": printed_prizes - prize_stickers,
+            "packs": packs,
+            "prize_packs": prize_stickers,
+            "boxes": boxes,
+            "box_fill": {size: count for size, count in box_fill.items() if count},
+            "last_pack_stickers": (
+                stickers - (packs - 1) * self.layout.STICKERS_PER_PACK if packs else 0
+            ),
+            **extra,
+        }
+
+    def box_rows(self):
+        edition_id = self.edition.id
+
+        return ((edition_id, ordinal) for ordinal in self.box_ordinals.tolist())
+
+    def get_pack_order(self):
+        """Pack indexes in insert order: by box, then by position in the box"""
+        return np.array(
+            [pack for box_packs in self.box_packs for pack in box_packs],
+            dtype=np.int64,
+        )
+
+    def pack_rows(self, box_ids):
+        """box_ids: primary keys of the boxes, in insert order"""
+        edition_id = self.edition.id
+        pack_boxes = np.repeat(
+            np.array(box_ids, dtype=np.int64),
+            [len(box_packs) for box_packs in self.box_packs],
+        )
+
+        pack_order = self.get_pack_order()
+
+        return (
+            (edition_id, box_id, ordinal, has_prize, contents)
+            for box_id, ordinal, has_prize, contents in zip(
+                pack_boxes.tolist(),
+                self.pack_ordinals[pack_order].tolist(),
+                self.pack_has_prize[pack_order].tolist(),
+                self.pack_contents()[pack_order].tolist(),
+            )
+        )
+
+    def pack_contents(self):
+        """Pack.contents of every pack index, see Pack.encode_contents"""
+        coordinates, packs = self.placed_stickers()
+        coordinate_ids = np.array(
+            [coordinate.id for coordinate in self.coordinates], dtype=np.int64
+        )
+        absolute_numbers = np.array(
+            [coordinate.absolute_number for coordinate in self.coordinates],
+            dtype=np.int64,
+        )
+        numbers = absolute_numbers[np.searchsorted(coordinate_ids, coordinates)]
+        # position of each sticker in its pack, stickers are in ordinal order
+        order = np.argsort(packs, kind="stable")
+        sorted_packs = packs[order]
+        positions = np.empty(len(packs), dtype=np.int64)
+        positions[order] = np.arange(len(packs)) - np.searchsorted(
+            sorted_packs, sorted_packs
+        )
+        contents = np.zeros(self.pack_count, dtype=np.int64)
+        np.bitwise_or.at(
+            contents, packs, (numbers + 1) << (Pack.CONTENTS_BITS * positions)
+        )
+
+        return contents
+
+    def sticker_rows(self, pack_ids):
+        """pack_ids: primary keys of the packs, in insert order"""
+        edition_id = self.edition.id
+        pack_ids_by_index = np.full(self.pack_count, -1, dtype=np.int64)
+        pack_ids_by_index[self.get_pack_order()] = pack_ids
+        coordinates, packs = self.placed_stickers()
+
+        return (
+            (edition_id, coordinate_id, pack_id, ordinal)
+            for ordinal, (coordinate_id, pack_id) in enumerate(
+                zip(coordinates.tolist(), pack_ids_by_index[packs].tolist()),
+                start=self.first_sticker_ordinal,
+            )
+        )
+
+    def get_write_stages(self):
+        """
+        Returns (stage, model, fields, row count, rows factory) in insert
+        order. Each rows factory takes the ids of the previous stage (None
+        for boxes).
+        """
+        return [
+            (
+                "boxes",
+                Box,
+                ["edition_id", "ordinal"],
+                self.box_count,
+                lambda _: self.box_rows(),
+            ),
+            (
+                "packs",
+                Pack,
+                ["edition_id", "box_id", "ordinal", "has_prize", "contents"],
+                self.pack_count,
+                self.pack_rows,
+            ),
+            (
+                "stickers",
+                Sticker,
+                ["edition_id", "coordinate_id", "pack_id", "ordinal"],
+                self.sticker_count,
+                self.sticker_rows,
+            ),
+        ]
+
+    def write(self):
+        """Inserts boxes, packs and stickers, each row once"""
+        with transaction.atomic():
+            self.acquire_lock()
+            self._write()
+            EditionStats.record(self.edition, **self.get_stats())
+
+    def acquire_lock(self):
+        """
+        Takes a transaction-scoped advisory lock on the edition, so the same
+        edition is never generated twice at once while other editions proceed
+        in parallel. Advisory locks only exist in PostgreSQL.
+        """
+        if connection.vendor != "postgresql":
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(%s, %s)",
+                [GENERATION_LOCK_NAMESPACE, self.edition.pk],
+            )
+
+    def _write(self):
+        ids = None
+
+        for _, model, fields, _, rows in self.get_write_stages():
+            ids = self.loader.load(
+                model, fields, rows(ids), return_ids=model is not Sticker
+            )
+
+        logger.debug(
+            f"Edition {self.edition.id} written with the {self.loader.name} loader: "
+            f"{self.box_count} boxes, {self.pack_count} packs, "
+            f"{self.sticker_count} stickers"
+        )
+
+
+@contextmanager
+def generation_lock(edition):
+    """
+    Session-scoped counterpart of EditionPlanner.acquire_lock for jobs that
+    commit several times. Yields False when another process holds the lock.
+    """
+    if connection.vendor != "postgresql":
+        yield True
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_try_advisory_lock(%s, %s)",
+            [GENERATION_LOCK_NAMESPACE, edition.pk],
+        )
+        acquired = cursor.fetchone()[0]
+
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_unlock(%s, %s)",
+                    [GENERATION_LOCK_NAMESPACE, edition.pk],
+                )
+
+
+class ResumableGeneration:
+    """
+    Writes the plan of an EditionGeneration in chunks, committing each chunk
+    together with its checkpoint, so locks are held for one chunk at a time
+    and a failed run loses at most the chunk in flight.
+
+    Rows of every stage are inserted in a fixed order and the plan is rebuilt
+    from the stored seed, so resuming only needs rows_done: the rows written
+    so far are skipped and the ids of finished stages are read back in
+    primary key order.
+    """
+
+    CHUNK_SIZE = 50000
+
+    def __init__(self, generation, chunk_size=None):
+        self.generation = generation
+        self.edition = generation.edition
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+
+    def run(self):
+        """Returns False when another process is generating the edition"""
+        generation = self.generation
+
+        if generation.status == "done":
+            return True
+
+        with generation_lock(self.edition) as acquired:
+            if not acquired:
+                return False
+
+            try:
+                self._run()
+            except Exception as e:
+                generation.status = "failed"
+                generation.error = str(e)
+                generation.save(
+                    update_fields=["status", "stage", "error", "updated_at"]
+                )
+                raise
+
+        return True
+
+    def _run(self):
+        generation = self.generation
+        generation.refresh_from_db()
+        generation.status = "running"
+        generation.stage = "planning"
+        generation.error = ""
+        generation.started_at = timezone.now()
+        generation.finished_at = None
+        generation.rows_at_start = generation.rows_done
+        generation.save()
+
+        planner = get_planner_class(self.edition)(
+            self.edition, loader=get_loader(generation.loader), seed=generation.seed
+        ).plan()
+        stages = planner.get_write_stages()
+        generation.rows_total = sum(count for _, _, _, count, _ in stages)
+        generation.save(update_fields=["rows_total", "updated_at"])
+
+        written_before = 0
+        ids = None
+
+        for stage, model, fields, count, rows in stages:
+            skip = min(max(generation.rows_done - written_before, 0), count)
+            generation.stage = stage
+
+            for chunk in chunked(islice(rows(ids), skip, None), self.chunk_size):
+                with transaction.atomic():
+                    planner.loader.load(model, fields, chunk)
+                    generation.rows_done += len(chunk)
+                    generation.save(update_fields=["stage", "rows_done", "updated_at"])
+
+            written_before += count
+
+            if model is not Sticker:
+                ids = list(
+                    model.objects.filter(edition=self.edition)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)
+                )
+
+        with transaction.atomic():
+            EditionStats.record(self.edition, **planner.get_stats())
+            generation.status = "done"
+            generation.stage = ""
+            generation.finished_at = timezone.now()
+            generation.save()
+            # validated mid-generation, before every box was written
+            self.edition.forget_box_violations()
+
+
+class ShardPlanner(EditionPlanner):
+    """
+    Plans one shard of a sharded generation: a contiguous range of boxes whose
+    sticker multiset, pack and box ordinals were split off by
+    ShardedGeneration. Excess prizes were already removed edition-wide.
+    """
+
+    # reshuffles allowed to avoid leaving a prize sticker out of a shard
+    MAX_REFILLS = 10
+
+    def __init__(self, edition, shard, loader=None):
+        super().__init__(edition, loader=loader, seed=shard["seed"])
+        self.shard = shard
+        self.first_sticker_ordinal = shard["first_sticker_ordinal"]
+
+    def create_stickers(self):
+        self.sticker_coordinates = np.repeat(
+            np.array(self.shard["coordinates"], dtype=np.int64),
+            np.array(self.shard["counts"], dtype=np.int64),
+        )
+
+    def remove_excess_prize_stickers(self):
+        pass
+
+    def fill_packs(self):
+        """
+        Only the last shard may drop trailing prize stickers, like a whole
+        edition would; any other shard reshuffles so quotas are kept, and
+        fails, failing the whole generation, when it cannot.
+        """
+        for _ in range(self.MAX_REFILLS):
+            super().fill_packs()
+
+            if not self.dropped_prize_stickers or self.shard["is_last"]:
+                return
+
+            self.shuffle_stickers()
+
+        raise RuntimeError(
+            f"Edition {self.edition.id} shard starting at sticker "
+            f"{self.first_sticker_ordinal} still dropped "
+            f"{self.dropped_prize_stickers} prize stickers after "
+            f"{self.MAX_REFILLS} reshuffles"
+        )
+
+    def shuffle_packs(self):
+        self.pack_ordinals = np.array(self.shard["pack_ordinals"], dtype=np.int64)
+
+    def shuffle_boxes(self):
+        self.box_ordinals = np.array(self.shard["box_ordinals"], dtype=np.int64)
+
+
+def write_shard(edition_id, shard, loader_name):
+    """Process pool entry point: plans and writes one shard in a transaction"""
+    edition = Edition.objects.select_related("collection__album_template").get(
+        id=edition_id
+    )
+    planner = ShardPlanner(edition, shard, loader=get_loader(loader_name)).plan()
+
+    with transaction.atomic():
+        planner._write()
+
+    return planner.box_count, planner.pack_count, planner.sticker_count
+
+
+class ShardedGeneration:
+    """
+    Generates an already saved edition with a pool of processes.
+
+    The edition-wide sticker multiset is built, shuffled and trimmed of excess
+    prizes once, then split into contiguous box ranges (shards). Every shard
+    but the last gets exactly PRIZE_PACKS_PER_BOX prize stickers per box and
+    the next run of standard stickers, so the per-coordinate counts of all
+    shards add up to the edition quotas. Pack and box ordinals are slices of
+    edition-wide permutations. Each worker packs, boxes and writes its shard
+    in its own transaction; if any shard fails the edition is deleted with
+    EditionTeardown.
+    """
+
+    def __init__(self, edition, workers, loader=None, seed=None):
+        self.edition = edition
+        self.workers = workers
+        self.loader = loader or get_loader()
+        self.random = np.random.default_rng(seed)
+
+    def plan_shards(self):
+        planner = EditionPlanner(self.edition, loader=self.loader, seed=self.random)
+        planner.create_stickers()
+        planner.shuffle_stickers()
+        planner.remove_excess_prize_stickers()
+        planner.create_packs()
+
+        layout = planner.layout
+        is_prize = planner.get_prize_mask()
+        prize_stickers = planner.sticker_coordinates[is_prize]
+        standard_stickers = planner.sticker_coordinates[~is_prize]
+        total = len(planner.sticker_coordinates)
+        pack_count = planner.pack_count
+        box_count = ceil_div(pack_count, layout.PACKS_PER_BOX)
+        pack_ordinals = self.random.permutation(pack_count) + 1
+        box_ordinals = self.random.permutation(box_count) + 1
+
+        shard_boxes = [
+            boxes
+            for boxes in np.array_split(np.arange(box_count), self.workers)
+            if len(boxes)
+        ]
+        shards = []
+        prizes_used = 0
+        standard_used = 0
+
+        for index, boxes in enumerate(shard_boxes):
+            is_last = index == len(shard_boxes) - 1
+            first_pack = int(boxes[0]) * layout.PACKS_PER_BOX
+            end_pack = min((int(boxes[-1]) + 1) * layout.PACKS_PER_BOX, pack_count)
+            first_sticker = first_pack * layout.STICKERS_PER_PACK
+            end_sticker = total if is_last else end_pack * layout.STICKERS_PER_PACK
+
+            if is_last:
+                prizes = len(prize_stickers) - prizes_used
+            else:
+                prizes = min(
+                    len(boxes) * self.edition.PRIZE_PACKS_PER_BOX,
+                    len(prize_stickers) - prizes_used,
+                )
+
+            standard = end_sticker - first_sticker - prizes
+            coordinates, counts = np.unique(
+                np.concatenate(
+                    (
+                        prize_stickers[prizes_used : prizes_used + prizes],
+                        standard_stickers[standard_used : standard_used + standard],
+                    )
+                ),
+                return_counts=True,
+            )
+            prizes_used += prizes
+            standard_used += standard
+
+            shards.append(
+                {
+                    "seed": int(self.random.integers(2**63)),
+                    "is_last": is_last,
+                    "coordinates": coordinates.tolist(),
+                    "counts": counts.tolist(),
+                    "first_sticker_ordinal": first_sticker + 1,
+                    "pack_ordinals": pack_ordinals[first_pack:end_pack].tolist(),
+                    "box_ordinals": box_ordinals[boxes].tolist(),
+                }
+            )
+
+        return shards
+
+    def run(self):
+        """Returns the number of boxes, packs and stickers written"""
+        shards = self.plan_shards()
+        # forked workers must open their own connections
+        connections.close_all()
+
+        try:
+            with ProcessPoolExecutor(
+                max_workers=min(self.workers, len(shards)),
+                mp_context=multiprocessing.get_context("fork"),
+            ) as executor:
+                results = list(
+                    executor.map(
+                        write_shard,
+                        [self.edition.id] * len(shards),
+                        shards,
+                        [self.loader.name] * len(shards),
+                    )
+                )
+        except Exception:
+            # shards already committed are removed in chunks, not by the ORM
+            # cascade collector
+            EditionTeardown(self.edition).run()
+            raise
+
+        EditionStats.rebuild(self.edition)
+
+        return tuple(int(sum(counts)) for counts in zip(*results))
+
+
+class SeededPermutation:
+    """
+    Bijection of range(size) keyed by a seed. Any element of the permuted
+    sequence is computed on its own (a Feistel network over the smallest
+    power of four covering size, cycle-walking values that fall outside),
+    so a shuffled sequence can be read at arbitrary positions without
+    materializing it.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, size, seed):
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        self.half_bits = np.uint64((bits + 1) // 2)
+        self.mask = np.uint64((1 << int(self.half_bits)) - 1)
+        self.keys = np.random.default_rng(seed).integers(
+            0, 2**63, size=self.ROUNDS, dtype=np.uint64
+        )
+
+    def _round(self, value, key):
+        # splitmix64 finalizer, wrapping uint64 arithmetic
+        value = (value ^ key) * np.uint64(0x9E3779B97F4A7C15)
+        value ^= value >> np.uint64(30)
+        value *= np.uint64(0xBF58476D1CE4E5B9)
+        value ^= value >> np.uint64(27)
+
+        return value & self.mask
+
+    def _encrypt(self, values):
+        left, right = values >> self.half_bits, values & self.mask
+
+        for key in self.keys:
+            left, right = right, left ^ self._round(right, key)
+
+        return (left << self.half_bits) | right
+
+    def __call__(self, positions):
+        """Returns the permuted values of an array of positions"""
+        values = np.array(positions, dtype=np.uint64, ndmin=1)
+        outside = np.ones(values.shape, dtype=bool)
+
+        while outside.any():
+            values[outside] = self._encrypt(values[outside])
+            outside = values >= self.size
+
+        return values.astype(np.int64)
+
+
+class VirtualEditionPlanner(EditionPlanner):
+    """
+    Plans a virtual edition: only boxes and packs are written, and the
+    stickers of a pack are derived from (edition seed, pack ordinal) when it
+    is opened.
+
+    Packs are numbered by ordinal and box b holds ordinals 100b+1..100b+100.
+    Every box gets PRIZE_PACKS_PER_BOX prize packs at seeded, spaced
+    positions; since the prize packs before any pack can be counted in O(1),
+    so can its range in the sequence of standard sticker slots. Prize and
+    standard slots read the sticker multisets (the stored rarity quotas)
+    through seeded permutations, so quotas are exact and every pack holds at
+    most one prize, like a materialized edition.
+    """
+
+    PERMUTATION_PRIZE = 1
+    PERMUTATION_STANDARD = 2
+    PRIZE_POSITIONS = 3
+
+    def __init__(self, edition, loader=None, seed=None):
+        super().__init__(edition, loader=loader, seed=seed)
+        self.seed = edition.seed
+        self.quotas = {
+            int(coordinate): count
+            for coordinate, count in edition.sticker_quotas.items()
+        }
+        prize_coordinates = set(self.prize_coordinates.tolist())
+        self.prize_ids, self.prize_bounds = self._get_multiset(
+            lambda coordinate: coordinate in prize_coordinates
+        )
+        self.standard_ids, self.standard_bounds = self._get_multiset(
+            lambda coordinate: coordinate not in prize_coordinates
+        )
+        self.count_stickers()
+
+    def _get_multiset(self, include):
+        """Coordinate ids and cumulative counts of the sorted multiset"""
+        ids = sorted(
+            coordinate
+            for coordinate, count in self.quotas.items()
+            if count and include(coordinate)
+        )
+
+        return (
+            np.array(ids, dtype=np.int64),
+            np.cumsum([self.quotas[coordinate] for coordinate in ids], dtype=np.int64),
+        )
+
+    def count_stickers(self):
+        """
+        Settles how many stickers, prizes and packs the edition holds, the
+        counting equivalent of remove_excess_prize_stickers.
+        """
+        layout = self.layout
+        prize_packs_per_box = self.edition.PRIZE_PACKS_PER_BOX
+        printed_prizes = int(self.prize_bounds[-1]) if len(self.prize_bounds) else 0
+        standard = int(self.standard_bounds[-1]) if len(self.standard_bounds) else 0
+        prizes = printed_prizes
+
+        while True:
+            total = standard + prizes
+            packs = ceil_div(total, layout.STICKERS_PER_PACK)
+            boxes = ceil_div(packs, layout.PACKS_PER_BOX)
+            last_box = packs - (boxes - 1) * layout.PACKS_PER_BOX
+            allowed = (boxes - 1) * prize_packs_per_box + min(
+                prize_packs_per_box, last_box
+            )
+
+            if prizes <= max(allowed, 0):
+                break
+
+            prizes = max(allowed, 0)
+
+        self.total_stickers = total
+        self.prize_stickers = prizes
+        self.removed_prize_stickers = printed_prizes - prizes
+        self.pack_count = packs
+        self.prize_permutation = SeededPermutation(
+            printed_prizes, [self.seed, self.PERMUTATION_PRIZE]
+        )
+        self.standard_permutation = SeededPermutation(
+            standard, [self.seed, self.PERMUTATION_STANDARD]
+        )
+
+    def get_stats(self):
+        """Printed figures, without planning the boxes"""
+        rarities = {
+            coordinate.id: str(coordinate.rarity_factor)
+            for coordinate in self.coordinates
+        }
+        kept_prizes = self.prize_ids[
+            np.searchsorted(
+                self.prize_bounds,
+                self.prize_permutation(np.arange(self.prize_stickers)),
+                side="right",
+            )
+        ]
+        prize_ids = set(self.prize_ids.tolist())
+        counts = {
+            coordinate: count
+            for coordinate, count in self.quotas.items()
+            if coordinate not in prize_ids
+        }
+        kept_coordinates, kept_counts = np.unique(kept_prizes, return_counts=True)
+        counts.update(zip(kept_coordinates.tolist(), kept_counts.tolist()))
+        stickers_by_rarity = {}
+
+        for coordinate, count in counts.items():
+            if count:
+                rarity = rarities[coordinate]
+                stickers_by_rarity[rarity] = stickers_by_rarity.get(rarity, 0) + count
+
+        return {
+            "boxes": ceil_div(self.pack_count, self.layout.PACKS_PER_BOX),
+            "packs": self.pack_count,
+            "prize_packs": self.prize_stickers,
+            "stickers": self.total_stickers,
+            "stickers_by_rarity": stickers_by_rarity,
+        }
+
+    def predict(self):
+        """Same as EditionPlanner.predict; stickers are written when opened"""
+        return self.get_prediction(
+            self.quotas,
+            stickers=self.total_stickers,
+            prize_stickers=self.prize_stickers,
+            packs=self.pack_count,
+            boxes=ceil_div(self.pack_count, self.layout.PACKS_PER_BOX),
+            sticker_rows=0,
+            planner_bytes=self.pack_count * self.PLANNER_BYTES_PER_PACK,
+        )
+
+    def get_prize_positions(self, box):
+        """Positions (0-based) of the prize packs of the box-th box"""
+        packs_per_box = self.layout.PACKS_PER_BOX
+        size = min(packs_per_box, self.pack_count - box * packs_per_box)
+        prize_packs = min(
+            max(self.prize_stickers - box * self.edition.PRIZE_PACKS_PER_BOX, 0),
+            self.edition.PRIZE_PACKS_PER_BOX,
+            size,
+        )
+        random = np.random.default_rng([self.seed, self.PRIZE_POSITIONS, box])
+
+        if size < packs_per_box:
+            return sorted(random.choice(size, prize_packs, replace=False).tolist())
+
+        positions = set()
+
+        while len(positions) < prize_packs:
+            position = int(random.integers(0, size))
+            if not any(
+                abs(position - each) <= self.edition.MIN_PRIZES_POSITON_GAP
+                for each in positions
+            ):
+                positions.add(position)
+
+        return sorted(positions)
+
+    def plan(self):
+        packs_per_box = self.layout.PACKS_PER_BOX
+        self.pack_ordinals = np.arange(1, self.pack_count + 1, dtype=np.int64)
+        self.pack_has_prize = np.zeros(self.pack_count, dtype=bool)
+        self.create_boxes()
+
+        for box, box_packs in enumerate(self.box_packs):
+            first = box * packs_per_box
+            box_packs.extend(range(first, min(first + packs_per_box, self.pack_count)))
+            self.pack_has_prize[
+                [first + position for position in self.get_prize_positions(box)]
+            ] = True
+
+        self.shuffle_boxes()
+
+        return self
+
+    def pack_contents(self):
+        """Unknown until the packs are opened, stickers are derived then"""
+        return np.full(self.pack_count, None, dtype=object)
+
+    def pack_stickers(self, ordinal):
+        """Returns the (coordinate id, sticker ordinal) pairs of a pack"""
+        layout = self.layout
+        pack = ordinal - 1
+        box, position = divmod(pack, layout.PACKS_PER_BOX)
+        prize_positions = self.get_prize_positions(box)
+        prizes_before = min(
+            self.prize_stickers, box * self.edition.PRIZE_PACKS_PER_BOX
+        ) + sum(each < position for each in prize_positions)
+        first_slot = pack * layout.STICKERS_PER_PACK
+        size = min(layout.STICKERS_PER_PACK, self.total_stickers - first_slot)
+        coordinates = []
+
+        if position in prize_positions:
+            index = self.prize_permutation(prizes_before)
+            coordinates.extend(
+                self.prize_ids[np.searchsorted(self.prize_bounds, index, side="right")]
+            )
+            size -= 1
+
+        first_standard = first_slot - prizes_before
+        indexes = self.standard_permutation(
+            np.arange(first_standard, first_standard + size)
+        )
+        coordinates.extend(
+            self.standard_ids[
+                np.searchsorted(self.standard_bounds, indexes, side="right")
+            ]
+        )
+
+        return [
+            (int(coordinate), first_slot + offset + 1)
+            for offset, coordinate in enumerate(coordinates)
+        ]
+
+
+def get_planner_class(edition):
+    return VirtualEditionPlanner if edition.is_virtual else EditionPlanner
@@ -0,0 +1,159 @@
+import io
+import logging
+
+from itertools import islice
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+
+    while True:
+        chunk = list(islice(rows, size))
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+class BulkCreateLoader:
+    """Inserts rows through the ORM bulk_create. Works on every database."""
+
+    name = "orm"
+
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+
+    def load(self, model, fields, rows, return_ids=False):
+        """
+        Inserts rows, given as tuples of values for fields (attribute names).
+        Returns the primary keys in the same order when return_ids is True.
+        """
+        ids = []
+
+        for chunk in chunked(rows, self.batch_size):
+            objects = model.objects.bulk_create(
+                [model(**dict(zip(fields, row))) for row in chunk]
+            )
+
+            if return_ids:
+                ids.extend(each.pk for each in objects)
+
+        return ids
+
+
+class CopyLoader:
+    """
+    Streams rows into PostgreSQL with COPY FROM STDIN, skipping model
+    construction and INSERT parsing. Primary keys that the caller needs are
+    reserved from the table sequence beforehand, since COPY returns nothing.
+    """
+
+    name = "copy"
+
+    def __init__(self, batch_size=100000):
+        self.batch_size = batch_size
+
+    @staticmethod
+    def format_value(value):
+        if value is None:
+            return "\\N"
+
+        if isinstance(value, bool):
+            return "t" if value else "f"
+
+        return (
+            str(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+
+    def get_columns(self, model, fields):
+        """
+        Returns the table columns and default values for every concrete field
+        the caller does not provide, because model defaults are not database
+        defaults and COPY would otherwise write NULL.
+        """
+        defaults = []
+
+        for field in model._meta.concrete_fields:
+            if field.primary_key or field.attname in fields:
+                continue
+            defaults.append((field.column, field.get_default()))
+
+        columns = [model._meta.get_field(name).column for name in fields]
+
+        return columns, defaults
+
+    def reserve_ids(self, cursor, model, count):
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+            "FROM generate_series(1, %s)",
+            [model._meta.db_table, model._meta.pk.column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def load(self, model, fields, rows, return_ids=False):
+        """Same contract as BulkCreateLoader.load"""
+        columns, defaults = self.get_columns(model, fields)
+        columns += [column for column, _ in defaults]
+        default_values = tuple(value for _, value in defaults)
+
+        if return_ids:
+            columns.insert(0, model._meta.pk.column)
+
+        statement = "COPY {} ({}) FROM STDIN".format(
+            connection.ops.quote_name(model._meta.db_table),
+            ", ".join(connection.ops.quote_name(column) for column in columns),
+        )
+        ids = []
+
+        with connection.cursor() as cursor:
+            for chunk in chunked(rows, self.batch_size):
+                buffer = io.StringIO()
+                chunk_ids = (
+                    self.reserve_ids(cursor, model, len(chunk)) if return_ids else ()
+                )
+
+                for index, row in enumerate(chunk):
+                    values = row + default_values
+
+                    if return_ids:
+                        values = (chunk_ids[index],) + values
+
+                    buffer.write("\t".join(map(self.format_value, values)))
+                    buffer.write("\n")
+
+                buffer.seek(0)
+                cursor.copy_expert(statement, buffer)
+                ids.extend(chunk_ids)
+
+        return ids
+
+
+LOADERS = {
+    BulkCreateLoader.name: BulkCreateLoader,
+    CopyLoader.name: CopyLoader,
+}
+
+
+def get_loader(name=None):
+    """
+    Returns the loader registered under name. COPY is only available on
+    PostgreSQL, so other databases (SQLite in development) fall back to the
+    ORM loader.
+    """
+    if name == CopyLoader.name and connection.vendor != "postgresql":
+        logger.warning(
+            f"COPY loader requires PostgreSQL, using {BulkCreateLoader.name} "
+            f"on {connection.vendor}"
+        )
+        name = BulkCreateLoader.name
+
+    return LOADERS[name or BulkCreateLoader.name]()
@@ -0,0 +1,162 @@
+import json
+import time
+import tracemalloc
+import uuid
+
+from datetime import datetime
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from collection_manager.models import AlbumTemplate, Collection
+from editions.generation import EditionPlanner
+from editions.loaders import LOADERS, BulkCreateLoader, get_loader
+from editions.models import Edition
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates throwaway editions at a ladder of circulations and reports "
+        "wall time, peak traced memory, queries and rows written per "
+        "generation stage"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--circulations",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000],
+            help="Circulations to benchmark, one edition each",
+        )
+        parser.add_argument(
+            "--loader",
+            choices=sorted(LOADERS),
+            default=BulkCreateLoader.name,
+            help="How rows are inserted: orm (bulk_create) or copy (PostgreSQL COPY)",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=None, help="Seed for reproducible layouts"
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="JSON file for the results, printed to stdout when omitted",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Every template, collection and edition is created inside a
+        transaction that is rolled back, so the database is left untouched.
+        Memory is the peak of the Python and NumPy allocations traced by
+        tracemalloc while each stage runs, which also slows every stage down.
+        Sintax:
+            python manage.py benchmark_editions [--circulations 10 100 1000] [--loader orm|copy] [--seed <n>] [--output <file>]
+        """
+        loader = get_loader(options["loader"])
+        results = {
+            "started_at": datetime.now().isoformat(),
+            "database": connection.vendor,
+            "loader": loader.name,
+            "seed": options["seed"],
+            "runs": [],
+        }
+
+        tracing = tracemalloc.is_tracing()
+
+        if not tracing:
+            tracemalloc.start()
+
+        try:
+            with transaction.atomic():
+                collection = self.create_collection()
+
+                for circulation in options["circulations"]:
+                    run = self.benchmark(
+                        collection, circulation, loader, options["seed"]
+                    )
+                    results["runs"].append(run)
+                    self.stdout.write(
+                        f"Circulation {circulation}: {run['seconds']:.3f}s, "
+                        f"{run['rows']} rows, peak traced memory "
+                        f"{run['peak_traced_kb']} KB"
+                    )
+
+                transaction.set_rollback(True)
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+
+        report = json.dumps(results, indent=2)
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report)
+
+            self.stdout.write(
+                self.style.SUCCESS(f"\nResults written to {options['output']}")
+            )
+        else:
+            self.stdout.write(report)
+
+    def create_collection(self):
+        """Throwaway template and collection, saved without promotion checks"""
+        template = AlbumTemplate.objects.create(
+            name=f"benchmark-{uuid.uuid4().hex[:12]}"
+        )
+        collection = Collection(album_template=template)
+        collection.save_base()
+
+        return collection
+
+    def measure(self, stage, action):
+        # the peak of this stage only, not of the whole process so far
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+
+        with CaptureQueriesContext(connection) as context:
+            rows = action()
+
+        return {
+            "stage": stage,
+            "seconds": round(time.perf_counter() - started, 6),
+            "peak_traced_kb": tracemalloc.get_traced_memory()[1] // 1024,
+            "queries": len(context),
+            "rows": rows or 0,
+        }
+
+    def benchmark(self, collection, circulation, loader, seed):
+        edition = Edition(collection=collection, circulation=Decimal(circulation))
+        # skips full_clean and the generation run by Edition.save
+        edition.save_base()
+        stages = []
+
+        planner = EditionPlanner(edition, loader=loader, seed=seed)
+
+        for stage in planner.STAGES:
+            stages.append(self.measure(stage, getattr(planner, stage)))
+
+        ids = None
+
+        for stage, model, fields, count, rows in planner.get_write_stages():
+
+            def write():
+                nonlocal ids
+                ids = loader.load(
+                    model, fields, rows(ids), return_ids=stage != "stickers"
+                )
+                return count
+
+            stages.append(self.measure(f"write_{stage}", write))
+
+        return {
+            "circulation": circulation,
+            "boxes": planner.box_count,
+            "packs": planner.pack_count,
+            "stickers": planner.sticker_count,
+            "seconds": round(sum(stage["seconds"] for stage in stages), 6),
+            "queries": sum(stage["queries"] for stage in stages),
+            "rows": sum(stage["rows"] for stage in stages),
+            "peak_traced_kb": max(stage["peak_traced_kb"] for stage in stages),
+            "stages": stages,
+        }
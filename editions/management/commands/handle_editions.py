@@ -1,13 +1,41 @@
+import time
+
 from decimal import Decimal
-from django.core.management.base import BaseCommand
-from django.core.management.base import OutputWrapper
-from django.core.management.color import no_style
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from collection_manager.models import Collection
-from editions.models import Edition, Pack, Sticker
+from django.core.files.storage import FileSystemStorage
+from editions.export import ManifestExport
+from editions.generation import (
+    EditionPlanner,
+    ResumableGeneration,
+    ShardedGeneration,
+    get_planner_class,
+)
+from editions.loaders import LOADERS, BulkCreateLoader, get_loader
+from editions.models import (
+    Box,
+    Edition,
+    EditionGeneration,
+    Ownership,
+    Pack,
+    Sticker,
+)
+from editions.partitioning import PARTITIONED_TABLES, is_partitioned, partition_tables
+from editions.teardown import EditionTeardown
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 
 
 class Command(BaseCommand):
+    # heap and index bytes per row, for tables without statistics
+    DEFAULT_ROW_BYTES = {
+        "editions_box": 90,
+        "editions_pack": 130,
+        "editions_sticker": 150,
+    }
+    # rows per second, until a background generation with the loader finishes
+    DEFAULT_ROWS_PER_SECOND = {"orm": 20000, "copy": 150000}
+
     def add_arguments(self, parser):
         subparsers = parser.add_subparsers(
             dest="operation", help="Operation to perform"
@@ -26,9 +54,94 @@ class Command(BaseCommand):
             required=True,
             help="Number of copies for the edition",
         )
+        create_parser.add_argument(
+            "--loader",
+            choices=sorted(LOADERS),
+            default=BulkCreateLoader.name,
+            help="How rows are inserted: orm (bulk_create) or copy (PostgreSQL COPY)",
+        )
+        create_parser.add_argument(
+            "--background",
+            action="store_true",
+            help="Generate the rows in a Celery worker, with checkpoints and progress",
+        )
+        create_parser.add_argument(
+            "--virtual",
+            action="store_true",
+            help="Store boxes and packs only, stickers are derived when each pack is opened",
+        )
+        create_parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processes generating independent box ranges of the edition in parallel",
+        )
+
+        resume_parser = subparsers.add_parser("resume")
+        resume_parser.add_argument(
+            "edition_id", type=int, help="Edition ID whose generation is resumed"
+        )
 
         delete_parser = subparsers.add_parser("delete")
         delete_parser.add_argument("edition_id", type=int, help="Edition ID to delete")
+        delete_parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the rows that would be deleted or detached",
+        )
+        delete_parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=EditionTeardown.CHUNK_SIZE,
+            help="Primary key range removed by each statement",
+        )
+
+        simulate_parser = subparsers.add_parser("simulate")
+        simulate_parser.add_argument(
+            "--collection", type=int, required=True, help="Collection ID to simulate"
+        )
+        simulate_parser.add_argument(
+            "--circulation", type=int, required=True, help="Number of copies"
+        )
+        simulate_parser.add_argument(
+            "--virtual", action="store_true", help="Simulate a virtual edition"
+        )
+        simulate_parser.add_argument(
+            "--loader",
+            choices=sorted(LOADERS),
+            default=BulkCreateLoader.name,
+            help="Loader whose speed is used to estimate the generation time",
+        )
+
+        subparsers.add_parser("partition")
+
+        ownership_parser = subparsers.add_parser("rebuild-ownership")
+        ownership_parser.add_argument(
+            "--collection",
+            type=int,
+            required=True,
+            help="Collection ID whose ownership counts are recomputed",
+        )
+
+        export_parser = subparsers.add_parser("export")
+        export_parser.add_argument("edition_id", type=int, help="Edition ID to export")
+        export_parser.add_argument(
+            "--format",
+            choices=ManifestExport.FORMATS,
+            default="csv",
+            help="Gzipped CSV or Parquet parts",
+        )
+        export_parser.add_argument(
+            "--output-dir",
+            default=None,
+            help="Local directory for the parts, instead of the default storage",
+        )
+        export_parser.add_argument(
+            "--chunk-rows",
+            type=int,
+            default=ManifestExport.CHUNK_ROWS,
+            help="Stickers written to each part",
+        )
 
     def handle(self, *args, **options):
         operation = options["operation"]
@@ -37,6 +150,16 @@ class Command(BaseCommand):
             return self.create_edition(options)
         elif operation == "delete":
             return self.delete_edition(options)
+        elif operation == "resume":
+            return self.resume_generation(options)
+        elif operation == "partition":
+            return self.partition(options)
+        elif operation == "rebuild-ownership":
+            return self.rebuild_ownership(options)
+        elif operation == "simulate":
+            return self.simulate_edition(options)
+        elif operation == "export":
+            return self.export_manifest(options)
 
     def create_edition(self, options):
         """
@@ -45,6 +168,10 @@ class Command(BaseCommand):
             options (dict): A dictionary containing the following keys:
                 - collection (int): The ID of the collection for which the edition is to be created.
                 - circulation (int): The circulation number for the new edition.
+                - loader (str): How rows are inserted, "orm" or "copy" (PostgreSQL only).
+                - background (bool): Queue the generation as a Celery task instead of waiting for it.
+                - virtual (bool): Derive stickers when packs are opened instead of storing them.
+                - workers (int): Number of processes generating shards of the edition in parallel.
         Returns:
             None
         Raises:
@@ -54,14 +181,32 @@ class Command(BaseCommand):
         Outputs:
             Writes progress and success messages to stdout.
         Sintax:
-            python manage.py handle_editions create --collection <collection_id> --circulation<circulation>
+            python manage.py handle_editions create --collection <collection_id> --circulation<circulation> [--loader orm|copy] [--background] [--virtual] [--workers <n>]
         """
 
+        workers = options.get("workers") or 1
+
+        # background generations are resumable, which shards are not
+        if options.get("background") and workers > 1:
+            raise CommandError(
+                "--background generates the edition in a single process, "
+                "it cannot be combined with --workers"
+            )
+
+        # virtual editions only write boxes and packs, no need to shard
+        if options.get("virtual") and workers > 1:
+            raise CommandError(
+                "--virtual editions are generated in a single process, "
+                "it cannot be combined with --workers"
+            )
+
         try:
             collection = Collection.objects.get(id=options["collection"])
 
             edition = Edition(
-                collection=collection, circulation=Decimal(str(options["circulation"]))
+                collection=collection,
+                circulation=Decimal(str(options["circulation"])),
+                is_virtual=options.get("virtual", False),
             )
 
             try:
@@ -123,7 +268,7 @@ class Command(BaseCommand):
 
                 return
 
-            self.stdout.write(f"\nCreating new edition for:")
+            self.stdout.write("\nCreating new edition for:")
             self.stdout.write(f"Collection: {collection.album_template.name}")
             self.stdout.write(f"Promotion: {collection.promotion}")
             self.stdout.write(f"Circulation: {options['circulation']}")
@@ -134,13 +279,36 @@ class Command(BaseCommand):
 
             # Create edition
             self.stdout.write("Creating edition...")
+            sharding = False
 
             try:
-                edition.save()
+                loader = get_loader(options.get("loader"))
+
+                if options.get("background"):
+                    edition.save(loader=loader, background=True)
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f"\nEdition {edition.id} queued for generation."
+                            f"\nFollow its progress at /api/edition/{edition.id}/generation/"
+                            f" or resume it with: handle_editions resume {edition.id}"
+                        )
+                    )
+                    return
+
+                started = time.perf_counter()
+
+                if workers > 1:
+                    edition.save(generate=False)
+                    sharding = True
+                    ShardedGeneration(edition, workers, loader=loader).run()
+                else:
+                    edition.save(loader=loader)
+
+                elapsed = time.perf_counter() - started
                 # Show progress for related objects
                 boxes = edition.boxes.count()
-                packs = Pack.objects.filter(box__edition=edition).count()
-                stickers = Sticker.objects.filter(pack__box__edition=edition).count()
+                packs = edition.packs.count()
+                stickers = edition.stickers.count()
 
                 total_objects = boxes + packs + stickers
 
@@ -148,6 +316,10 @@ class Command(BaseCommand):
                 self.stdout.write(f"- Boxes: {boxes}")
                 self.stdout.write(f"- Packs: {packs}")
                 self.stdout.write(f"- Stickers: {stickers}")
+                self.stdout.write(
+                    f"Loader: {loader.name}, {elapsed:.2f}s, "
+                    f"{total_objects / elapsed if elapsed else total_objects:.0f} rows/s"
+                )
 
                 self.stdout.write(
                     self.style.SUCCESS(
@@ -163,60 +335,384 @@ class Command(BaseCommand):
                 self.stdout.write(
                     self.style.ERROR(f"\nError creating edition: {str(e)}")
                 )
-                self.stdout.write(
-                    self.style.WARNING(
-                        "The operation was rolled back and no data was created."
+
+                if sharding:
+                    # shards commit on their own, ShardedGeneration deletes them
+                    self.stdout.write(
+                        self.style.WARNING(
+                            "The shards already written were deleted together "
+                            "with the edition."
+                        )
+                    )
+                else:
+                    self.stdout.write(
+                        self.style.WARNING(
+                            "The operation was rolled back and no data was created."
+                        )
                     )
+
+        except ObjectDoesNotExist:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Collection with ID {options['collection']} does not exist"
                 )
+            )
 
+    def simulate_edition(self, options):
+        """
+        Predicts what creating an edition would produce (stickers per
+        coordinate, prize stickers removed, packs, boxes, box fill, database
+        size and generation time) without writing anything.
+        Sintax:
+            python manage.py handle_editions simulate --collection <collection_id> --circulation <circulation> [--virtual] [--loader orm|copy]
+        """
+        try:
+            collection = Collection.objects.get(id=options["collection"])
         except ObjectDoesNotExist:
             self.stdout.write(
                 self.style.ERROR(
                     f"Collection with ID {options['collection']} does not exist"
                 )
             )
+            return
 
-    def delete_edition(self, options):
+        edition = Edition(
+            collection=collection,
+            circulation=Decimal(str(options["circulation"])),
+            is_virtual=options.get("virtual", False),
+        )
+
+        if edition.is_virtual:
+            edition.seed = 0
+            edition.sticker_quotas = EditionPlanner(edition).get_sticker_limits()
+
+        started = time.perf_counter()
+        prediction = get_planner_class(edition)(edition).predict()
+        elapsed = time.perf_counter() - started
+
+        coordinates = {
+            coordinate.id: coordinate
+            for coordinate in collection.album_template.coordinates.all()
+        }
+        rows = {
+            "boxes": (Box, prediction["boxes"]),
+            "packs": (Pack, prediction["packs"]),
+            "stickers": (Sticker, prediction["sticker_rows"]),
+        }
+        database_bytes = sum(
+            count * self.get_row_bytes(model) for model, count in rows.values()
+        )
+        total_rows = sum(count for _, count in rows.values())
+        rate = self.get_rows_per_second(options["loader"])
+
+        self.stdout.write("\nSimulated edition for:")
+        self.stdout.write(f"Collection: {collection.album_template.name}")
+        self.stdout.write(f"Circulation: {options['circulation']}")
+        self.stdout.write("\nStickers per coordinate:")
+
+        for coordinate_id, count in prediction["stickers_per_coordinate"].items():
+            coordinate = coordinates[coordinate_id]
+            self.stdout.write(
+                f"- Nº {coordinate.absolute_number} "
+                f"(rarity {coordinate.rarity_factor}): {count}"
+            )
+
+        self.stdout.write("\nStickers per rarity:")
+
+        for rarity, count in prediction["printed_stickers_by_rarity"].items():
+            self.stdout.write(f"- {rarity}: {count}")
+
+        self.stdout.write(f"\nStickers: {prediction['stickers']}")
+        self.stdout.write(f"Prize stickers: {prediction['prize_stickers']}")
+        self.stdout.write(
+            f"Prize stickers removed: {prediction['removed_prize_stickers']}"
+        )
+        self.stdout.write(f"Packs: {prediction['packs']}")
+        self.stdout.write(f"Boxes: {prediction['boxes']}")
+        self.stdout.write(
+            f"Stickers in the last pack: {prediction['last_pack_stickers']}"
+        )
+        self.stdout.write("Boxes by packs they hold:")
+
+        for size, count in sorted(prediction["box_fill"].items(), reverse=True):
+            self.stdout.write(f"- {size} packs: {count}")
+
+        self.stdout.write(
+            f"\nRows: {total_rows}"
+            f"\nEstimated database size: {database_bytes / 2**20:.1f} MB"
+            f"\nEstimated planning memory: {prediction['planner_bytes'] / 2**20:.1f} MB"
+            f"\nEstimated generation time: {total_rows / rate:.0f}s "
+            f"at {rate:.0f} rows/s ({options['loader']})"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"\nSimulated in {elapsed:.3f}s, nothing was written")
+        )
+
+    def get_row_bytes(self, model):
+        """
+        Average bytes per row of model, indexes included, from the PostgreSQL
+        statistics of its table (and partitions), or a default guess.
+        """
+        table = model._meta.db_table
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT sum(greatest(reltuples, 0)), "
+                    "sum(pg_total_relation_size(oid)) FROM pg_class "
+                    "WHERE oid = to_regclass(%s) OR oid IN (SELECT inhrelid "
+                    "FROM pg_inherits WHERE inhparent = to_regclass(%s))",
+                    [table, table],
+                )
+                tuples, size = cursor.fetchone()
+
+            if tuples:
+                return float(size) / tuples
+
+        return self.DEFAULT_ROW_BYTES[table]
+
+    def get_rows_per_second(self, loader_name):
+        """Rate of the finished background generations, or a default guess"""
+        rows = seconds = 0
+
+        for generation in EditionGeneration.objects.filter(
+            status="done", loader=loader_name, started_at__isnull=False
+        ):
+            rows += generation.rows_done - generation.rows_at_start
+            seconds += (generation.finished_at - generation.started_at).total_seconds()
+
+        if rows and seconds > 0:
+            return rows / seconds
+
+        return self.DEFAULT_ROWS_PER_SECOND[loader_name]
+
+    def resume_generation(self, options):
+        """
+        Continues a background generation from its last checkpoint in this
+        process, e.g. after the worker running it crashed.
+        Sintax:
+            python manage.py handle_editions resume <edition_id>
+        """
         edition_id = options["edition_id"]
 
         try:
-            edition = Edition.objects.get(id=options["edition_id"])
+            generation = EditionGeneration.objects.select_related("edition").get(
+                edition_id=edition_id
+            )
+        except EditionGeneration.DoesNotExist:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Edition with ID {edition_id} has no background generation"
+                )
+            )
+            return
 
-            related_counts = {
-                "boxes": edition.boxes.count(),
-                "packs": Pack.objects.filter(box__edition=edition).count(),
-                "stickers": Sticker.objects.filter(pack__box__edition=edition).count(),
-            }
-
-            self.stdout.write(f"\nEdition to delete:")
-            self.stdout.write(f"ID: {edition.id}")
-            self.stdout.write(f"Collection: {edition.collection.album_template.name}")
-            self.stdout.write(f"Promotion: {edition.collection.promotion}")
-            self.stdout.write(f"Circulation: {edition.circulation}")
-            self.stdout.write("\nRelated objects to be deleted:")
-            self.stdout.write(f"- Boxes: {related_counts['boxes']}")
-            self.stdout.write(f"- Packs: {related_counts['packs']}")
-            self.stdout.write(f"- Stickers: {related_counts['stickers']}")
-
-            if (
-                input("\nAre you sure you want to delete this edition? [y/N]: ").lower()
-                != "y"
-            ):
-                self.stdout.write(self.style.WARNING("Operation cancelled"))
-                return
+        if generation.status == "done":
+            self.stdout.write(
+                self.style.WARNING(f"Edition {edition_id} is already generated")
+            )
+            return
 
-            edition.delete()
+        self.stdout.write(
+            f"Resuming edition {edition_id} at {generation.rows_done} rows"
+            f" ({generation.stage or 'planning'})..."
+        )
 
+        try:
+            if not ResumableGeneration(generation).run():
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"Edition {edition_id} is being generated by another process"
+                    )
+                )
+                return
+        except Exception as e:
             self.stdout.write(
-                self.style.SUCCESS(
-                    f"\nEdition {edition_id} successfully deleted with:"
-                    f"\n- {related_counts['boxes']} boxes"
-                    f"\n- {related_counts['packs']} packs"
-                    f"\n- {related_counts['stickers']} stickers"
+                self.style.ERROR(
+                    f"\nError generating edition: {str(e)}"
+                    f"\nProgress is kept at {generation.rows_done} rows."
                 )
             )
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nEdition {edition_id} generated: {generation.rows_done} rows, "
+                f"{generation.rows_per_second:.0f} rows/s"
+            )
+        )
+
+    def delete_edition(self, options):
+        """
+        Deletes an edition and every row generated for it with chunked,
+        set-based statements instead of the ORM cascade, so memory does not
+        grow with the size of the edition.
+        Sintax:
+            python manage.py handle_editions delete <edition_id> [--dry-run] [--chunk-size <n>]
+        """
+        edition_id = options["edition_id"]
+
+        try:
+            edition = Edition.objects.get(id=options["edition_id"])
+        except ObjectDoesNotExist:
+            self.stdout.write(
+                self.style.ERROR(f"Edition with ID {edition_id} does not exist")
+            )
+            return
+
+        teardown = EditionTeardown(
+            edition,
+            chunk_size=options.get("chunk_size"),
+            progress=self.report_teardown,
+        )
+        related_counts = teardown.count()
+
+        self.stdout.write("\nEdition to delete:")
+        self.stdout.write(f"ID: {edition.id}")
+        self.stdout.write(f"Collection: {edition.collection.album_template.name}")
+        self.stdout.write(f"Promotion: {edition.collection.promotion}")
+        self.stdout.write(f"Circulation: {edition.circulation}")
+        self.stdout.write("\nRelated objects to be deleted or detached:")
+
+        for label, count in related_counts.items():
+            self.stdout.write(f"- {label.capitalize()}: {count}")
+
+        if options.get("dry_run"):
+            self.stdout.write(self.style.WARNING("\nDry run, nothing was deleted"))
+            return
+
+        if (
+            input("\nAre you sure you want to delete this edition? [y/N]: ").lower()
+            != "y"
+        ):
+            self.stdout.write(self.style.WARNING("Operation cancelled"))
+            return
+
+        started = time.perf_counter()
+        done = teardown.run()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nEdition {edition_id} successfully deleted in {elapsed:.2f}s with:"
+                f"\n- {done['boxes']} boxes"
+                f"\n- {done['packs']} packs"
+                f"\n- {done['stickers']} stickers"
+            )
+        )
 
+    def export_manifest(self, options):
+        """
+        Writes the print manifest of an edition (boxes, packs and their
+        stickers, in order) as compressed parts in the default storage or a
+        local directory, reading it with a server-side cursor.
+        Sintax:
+            python manage.py handle_editions export <edition_id> [--format csv|parquet] [--output-dir <dir>] [--chunk-rows <n>]
+        """
+        edition_id = options["edition_id"]
+
+        try:
+            edition = Edition.objects.select_related("collection").get(id=edition_id)
         except ObjectDoesNotExist:
             self.stdout.write(
                 self.style.ERROR(f"Edition with ID {edition_id} does not exist")
             )
+            return
+
+        storage = None
+
+        if options.get("output_dir"):
+            storage = FileSystemStorage(location=options["output_dir"])
+
+        try:
+            export = ManifestExport(
+                edition,
+                format=options.get("format") or "csv",
+                storage=storage,
+                chunk_rows=options.get("chunk_rows"),
+            )
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        started = time.perf_counter()
+        names = export.run(progress=self.report_export)
+        elapsed = time.perf_counter() - started
+
+        if not names:
+            self.stdout.write(
+                self.style.WARNING(f"Edition {edition_id} has no stickers to export")
+            )
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nManifest of edition {edition_id} exported in {elapsed:.2f}s"
+                f" to {len(names)} parts under {export.prefix}"
+            )
+        )
+
+    def report_export(self, name, rows_done):
+        self.stdout.write(f"{name}: {rows_done} rows")
+
+    def report_teardown(self, label, rows_done, fraction):
+        self.stdout.write(f"{label}: {rows_done} rows ({fraction:.0%})")
+
+    def rebuild_ownership(self, options):
+        """
+        Recomputes the per-collector ownership counts of a collection from
+        its stickers, repairing counts that drifted. The collection's rows are
+        replaced in one transaction, so openings and rescues in the
+        collection wait for it.
+        Sintax:
+            python manage.py handle_editions rebuild-ownership --collection <collection_id>
+        """
+        try:
+            collection = Collection.objects.get(id=options["collection"])
+        except Collection.DoesNotExist:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Collection with ID {options['collection']} does not exist"
+                )
+            )
+            return
+
+        Ownership.rebuild(collection)
+        rows = Ownership.objects.filter(collection=collection).count()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ownership of collection {collection.id} rebuilt: {rows} rows"
+            )
+        )
+
+    def partition(self, options):
+        """
+        Partitions the pack and sticker tables by edition on PostgreSQL, for
+        databases migrated before EDITIONS_PARTITIONED was enabled. Tables are
+        locked and rewritten, so run it in a maintenance window.
+        Sintax:
+            python manage.py handle_editions partition
+        """
+        if connection.vendor != "postgresql":
+            self.stdout.write(self.style.ERROR("Partitioning requires PostgreSQL"))
+            return
+
+        pending = [table for table in PARTITIONED_TABLES if not is_partitioned(table)]
+
+        if not pending:
+            self.stdout.write(self.style.WARNING("Tables are already partitioned"))
+            return
+
+        self.stdout.write(f"\nTables to partition by edition: {', '.join(pending)}")
+
+        if input("\nProceed? Tables are locked meanwhile [yes/N]: ").lower() != "yes":
+            self.stdout.write(self.style.WARNING("Operation cancelled"))
+            return
+
+        with transaction.atomic():
+            partitioned = partition_tables()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"\nPartitioned: {', '.join(partitioned)}")
+        )
@@ -0,0 +1,97 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from collection_manager.models import Collection
+from editions.completion import CompletionSimulator
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulates collectors opening packs of a collection and reports the "
+        "packs needed to complete each page and the album, with percentiles"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("collection_id", type=int, help="Collection ID")
+        parser.add_argument(
+            "--collectors",
+            type=int,
+            default=1000000,
+            help="Number of simulated collectors",
+        )
+        parser.add_argument(
+            "--circulation",
+            type=int,
+            default=None,
+            help="Draw from the quotas printed at this circulation instead of "
+            "the raw rarity factors",
+        )
+        parser.add_argument(
+            "--no-rescue",
+            action="store_true",
+            help="Collectors only open packs, without the rescue pool",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=None, help="Seed for reproducible results"
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the results as JSON"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Sintax:
+            python manage.py simulate_completion <collection_id> [--collectors <n>] [--circulation <n>] [--no-rescue] [--seed <n>] [--json]
+        """
+        try:
+            collection = Collection.objects.get(id=options["collection_id"])
+        except Collection.DoesNotExist:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Collection with ID {options['collection_id']} does not exist"
+                )
+            )
+            return
+
+        try:
+            simulator = CompletionSimulator(
+                collection,
+                circulation=options["circulation"],
+                seed=options["seed"],
+            )
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        started = time.perf_counter()
+        results = simulator.run(options["collectors"], rescue=not options["no_rescue"])
+        elapsed = time.perf_counter() - started
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"\nCollection: {collection.album_template.name}")
+        self.stdout.write(
+            f"Collectors: {results['collectors']}, "
+            f"rescue pool: {'yes' if results['rescue'] else 'no'}"
+        )
+        self.stdout.write("\nPacks to complete:")
+
+        for page, summary in results["pages"].items():
+            self.stdout.write(f"- Page {page}: {self.format_summary(summary)}")
+
+        self.stdout.write(f"- Album: {self.format_summary(results['album'])}")
+
+        if results["rescue_availability"]:
+            self.stdout.write(
+                f"\nRescue pool availability: "
+                f"mean {results['rescue_availability']['mean']:.1%}, "
+                f"worst coordinate {results['rescue_availability']['min']:.1%}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"\nSimulated in {elapsed:.2f}s"))
+
+    def format_summary(self, summary):
+        return ", ".join(f"{key} {value}" for key, value in summary.items())
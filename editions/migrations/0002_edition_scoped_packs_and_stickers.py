@@ -0,0 +1,70 @@
+# Generated by Django 5.1.7 on 2026-10-17 22:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_edition(apps, schema_editor):
+    Box = apps.get_model("editions", "Box")
+    Pack = apps.get_model("editions", "Pack")
+    Sticker = apps.get_model("editions", "Sticker")
+
+    Pack.objects.filter(box__isnull=False).update(
+        edition_id=Subquery(
+            Box.objects.filter(pk=OuterRef("box_id")).values("edition_id")[:1]
+        )
+    )
+    Sticker.objects.filter(pack__isnull=False).update(
+        edition_id=Subquery(
+            Pack.objects.filter(pk=OuterRef("pack_id")).values("edition_id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("collection_manager", "0001_initial"),
+        ("editions", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pack",
+            name="edition",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="packs",
+                to="editions.edition",
+            ),
+        ),
+        migrations.AddField(
+            model_name="sticker",
+            name="edition",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="stickers",
+                to="editions.edition",
+            ),
+        ),
+        migrations.RunPython(backfill_edition, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="pack",
+            index=models.Index(
+                fields=["edition", "box"], name="editions_pa_edition_be346a_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sticker",
+            index=models.Index(
+                fields=["edition", "coordinate"], name="editions_st_edition_102cf4_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-17 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editions", "0003_edition_generation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="edition",
+            name="is_virtual",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="edition",
+            name="seed",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="edition",
+            name="sticker_quotas",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:03
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def backfill_has_prize(apps, schema_editor):
+    Pack = apps.get_model("editions", "Pack")
+    Sticker = apps.get_model("editions", "Sticker")
+
+    Pack.objects.filter(
+        Exists(Sticker.objects.filter(pack=OuterRef("pk"), coordinate__page=99))
+    ).update(has_prize=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editions", "0004_virtual_editions"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pack",
+            name="has_prize",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(backfill_has_prize, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="pack",
+            index=models.Index(
+                fields=["box", "has_prize"], name="editions_pa_box_id_3277e7_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editions", "0005_pack_has_prize"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EditionStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("boxes", models.BigIntegerField(default=0)),
+                ("packs", models.BigIntegerField(default=0)),
+                ("prize_packs", models.BigIntegerField(default=0)),
+                ("stickers", models.BigIntegerField(default=0)),
+                ("stickers_by_rarity", models.JSONField(default=dict)),
+                ("boxes_ordered", models.BigIntegerField(default=0)),
+                ("packs_sold", models.BigIntegerField(default=0)),
+                ("packs_opened", models.BigIntegerField(default=0)),
+                ("stickers_placed", models.BigIntegerField(default=0)),
+                ("invalid_boxes", models.IntegerField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "edition",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stats",
+                        to="editions.edition",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "edition stats",
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.db import migrations
+
+from editions.partitioning import partition_tables
+
+
+def partition_packs_and_stickers(apps, schema_editor):
+    if getattr(settings, "EDITIONS_PARTITIONED", False):
+        partition_tables(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editions", "0006_edition_stats"),
+    ]
+
+    operations = [
+        # partitioned tables are left as they are when migrating backwards,
+        # Django reads and writes them the same way
+        migrations.RunPython(partition_packs_and_stickers, migrations.RunPython.noop),
+    ]
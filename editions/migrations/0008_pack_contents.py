@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editions", "0007_partition_packs_and_stickers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pack",
+            name="contents",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.1.7 on 2026-10-17 23:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_ownership(apps, schema_editor):
+    Ownership = apps.get_model("editions", "Ownership")
+    Sticker = apps.get_model("editions", "Sticker")
+    rows = (
+        Sticker.objects.filter(collector__isnull=False, edition__isnull=False)
+        .order_by()
+        .values("collector_id", "edition__collection_id", "coordinate_id")
+        .annotate(count=Count("id"))
+    )
+
+    Ownership.objects.bulk_create(
+        (
+            Ownership(
+                collector_id=row["collector_id"],
+                collection_id=row["edition__collection_id"],
+                coordinate_id=row["coordinate_id"],
+                count=row["count"],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("collection_manager", "0001_initial"),
+        ("editions", "0008_pack_contents"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Ownership",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("placed", models.BooleanField(default=False)),
+                (
+                    "collection",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ownerships",
+                        to="collection_manager.collection",
+                    ),
+                ),
+                (
+                    "collector",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ownerships",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "coordinate",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ownerships",
+                        to="collection_manager.coordinate",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("collector", "collection", "coordinate"),
+                        name="unique_ownership",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_ownership, migrations.RunPython.noop),
+    ]
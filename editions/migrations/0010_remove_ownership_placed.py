@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 01:01
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("editions", "0009_ownership"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="ownership",
+            name="placed",
+        ),
+    ]
@@ -1,8 +1,7 @@
-import random
 import logging
+import secrets
 
-from collections import deque
-from decimal import Decimal, ROUND_CEILING, ROUND_DOWN
+from decimal import Decimal
 from celery import shared_task
 
 from django.contrib import admin
@@ -10,17 +9,35 @@ from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
-from django.db.models import Case, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from datetime import date
 
 from promotions.models import Promotion
 from collection_manager.models import Collection, Coordinate, SurprisePrize
+from .partitioning import create_partitions, reserve_partitions
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
 
+def bump_album_version(collector_id, collection_id):
+    """See albums.models.Album.bump_version"""
+    # albums depends on editions, imported here to avoid the cycle
+    from albums.models import Album
+
+    Album.bump_version(collector_id, collection_id)
+
+
+def bump_album_versions(collector_ids, collection_id):
+    """See albums.models.Album.bump_versions"""
+    from albums.models import Album
+
+    Album.bump_versions(collector_ids, collection_id)
+
+
 class Edition(models.Model):
     """
     Represents a specific printing run of a collection within a promotion.
@@ -30,10 +47,22 @@ class Edition(models.Model):
     BATCH_SIZE = 1000
     MIN_PACK_POSITION = 1
     MIN_PRIZES_POSITON_GAP = 10
+    PRIZE_PACKS_PER_BOX = 2
+    # validate_distribution result keys and the check each one reports
+    VALIDATION_CHECKS = {
+        "prize_dist": "prize_distribution",
+        "pack_counts": "pack_counts",
+        "box_integrity": "box_integrity",
+    }
     collection = models.ForeignKey(Collection, on_delete=models.CASCADE)
     circulation = models.DecimalField(
         max_digits=20, decimal_places=0, default=Decimal("1")
     )
+    # virtual editions store boxes and packs only, stickers are derived from
+    # seed and sticker_quotas when each pack is opened
+    is_virtual = models.BooleanField(default=False)
+    seed = models.BigIntegerField(null=True, blank=True, editable=False)
+    sticker_quotas = models.JSONField(null=True, blank=True, editable=False)
 
     class Meta:
         indexes = [
@@ -41,95 +70,168 @@ class Edition(models.Model):
             models.Index(fields=["circulation"]),
         ]
 
+    def get_stats(self):
+        """The EditionStats row, rebuilt from the tables when it is missing"""
+        try:
+            return self.stats
+        except EditionStats.DoesNotExist:
+            return EditionStats.rebuild(self)
+
     def get_distribution_stats(self):
         """Returns key statistics about the edition distribution"""
-        cache_key = f"edition_{self.id}_stats"
-        stats = cache.get(cache_key)
-
-        if stats is None:
-            stats = {
-                "total_boxes": self.boxes.count(),
-                "total_packs": Pack.objects.filter(box__edition=self).count(),
-                "prize_packs": Pack.objects.filter(
-                    box__edition=self, stickers__coordinate__page=99
-                )
-                .distinct()
-                .count(),
-                "standard_packs": Pack.objects.filter(box__edition=self)
-                .exclude(stickers__coordinate__page=99)
-                .distinct()
-                .count(),
-            }
-            cache.set(cache_key, stats, timeout=3600)
+        stats = self.get_stats()
 
-        return stats
+        return {
+            "total_boxes": stats.boxes,
+            "total_packs": stats.packs,
+            "prize_packs": stats.prize_packs,
+            "standard_packs": stats.packs - stats.prize_packs,
+        }
 
     def validate_distribution(self):
         """Validates the complete distribution of the edition"""
-        cache_keys = [
-            f"edition_{self.id}_prize_dist",
-            f"edition_{self.id}_pack_counts",
-            f"edition_{self.id}_box_integrity",
-        ]
-
-        validations = {}
-        for key, validator in zip(
-            cache_keys,
-            [
-                self.validate_prize_distribution,
-                self.validate_pack_counts,
-                self.validate_box_integrity,
-            ],
-        ):
-            cached_result = cache.get(key)
-            if cached_result is None:
-                cached_result = validator()
-                cache.set(key, cached_result, timeout=3600)
-            validations[key] = cached_result
+        violations = self.get_cached_box_violations()
+        failed = {
+            check
+            for box_violations in violations.values()
+            for check, _ in box_violations
+        }
+        validations = {
+            f"edition_{self.id}_{key}": check not in failed
+            for key, check in self.VALIDATION_CHECKS.items()
+        }
 
         return all(validations.values()), validations
 
-    def validate_prize_distribution(self):
-        """Ensures correct prize pack distribution"""
-        boxes = (
-            self.boxes.all()
-            .prefetch_related("packs__stickers__coordinate")
-            .order_by("pk")
-        )
-        total_boxes = boxes.count()
+    def get_cached_box_violations(self):
+        cache_key = f"edition_{self.id}_box_violations"
+        violations = cache.get(cache_key)
+
+        if violations is None:
+            violations = self.get_box_violations()
+
+            # the boxes of an edition still being generated are incomplete
+            if not self.is_generating():
+                cache.set(cache_key, violations, timeout=3600)
+                EditionStats.objects.filter(edition=self).update(
+                    invalid_boxes=len(violations)
+                )
+
+        return violations
 
-        if total_boxes == 0:
-            return True
+    def forget_box_violations(self):
+        """Drops the cached violations and their count, e.g. once regenerated"""
+        cache.delete(f"edition_{self.id}_box_violations")
+        EditionStats.objects.filter(edition=self).update(invalid_boxes=None)
 
-        return all(
-            box.packs.filter(stickers__coordinate__page=99).distinct().count() == 2
-            for box in boxes[: total_boxes - 1]
+    def is_generating(self):
+        """Whether a background generation of the edition has not finished"""
+        return (
+            EditionGeneration.objects.filter(edition=self)
+            .exclude(status="done")
+            .exists()
         )
 
-    def validate_pack_counts(self):
-        """Validates pack counts in boxes"""
-        boxes = self.boxes.all().prefetch_related("packs").order_by("pk")
-        total_boxes = boxes.count()
+    def get_box_violations(self):
+        """
+        Checks every box of the edition with three queries (boxes, per-box pack
+        aggregates and packs without stickers) instead of per box and per pack
+        counts.
 
-        return all(
-            box.packs.count() == self.collection.album_template.layout.PACKS_PER_BOX
-            for box in boxes[: total_boxes - 1]
+        Returns a dict of box id -> list of (check, message) for the boxes that
+        break a rule. The last box (by pk) may hold fewer packs and prizes.
+        Unopened packs of a virtual edition have no stickers by design.
+        """
+        layout = self.collection.album_template.layout
+        boxes = list(self.boxes.order_by("pk").values_list("pk", flat=True))
+
+        if not boxes:
+            return {}
+
+        packs = {
+            row["box_id"]: row
+            for row in self.packs.order_by()
+            .values("box_id")
+            .annotate(
+                packs=models.Count("id"),
+                prize_packs=models.Count("id", filter=models.Q(has_prize=True)),
+                ordinals=models.Count("ordinal", distinct=True),
+            )
+        }
+        empty_packs = (
+            {}
+            if self.is_virtual
+            else dict(
+                self.packs.order_by()
+                .filter(
+                    ~models.Exists(Sticker.objects.filter(pack=models.OuterRef("pk")))
+                )
+                .values("box_id")
+                .annotate(empty=models.Count("id"))
+                .values_list("box_id", "empty")
+            )
         )
+        violations = {}
+
+        for box in boxes:
+            row = packs.get(box, {"packs": 0, "prize_packs": 0, "ordinals": 0})
+            box_violations = []
+
+            if box != boxes[-1]:
+                if row["prize_packs"] != self.PRIZE_PACKS_PER_BOX:
+                    box_violations.append(
+                        (
+                            "prize_distribution",
+                            f"{row['prize_packs']} prize packs, "
+                            f"expected {self.PRIZE_PACKS_PER_BOX}",
+                        )
+                    )
 
-    def validate_box_integrity(self):
-        """Ensures boxes have correct pack arrangement"""
-        boxes = self.boxes.all().prefetch_related("packs__stickers").order_by("pk")
+                if row["packs"] != layout.PACKS_PER_BOX:
+                    box_violations.append(
+                        (
+                            "pack_counts",
+                            f"{row['packs']} packs, expected {layout.PACKS_PER_BOX}",
+                        )
+                    )
+
+            if row["ordinals"] != row["packs"]:
+                box_violations.append(
+                    (
+                        "box_integrity",
+                        f"{row['packs'] - row['ordinals']} repeated pack ordinals",
+                    )
+                )
+
+            if empty_packs.get(box):
+                box_violations.append(
+                    ("box_integrity", f"{empty_packs[box]} packs without stickers")
+                )
 
-        return all(self._validate_single_box(box) for box in boxes)
+            if box_violations:
+                violations[box] = box_violations
 
-    def _validate_single_box(self, box):
-        """Helper method to validate individual box integrity"""
-        packs = box.packs.all().prefetch_related("stickers").order_by("ordinal")
+        return violations
 
-        return len(set(pack.ordinal for pack in packs)) == len(packs) and all(
-            pack.stickers.count() > 0 for pack in packs
+    def _passes(self, check):
+        return not any(
+            each == check
+            for box_violations in self.get_box_violations().values()
+            for each, _ in box_violations
         )
 
+    def validate_prize_distribution(self):
+        """Ensures correct prize pack distribution"""
+        return self._passes("prize_distribution")
+
+    def validate_pack_counts(self):
+        """Validates pack counts in boxes"""
+        return self._passes("pack_counts")
+
+    def validate_box_integrity(self):
+        """Ensures boxes have unique pack ordinals and no empty packs"""
+        return self._passes("box_integrity")
+
     def __str__(self):
         return f"{self.collection} ({self.circulation})"
 
@@ -174,347 +276,227 @@ class Edition(models.Model):
 
             raise ValidationError(error_messages)
 
-    @transaction.atomic
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super(Edition, self).save(*args, **kwargs)
-        self.create_stickers()
-        self.shuffle_stickers()
-        self.create_packs()
-        self.fill_packs()
-        self.shuffle_packs()
-        self.create_boxes()
-        self.fill_boxes()
-        self.shuffle_boxes()
-
-    def create_stickers(self):
-        with transaction.atomic():
-            BATCH_SIZE = 5000
-            sticker_list = []
-            ordinal = 1
-            prize_rarity = self.collection.album_template.layout.PRIZE_STICKER_RARITY
-            coordinates = list(
-                self.collection.album_template.coordinates.select_related()
-            )
-
-            limits = {
-                coord: (coord.rarity_factor * self.circulation).quantize(
-                    Decimal("1"),
-                    rounding=(
-                        ROUND_CEILING
-                        if coord.rarity_factor == prize_rarity
-                        else ROUND_DOWN
-                    ),
-                )
-                for coord in coordinates
-            }
-
-            for coordinate, limit in limits.items():
-                for _ in range(int(limit)):
-                    sticker = Sticker(
-                        coordinate=coordinate,
-                        ordinal=ordinal,
-                    )
-                    sticker_list.append(sticker)
-                    ordinal += 1
+    def save(self, *args, loader=None, background=False, generate=True, **kwargs):
+        """
+        Generates boxes, packs and stickers when the edition is created.
+
+        loader: optional editions.loaders loader used to insert the generated
+        rows; defaults to the ORM bulk_create loader.
+        background: when True the rows are written by the generate_edition
+        Celery task after this transaction commits, in checkpointed chunks
+        whose progress is kept in EditionGeneration.
+        generate: False only saves the edition, for callers that generate it
+        afterwards themselves (see generation.ShardedGeneration).
+        """
+        from .generation import EditionPlanner, get_planner_class
 
-                    if len(sticker_list) >= BATCH_SIZE:
-                        Sticker.objects.bulk_create(sticker_list)
-                        sticker_list.clear()
+        adding = self._state.adding
+        self.full_clean()
 
-            if sticker_list:
-                Sticker.objects.bulk_create(sticker_list)
+        if adding and self.pk is None:
+            # partitions are created before, not inside, the transaction that
+            # writes the edition's rows, see partitioning.reserve_partitions
+            self.pk = reserve_partitions()
 
-    def shuffle_stickers(self):
-        BATCH_SIZE = 5000
+            if self.pk:
+                kwargs["force_insert"] = True
 
         with transaction.atomic():
-            total_stickers = Sticker.objects.filter(pack__isnull=True).count()
+            if adding and self.is_virtual:
+                self.seed = self.seed or secrets.randbits(63)
+                self.sticker_quotas = EditionPlanner(self).get_sticker_limits()
 
-            ordinal_numbers = list(range(1, total_stickers + 1))
-            random.shuffle(ordinal_numbers)
+            super(Edition, self).save(*args, **kwargs)
 
-            for start in range(0, total_stickers, BATCH_SIZE):
-                end = start + BATCH_SIZE
-                batch_stickers = list(
-                    Sticker.objects.filter(pack__isnull=True)
-                    .only("id", "ordinal")
-                    .order_by("ordinal")[start:end]
-                )
+            if not adding or not generate:
+                return
 
-                updates = {
-                    sticker.id: ordinal_numbers[i]
-                    for i, sticker in enumerate(batch_stickers, start=start)
-                }
-
-                cases = [
-                    When(id=sticker_id, then=ordinal)
-                    for sticker_id, ordinal in updates.items()
-                ]
+            if background:
+                from .tasks import generate_edition
 
-                Sticker.objects.filter(id__in=updates.keys()).update(
-                    ordinal=Case(*cases)
+                generation = EditionGeneration.objects.create(
+                    edition=self,
+                    loader=loader.name if loader else "",
+                    seed=secrets.randbits(63),
                 )
+                transaction.on_commit(lambda: generate_edition.delay(generation.pk))
+                return
 
-    def create_packs(self):  # crea los packs de la edición
-        pack_list = []
-        stickers = Decimal(Sticker.objects.filter(pack__isnull=True).count())
-        limit = (
-            stickers / self.collection.album_template.layout.STICKERS_PER_PACK
-        ).quantize(Decimal("1"), rounding=ROUND_CEILING)
+            get_planner_class(self)(self, loader=loader).plan().write()
 
-        counter = 1
 
-        while counter <= limit:
-            pack = Pack(ordinal=counter)
-            pack_list.append(pack)
+@receiver(post_save, sender=Edition)
+def create_edition_partitions(sender, instance, created, raw=False, **kwargs):
+    # editions saved with an id of their own, Edition.save reserves the rest
+    if created and not raw:
+        create_partitions(instance.pk)
 
-            if len(pack_list) >= 1000:
-                Pack.objects.bulk_create(pack_list)
-                pack_list = []
 
-            counter += 1
+class EditionGeneration(models.Model):
+    """
+    Progress and checkpoint of an edition generated in the background.
 
-        Pack.objects.bulk_create(pack_list)
-        current_total = Pack.objects.all().count()
-        # logging.info(f"Total de packs creados: {current_total}")
+    The layout is planned from seed, so a restarted job rebuilds exactly the
+    same plan and continues writing after the rows_done already committed.
+    """
 
-    def remove_excess_prize_stickers(self):
-        """
-        Ensures exactly 2 prize stickers per box by removing excess ones
-        """
-        total_boxes = self.boxes.count()
-        needed_prize_stickers = total_boxes * 2
-        # logging.info(f"Needed prize stickers: {needed_prize_stickers}")
-        prize_stickers = Sticker.objects.filter(
-            pack__box__isnull=True, coordinate__absolute_number=0
-        )
-        # logging.info(f"Total prize stickers: {prize_stickers.count()}")
-        excess_count = prize_stickers.count() - needed_prize_stickers
-        # logging.info(f"Excess prize stickers: {excess_count}")
-
-        if excess_count > 0:
-            excess_sticker_ids = prize_stickers.values_list("id", flat=True)[
-                :excess_count
-            ]
-            Sticker.objects.filter(id__in=excess_sticker_ids).delete()
-        # logging.info(f"Total prize stickers after removal: {prize_stickers.count()}")
-
-    def fill_packs(self):
-        skipped_prized_stickers = deque()
-        sticker_list = []
-        packs = list(Pack.objects.filter(box__isnull=True))
-        stickers = list(Sticker.objects.filter(pack__isnull=True).order_by("ordinal"))
+    GENERATION_STATUS = [
+        ("pending", "Pendiente"),
+        ("running", "En proceso"),
+        ("done", "Completada"),
+        ("failed", "Fallida"),
+    ]
 
-        for pack in packs:
-            prized_sticker_in_pack = False
-            stickers_in_pack = 0
+    edition = models.OneToOneField(
+        Edition, on_delete=models.CASCADE, related_name="generation"
+    )
+    status = models.CharField(
+        max_length=10, choices=GENERATION_STATUS, default="pending"
+    )
+    stage = models.CharField(max_length=20, blank=True)
+    loader = models.CharField(max_length=10, blank=True)
+    seed = models.BigIntegerField()
+    rows_done = models.BigIntegerField(default=0)
+    rows_total = models.BigIntegerField(default=0)
+    # rows_done when the current run started, so resumed runs report their rate
+    rows_at_start = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
-            while (
-                stickers_in_pack
-                < self.collection.album_template.layout.STICKERS_PER_PACK
-            ):
+    def __str__(self):
+        return f"Generation of edition {self.edition_id}: {self.status}"
 
-                if not stickers and not skipped_prized_stickers:
-                    break
+    @property
+    def progress(self):
+        if not self.rows_total:
+            return 1.0 if self.status == "done" else 0.0
 
-                sticker = (
-                    stickers.pop(0) if stickers else skipped_prized_stickers.popleft()
-                )
+        return self.rows_done / self.rows_total
 
-                if sticker.coordinate.absolute_number == 0:
-                    if prized_sticker_in_pack:
-                        skipped_prized_stickers.append(sticker)
-                        continue
-                    prized_sticker_in_pack = True
+    @property
+    def rows_per_second(self):
+        if not self.started_at:
+            return 0.0
 
-                sticker.pack = pack
-                sticker_list.append(sticker)
-                stickers_in_pack += 1
+        elapsed = (
+            (self.finished_at or timezone.now()) - self.started_at
+        ).total_seconds()
 
-            if len(sticker_list) >= self.BATCH_SIZE:
-                Sticker.objects.bulk_update(sticker_list, ["pack"])
-                sticker_list.clear()
+        return (self.rows_done - self.rows_at_start) / elapsed if elapsed > 0 else 0.0
 
-        if sticker_list:
-            Sticker.objects.bulk_update(sticker_list, ["pack"])
+    @property
+    def eta_seconds(self):
+        """Seconds left at the current rate, None while it is unknown"""
+        if self.status == "done":
+            return 0
 
-    def shuffle_packs(self):  # desordena el atributo ordinal de los packs
-        pack_list = list(Pack.objects.filter(box__isnull=True))
-        ordinals = list(range(1, len(pack_list) + 1))
-        random.shuffle(ordinals)
+        rate = self.rows_per_second
 
-        counter = 1
+        if not rate or not self.rows_total:
+            return None
 
-        for i, pack in enumerate(pack_list):
-            pack.ordinal = ordinals[i]
+        return round((self.rows_total - self.rows_done) / rate)
 
-        Pack.objects.bulk_update(pack_list, ["ordinal"], batch_size=self.BATCH_SIZE)
 
-    def create_boxes(self):  # crea los boxes correspondientes a la edition
-        box_list = []
-        total_packs = Pack.objects.filter(box__isnull=True).count()
-        limit = Decimal(
-            total_packs / self.collection.album_template.layout.PACKS_PER_BOX
-        ).quantize(Decimal("1"), rounding=ROUND_CEILING)
-        counter = 1
+class EditionStats(models.Model):
+    """
+    Rollup of an edition written by generation and kept current with F()
+    increments by Order, Sale, Pack.open and Slot.place_sticker, so admin
+    and API read one row instead of counting packs and stickers.
+    """
 
-        while counter <= limit:
-            box = Box(
-                edition=self,
-                ordinal=counter,
-            )
-            box_list.append(box)
-            counter += 1
+    edition = models.OneToOneField(
+        Edition, on_delete=models.CASCADE, related_name="stats"
+    )
+    boxes = models.BigIntegerField(default=0)
+    packs = models.BigIntegerField(default=0)
+    prize_packs = models.BigIntegerField(default=0)
+    stickers = models.BigIntegerField(default=0)
+    # rarity factor (as text) -> printed stickers
+    stickers_by_rarity = models.JSONField(default=dict)
+    boxes_ordered = models.BigIntegerField(default=0)
+    packs_sold = models.BigIntegerField(default=0)
+    packs_opened = models.BigIntegerField(default=0)
+    stickers_placed = models.BigIntegerField(default=0)
+    # boxes failing validate_distribution the last time it ran, None if never
+    invalid_boxes = models.IntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
-        Box.objects.bulk_create(box_list)
+    class Meta:
+        verbose_name_plural = "edition stats"
 
-    def _generate_prize_positions(self):
-        """Generate random positions for prize packs with significant spacing."""
-        positions = set()
+    def __str__(self):
+        return f"Stats of edition {self.edition_id}"
 
-        while len(positions) < 2:
-            pos = random.randrange(
-                1, self.collection.album_template.layout.PACKS_PER_BOX
-            )
-            if not any(abs(pos - p) <= self.MIN_PRIZES_POSITON_GAP for p in positions):
-                positions.add(pos)
-        return sorted(positions)
+    @classmethod
+    def record(cls, edition, **values):
+        """Writes the generation figures of an edition"""
+        stats, _ = cls.objects.update_or_create(edition=edition, defaults=values)
 
-    def _fill_single_box(
-        self, box, prize_positions, standard_packs, prize_packs, pack_list
-    ):
-        """
-        Fill a box with packs. The last box can contain fewer packs than expected.
-        Returns the number of packs placed in the box.
-        """
-        pack_counter = 0
-        position = 1
-        # logging.info(f"Placing packs in box {box.id}")
-        box_packs = []
-        # logging.info(f"Prize positions for box {box.id}: {prize_positions}")
-        packs_to_place = min(
-            self.collection.album_template.layout.PACKS_PER_BOX,
-            len(standard_packs) + len(prize_packs),
-        )
-        # logging.info(f"Packs to place in box {box.id}: {packs_to_place}")
-        # if packs_to_place < 100:
-
-        # logging.info(f"Starting to fill box {box.id}")
-        # logging.info(f"Prize positions: {prize_positions}")
-        # logging.info(f"Available standard packs: {len(standard_packs)}")
-        # logging.info(f"Available prize packs: {len(prize_packs)}")
-
-        while position <= packs_to_place:
-            pack_counter = position
-            # if packs_to_place < 100:
-            # logging.info(f"Pack counter: {pack_counter}")
-
-            if pack_counter in prize_positions and prize_packs:
-                pack = prize_packs.pop(0)
-                # if packs_to_place < 100:
-                # logging.info(f"Position {position}: Placed prize pack")
-            elif standard_packs:
-                pack = standard_packs.pop(0)
-                # if packs_to_place < 100:
-                # logging.info(f"Position {position}: Placed standard pack")
-            elif prize_packs:
-                pack = prize_packs.pop(0)
-                # logging.info(f"Position {position}: Placed prize pack")
-            else:
-                # logging.info("No more packs to place")
-
-                break
-            pack.box = box
-            box_packs.append(pack)
-            position += 1
-
-        # logging.info(f"Total packs placed in box {box.id}: {len(box_packs)}")
-        pack_list.extend(box_packs)
-
-        # logger.info(f"Box {box.id} filled with {len(box_packs)} packs")
-        if len(pack_list) >= self.BATCH_SIZE:
-            Pack.objects.bulk_update(pack_list, ["box"])
-            pack_list.clear()
-
-        return len(box_packs)
-
-    def fill_boxes(self):
+        return stats
+
+    @classmethod
+    def increment(cls, edition_id, **deltas):
         """
-        Distributes packs into boxes ensuring prize pack distribution.
-        Returns the total number of boxes filled.
+        Adds deltas to counters once the caller's transaction commits, so
+        concurrent openings and sales of an edition do not wait on its stats
+        row until they commit. A rollback leaves the counters as they were.
         """
-        prize_packs = list(
-            Pack.objects.filter(box__isnull=True)
-            .prefetch_related("stickers")
-            .filter(stickers__coordinate__page=99)
-            .distinct()
-            .order_by("ordinal")
+        transaction.on_commit(lambda: cls.apply_deltas(edition_id, deltas))
+
+    @classmethod
+    def apply_deltas(cls, edition_id, deltas):
+        """Adds deltas to counters, rebuilding the row when it is missing"""
+        updated = cls.objects.filter(edition_id=edition_id).update(
+            **{field: models.F(field) + delta for field, delta in deltas.items()},
+            updated_at=timezone.now(),
         )
-        # logging.info(f"Prize packs before removal: {len(prize_packs)}")
-
-        self.remove_excess_prize_stickers()
-        pack_list = []
-        total_packs_distributed = 0
-
-        total_packs = Pack.objects.filter(box__isnull=True).count()
-        # logging.info(f"Total packs before classification: {total_packs}")
-        standard_packs = list(
-            Pack.objects.filter(box__isnull=True)
-            .prefetch_related("stickers")
-            .exclude(stickers__coordinate__page=99)
-            .distinct()
-            .order_by("ordinal")
-        )
-        # logging.info(f"standard_packs: {len(standard_packs)}")
-
-        prize_packs = list(
-            Pack.objects.filter(box__isnull=True)
-            .prefetch_related("stickers")
-            .filter(stickers__coordinate__page=99)
-            .distinct()
-            .order_by("ordinal")
-        )
-        # logging.info(f"prize_packs: {len(prize_packs)}")
-        remaining_packs = len(standard_packs) + len(prize_packs)
-
-        # logging.info(f"Total packs after classification: {remaining_packs}")
 
-        for box in self.boxes.iterator():
-            packs_for_this_box = min(
-                self.collection.album_template.layout.PACKS_PER_BOX, remaining_packs
-            )
-            # # logging.info(f"Box {box.id} will receive {packs_for_this_box} packs")
-            prize_positions = self._generate_prize_positions()
-            packs_placed = self._fill_single_box(
-                box, prize_positions, standard_packs, prize_packs, pack_list
-            )
-            total_packs_distributed += packs_placed
-            # # logging.info(f"Total packs placed in box {box.id}: {packs_placed}")
-            remaining_packs -= packs_placed
-            # logging.info(f"Remaining packs: {remaining_packs}")
-        if pack_list:
-            Pack.objects.bulk_update(pack_list, ["box"])
-
-        return self.boxes.count()
-
-    def shuffle_boxes(self):
-        boxes = self.boxes.all()
-        list = []
-        counter = 1
+        if not updated:
+            edition = Edition.objects.filter(pk=edition_id).first()
 
-        while counter <= boxes.count():
-            list.append(counter)
-            counter += 1
+            if edition:
+                cls.rebuild(edition)
 
-        random.shuffle(list)
-        counter = 0
-
-        for cada_box in boxes:
-            cada_box.ordinal = list[counter]
-            counter += 1
+    @classmethod
+    def rebuild(cls, edition):
+        """Recomputes every figure from the tables, e.g. for older editions"""
+        packs = edition.packs.aggregate(
+            total=models.Count("id"),
+            prize=models.Count("id", filter=models.Q(has_prize=True)),
+            sold=models.Count("id", filter=models.Q(sale__isnull=False)),
+            opened=models.Count("id", filter=models.Q(is_open=True)),
+        )
 
-        Box.objects.bulk_update(boxes, ["ordinal"])
+        if edition.is_virtual:
+            from .generation import VirtualEditionPlanner
+
+            printed = VirtualEditionPlanner(edition).get_stats()
+        else:
+            printed = {
+                "stickers_by_rarity": {
+                    str(row["coordinate__rarity_factor"]): row["count"]
+                    for row in edition.stickers.order_by()
+                    .values("coordinate__rarity_factor")
+                    .annotate(count=models.Count("id"))
+                }
+            }
+            printed["stickers"] = sum(printed["stickers_by_rarity"].values())
+
+        return cls.record(
+            edition,
+            boxes=edition.boxes.count(),
+            packs=packs["total"],
+            prize_packs=packs["prize"],
+            stickers=printed["stickers"],
+            stickers_by_rarity=printed["stickers_by_rarity"],
+            boxes_ordered=edition.boxes.filter(order__isnull=False).count(),
+            packs_sold=packs["sold"],
+            packs_opened=packs["opened"],
+            stickers_placed=edition.stickers.filter(slot__isnull=False).count(),
+        )
 
 
 class Box(models.Model):
@@ -536,24 +518,59 @@ class Pack(models.Model):
     collector = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="packs", null=True
     )
+    edition = models.ForeignKey(
+        Edition, null=True, blank=True, on_delete=models.CASCADE, related_name="packs"
+    )
     box = models.ForeignKey(
         Box, null=True, blank=True, on_delete=models.CASCADE, related_name="packs"
     )
     ordinal = models.BigIntegerField("pack_ordinal", default=0)
     is_open = models.BooleanField(default=False)
+    # set by generation: the pack holds a prize sticker
+    has_prize = models.BooleanField(default=False)
+    # set by generation: absolute numbers of the stickers in the pack, see
+    # encode_contents. Sealed packs are shown without reading their stickers
+    contents = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    # bits per sticker in contents, absolute numbers up to 2**16 - 2
+    CONTENTS_BITS = 16
 
     class Meta:
         indexes = [
             models.Index(fields=["collector", "is_open"]),
+            models.Index(fields=["edition", "box"]),
+            models.Index(fields=["box", "has_prize"]),
         ]
 
-    @property
-    def edition(self):
-        return self.box.edition
-
     def __str__(self):
         return f"Pack N°: {self.id}"
 
+    @classmethod
+    def encode_contents(cls, absolute_numbers):
+        """
+        Packs the absolute numbers of a pack's stickers, in ordinal order,
+        into one integer: CONTENTS_BITS per sticker holding the number plus
+        one, so the prize sticker (number 0) is told apart from no sticker.
+        """
+        contents = 0
+
+        for position, number in enumerate(absolute_numbers):
+            contents |= (number + 1) << (cls.CONTENTS_BITS * position)
+
+        return contents
+
+    @classmethod
+    def decode_contents(cls, contents):
+        """Absolute numbers of the stickers packed by encode_contents"""
+        mask = (1 << cls.CONTENTS_BITS) - 1
+        numbers = []
+
+        while contents:
+            numbers.append((contents & mask) - 1)
+            contents >>= cls.CONTENTS_BITS
+
+        return numbers
+
     @transaction.atomic
     def open(self, user):
         """
@@ -561,20 +578,164 @@ class Pack(models.Model):
         es necesario redundar con este atributo porque en las operaciones de rescate
         las stickers cambian de dueño
         """
+        was_open = self.is_open
         self.is_open = True
-        self.save()
+        self.save(update_fields=["is_open"])
+
+        if self.edition_id and self.edition.is_virtual:
+            self.materialize_stickers()
+
+        if self.edition_id and not was_open:
+            EditionStats.increment(self.edition_id, packs_opened=1)
+
+        stickers = list(self.stickers.select_related("coordinate").order_by("ordinal"))
+
+        if stickers:
+            self.hand_over(stickers, user, self.edition.collection_id)
+
+        if self.edition_id:
+            bump_album_version(user.id, self.edition.collection_id)
+
+    @classmethod
+    @transaction.atomic
+    def open_many(cls, user, collection_id, pack_ids=None):
+        """
+        Opens the sealed packs of a collector in a collection, or those of
+        pack_ids among them, with one ownership lookup and one sticker update
+        for all of them. Returns the opened packs in box and pack order.
+        """
+        packs = cls.objects.select_for_update(of=("self",)).filter(
+            collector=user, edition__collection=collection_id, is_open=False
+        )
+
+        if pack_ids is not None:
+            packs = packs.filter(pk__in=pack_ids)
+
+        packs = list(packs.select_related("edition").order_by("box_id", "ordinal"))
+
+        if not packs:
+            return packs
+
+        cls.objects.filter(pk__in=[pack.pk for pack in packs]).update(is_open=True)
+        opened_by_edition = {}
+
+        for pack in packs:
+            pack.is_open = True
+            opened_by_edition[pack.edition_id] = (
+                opened_by_edition.get(pack.edition_id, 0) + 1
+            )
+
+            if pack.edition.is_virtual:
+                pack.materialize_stickers()
+
+        for edition_id, opened in opened_by_edition.items():
+            EditionStats.increment(edition_id, packs_opened=opened)
+
+        order = {pack.pk: position for position, pack in enumerate(packs)}
+        stickers = sorted(
+            Sticker.objects.filter(pack__in=packs).select_related("coordinate"),
+            key=lambda sticker: (order[sticker.pack_id], sticker.ordinal),
+        )
+
+        if stickers:
+            cls.hand_over(stickers, user, collection_id)
+
+        bump_album_version(user.id, collection_id)
+
+        return packs
+
+    @staticmethod
+    def hand_over(stickers, user, collection_id):
+        """
+        Gives the stickers of opened packs, in opening order, to user with
+        one query for what they already own instead of check_is_repeated for
+        every sticker, one bulk update and one ownership increment.
+        """
+        counts = Ownership.counts(
+            user, collection_id, {sticker.coordinate_id for sticker in stickers}
+        )
+        # copies besides these stickers, those of a reopened pack are counted
+        for sticker in stickers:
+            if sticker.collector_id == user.id:
+                counts[sticker.coordinate_id] = counts.get(sticker.coordinate_id, 1) - 1
+
+        gained = {}
+        lost = {}
+
+        for each_sticker in stickers:
+            if each_sticker.collector_id != user.id:
+                gained[each_sticker.coordinate_id] = (
+                    gained.get(each_sticker.coordinate_id, 0) + 1
+                )
+
+                if each_sticker.collector_id:
+                    previous = lost.setdefault(each_sticker.collector_id, {})
+                    previous[each_sticker.coordinate_id] = (
+                        previous.get(each_sticker.coordinate_id, 0) - 1
+                    )
 
-        for each_sticker in self.stickers.all():
             each_sticker.collector = user
-            each_sticker.save()
+
             if each_sticker.number > 0:
-                each_sticker.is_repeated = each_sticker.check_is_repeated()
+                # a second copy among these stickers is repeated as well
+                each_sticker.is_repeated = counts.get(each_sticker.coordinate_id, 0) > 0
                 each_sticker.on_the_board = not each_sticker.is_repeated
-                each_sticker.save()
+
+            counts[each_sticker.coordinate_id] = (
+                counts.get(each_sticker.coordinate_id, 0) + 1
+            )
+
+        Sticker.objects.bulk_update(
+            stickers, ["collector", "is_repeated", "on_the_board"]
+        )
+        Ownership.add(user.id, collection_id, gained)
+
+        for collector_id, deltas in lost.items():
+            Ownership.add(collector_id, collection_id, deltas)
+
+    def materialize_stickers(self):
+        """
+        Writes the Sticker rows of a pack of a virtual edition, derived from
+        the edition seed and the pack ordinal. Does nothing once they exist.
+        """
+        from .generation import VirtualEditionPlanner
+
+        # serializes concurrent openings of the same pack
+        Pack.objects.select_for_update().filter(pk=self.pk).first()
+
+        if self.stickers.exists():
+            return
+
+        planner = VirtualEditionPlanner(self.edition)
+        stickers = planner.pack_stickers(self.ordinal)
+        Sticker.objects.bulk_create(
+            Sticker(
+                edition_id=self.edition_id,
+                pack=self,
+                coordinate_id=coordinate_id,
+                ordinal=ordinal,
+            )
+            for coordinate_id, ordinal in stickers
+        )
+        absolute_numbers = {
+            coordinate.id: coordinate.absolute_number
+            for coordinate in planner.coordinates
+        }
+        self.contents = self.encode_contents(
+            absolute_numbers[coordinate_id] for coordinate_id, _ in stickers
+        )
+        Pack.objects.filter(pk=self.pk).update(contents=self.contents)
 
 
 class Sticker(models.Model):
     # instancia ejemplares de cada sticker definida en las coordinates
+    edition = models.ForeignKey(
+        Edition,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="stickers",
+    )
     pack = models.ForeignKey(
         Pack, null=True, blank=True, on_delete=models.CASCADE, related_name="stickers"
     )
@@ -589,32 +750,38 @@ class Sticker(models.Model):
     is_repeated = models.BooleanField(default=False)
     is_rescued = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["edition", "coordinate"]),
+        ]
+
     def check_is_repeated(self):
         """
         Returns True if the collector already has this sticker in their collection
         for the same edition
         """
-        if not self.collector:
+        if not self.collector_id:
             return False
 
-        query = Sticker.objects.filter(
-            collector=self.collector,
-            coordinate=self.coordinate,
-            pack__box__edition__collection=self.edition.collection,
-        ).exclude(id=self.id)
+        # the ownership count includes this sticker
+        count = (
+            Ownership.objects.filter(
+                collector_id=self.collector_id,
+                collection_id=self.edition.collection_id,
+                coordinate_id=self.coordinate_id,
+            )
+            .values_list("count", flat=True)
+            .first()
+        )
 
-        return query.exists()
+        return (count or 0) > 1
 
     def __str__(self):
-        return f"Barajita nº {self.number}, {self.pack.box.edition.collection}"
-
-    @property
-    def edition(self):
-        return self.pack.box.edition
+        return f"Barajita nº {self.number}, {self.edition.collection}"
 
     @property
     def collection(self):
-        return self.pack.box.edition.collection
+        return self.edition.collection
 
     @property
     @admin.display()
@@ -648,7 +815,15 @@ class Sticker(models.Model):
         if not random_prize:
             raise ValidationError("No hay premios disponibles")
 
-        return StickerPrize.objects.create(sticker=self, prize=random_prize)
+        with transaction.atomic():
+            sticker_prize = StickerPrize.objects.create(
+                sticker=self, prize=random_prize
+            )
+
+            if self.collector_id:
+                bump_album_version(self.collector_id, self.edition.collection_id)
+
+        return sticker_prize
 
     def has_prize_discovered(self):
         return hasattr(self, "prize")
@@ -660,11 +835,159 @@ class Sticker(models.Model):
         if self.collector == user:
             raise ValidationError("No puedes rescatar tus propias barajitas repetidas")
 
-        self.is_repeated = False
-        self.collector = user
-        self.on_the_board = True
-        self.is_rescued = True
-        self.save()
+        with transaction.atomic():
+            collection_id = self.edition.collection_id
+
+            if self.collector_id:
+                Ownership.add(
+                    self.collector_id, collection_id, {self.coordinate_id: -1}
+                )
+                bump_album_version(self.collector_id, collection_id)
+
+            Ownership.add(user.id, collection_id, {self.coordinate_id: 1})
+            bump_album_version(user.id, collection_id)
+            self.is_repeated = False
+            self.collector = user
+            self.on_the_board = True
+            self.is_rescued = True
+            self.save()
+
+
+class Ownership(models.Model):
+    """
+    Copies of each coordinate a collector owns in a collection, kept current
+    with F() increments by Pack.open and Sticker.rescue and decremented by
+    EditionTeardown, so repeated checks and the coordinates a collector
+    misses are one indexed lookup instead of scanning their stickers.
+    """
+
+    collector = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="ownerships"
+    )
+    collection = models.ForeignKey(
+        Collection, on_delete=models.CASCADE, related_name="ownerships"
+    )
+    coordinate = models.ForeignKey(
+        Coordinate, on_delete=models.CASCADE, related_name="ownerships"
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["collector", "collection", "coordinate"],
+                name="unique_ownership",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.collector} x{self.count} {self.coordinate}"
+
+    @classmethod
+    def counts(cls, collector, collection_id, coordinates=None):
+        """Coordinate id -> copies owned, only for the coordinates owned"""
+        rows = cls.objects.filter(
+            collector=collector, collection_id=collection_id, count__gt=0
+        )
+
+        if coordinates is not None:
+            rows = rows.filter(coordinate__in=coordinates)
+
+        return dict(rows.values_list("coordinate_id", "count"))
+
+    @classmethod
+    def add(cls, collector_id, collection_id, deltas):
+        """
+        Adds deltas (coordinate id -> copies, negative to remove) to the
+        counts of a collector in one statement, creating the missing rows
+        first so concurrent openings increment the same row.
+        """
+        deltas = {coordinate: delta for coordinate, delta in deltas.items() if delta}
+
+        if not deltas:
+            return
+
+        cls.objects.bulk_create(
+            [
+                cls(
+                    collector_id=collector_id,
+                    collection_id=collection_id,
+                    coordinate_id=coordinate,
+                )
+                for coordinate in deltas
+            ],
+            ignore_conflicts=True,
+        )
+        cls.objects.filter(
+            collector_id=collector_id,
+            collection_id=collection_id,
+            coordinate__in=deltas,
+        ).update(
+            # a removal racing with another one must not go below zero
+            count=Greatest(
+                models.F("count")
+                + models.Case(
+                    *(
+                        models.When(coordinate_id=coordinate, then=delta)
+                        for coordinate, delta in deltas.items()
+                    ),
+                    output_field=models.IntegerField(),
+                ),
+                0,
+            )
+        )
+
+    @staticmethod
+    def _copies_in(stickers):
+        # stickers of the outer ownership row
+        return stickers.filter(
+            collector_id=models.OuterRef("collector_id"),
+            coordinate_id=models.OuterRef("coordinate_id"),
+            edition__collection_id=models.OuterRef("collection_id"),
+        )
+
+    @classmethod
+    def release(cls, stickers):
+        """
+        Takes stickers about to be deleted off the counts of their collectors
+        in one statement, leaving the rest of their copies as they are.
+        """
+        copies = (
+            cls._copies_in(stickers)
+            .order_by()
+            .values("coordinate_id")
+            .annotate(copies=models.Count("id"))
+            .values("copies")
+        )
+        return cls.objects.filter(models.Exists(cls._copies_in(stickers))).update(
+            count=Greatest(models.F("count") - models.Subquery(copies), 0)
+        )
+
+    @classmethod
+    def rebuild(cls, collection):
+        """Recomputes the rows of a collection from its stickers"""
+        with transaction.atomic():
+            cls.objects.filter(collection=collection).delete()
+            rows = (
+                Sticker.objects.filter(
+                    edition__collection=collection, collector__isnull=False
+                )
+                .order_by()
+                .values("collector_id", "coordinate_id")
+                .annotate(count=models.Count("id"))
+            )
+            cls.objects.bulk_create(
+                (
+                    cls(
+                        collector_id=row["collector_id"],
+                        collection=collection,
+                        coordinate_id=row["coordinate_id"],
+                        count=row["count"],
+                    )
+                    for row in rows.iterator()
+                ),
+                batch_size=Edition.BATCH_SIZE,
+            )
 
 
 class StickerPrize(models.Model):
@@ -0,0 +1,321 @@
+"""
+Optional PostgreSQL list partitioning of the pack and sticker tables by
+edition, enabled with settings.EDITIONS_PARTITIONED.
+
+Each edition gets its own partition, so queries filtering by edition only
+touch that edition's rows, and deleting an edition drops its partitions.
+Rows without an edition fall into a default partition.
+
+PostgreSQL requires unique constraints on a partitioned table to include
+the partition key, so the primary key becomes a unique (id, edition_id)
+index, and foreign keys pointing to these tables are recreated on
+(id, edition_id). Tables that have an edition_id themselves (sticker to
+pack) reference it. The others (slot and prize to sticker, sale detail to
+pack) get a <column>_edition_id column, unknown to Django, that a trigger
+fills from the referenced row whenever the foreign key column is written.
+
+A new edition's partitions are created as standalone tables and attached,
+which locks the parent tables in SHARE UPDATE EXCLUSIVE mode, compatible
+with reads and writes, instead of the ACCESS EXCLUSIVE lock taken by
+CREATE TABLE ... PARTITION OF. Edition.save creates them in their own
+transaction before generation starts whenever it is not called inside one
+(see reserve_partitions).
+"""
+
+import logging
+
+from django.db import connection as default_connection
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ("editions_pack", "editions_sticker")
+PARTITION_KEY = "edition_id"
+
+
+def is_partitioned(table, connection=None):
+    connection = connection or default_connection
+
+    if connection.vendor != "postgresql":
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass(%s))",
+            [table],
+        )
+        return cursor.fetchone()[0]
+
+
+def partition_name(table, edition_id):
+    return f"{table}_e{edition_id}"
+
+
+def create_partitions(edition_id, connection=None):
+    """Adds the partitions of a new edition to every partitioned table"""
+    connection = connection or default_connection
+
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(table, connection):
+            continue
+
+        with connection.cursor() as cursor:
+            add_partition(cursor, connection, table, edition_id)
+
+
+def reserve_partitions(connection=None):
+    """
+    Takes the id of a new edition from its sequence and creates its
+    partitions, committing them right away unless the caller is already in
+    a transaction. Returns None, reserving nothing, when no table is
+    partitioned. Partitions of an edition that is not saved in the end stay
+    empty.
+    """
+    connection = connection or default_connection
+
+    if not any(is_partitioned(table, connection) for table in PARTITIONED_TABLES):
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence('editions_edition', 'id'))"
+        )
+        edition_id = cursor.fetchone()[0]
+
+    with transaction.atomic(using=connection.alias):
+        create_partitions(edition_id, connection)
+
+    return edition_id
+
+
+def add_partition(cursor, connection, table, edition_id):
+    quote = connection.ops.quote_name
+    name = partition_name(table, edition_id)
+    cursor.execute(
+        "SELECT 1 FROM pg_inherits "
+        "WHERE inhparent = to_regclass(%s) AND inhrelid = to_regclass(%s)",
+        [table, name],
+    )
+
+    if cursor.fetchone():
+        return
+
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {quote(name)} "
+        f"(LIKE {quote(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    # indexes and foreign keys of table are added to the partition on attach
+    cursor.execute(
+        f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} "
+        "FOR VALUES IN (%s)",
+        [edition_id],
+    )
+
+
+def drop_partition(table, edition_id, connection=None):
+    """
+    Detaches and drops the partition of an edition, returning the number of
+    rows it held, or None when the edition has no partition in table.
+    """
+    connection = connection or default_connection
+    name = partition_name(table, edition_id)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_inherits "
+            "WHERE inhparent = to_regclass(%s) AND inhrelid = to_regclass(%s)",
+            [table, name],
+        )
+
+        if cursor.fetchone() is None:
+            return None
+
+        quoted = connection.ops.quote_name(name)
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f"SELECT count(*) FROM {quoted}")
+        rows = cursor.fetchone()[0]
+        cursor.execute(
+            "ALTER TABLE {} DETACH PARTITION {}".format(
+                connection.ops.quote_name(table), quoted
+            )
+        )
+        cursor.execute(f"DROP TABLE {quoted}")
+
+    return rows
+
+
+def partition_table(table, connection=None):
+    """
+    Rebuilds table as a list partitioned table with one partition per
+    existing edition plus a default partition, keeping its rows, indexes,
+    foreign keys and id sequence. Runs in the caller's transaction
+    and holds an exclusive lock on table until it commits.
+    """
+    connection = connection or default_connection
+    quote = connection.ops.quote_name
+    old_table = f"{table}_unpartitioned"
+
+    with connection.cursor() as cursor:
+        # deferred foreign key checks pending on table would block ALTER TABLE
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f"LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE")
+
+        # foreign keys into table need a unique id, which it will not have,
+        # they are recreated on (id, edition_id) once it is partitioned
+        cursor.execute(
+            "SELECT c.conrelid::regclass::text, c.conname, a.attname, "
+            "EXISTS (SELECT 1 FROM pg_attribute e WHERE e.attrelid = c.conrelid "
+            "AND e.attname = %s AND NOT e.attisdropped) "
+            "FROM pg_constraint c JOIN pg_attribute a "
+            "ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1] "
+            "WHERE c.contype = 'f' AND c.confrelid = %s::regclass "
+            "AND c.conrelid <> c.confrelid AND c.conparentid = 0",
+            [PARTITION_KEY, table],
+        )
+        incoming_keys = cursor.fetchall()
+
+        for referencing, constraint, _, _ in incoming_keys:
+            cursor.execute(
+                f"ALTER TABLE {referencing} DROP CONSTRAINT {quote(constraint)}"
+            )
+
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            # keys into a partitioned table have a clone per partition
+            "WHERE contype = 'f' AND conrelid = %s::regclass AND conparentid = 0",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes i WHERE tablename = %s "
+            "AND NOT EXISTS (SELECT 1 FROM pg_constraint c "
+            "WHERE c.conindid = to_regclass(quote_ident(i.indexname)) "
+            "AND c.contype = 'p')",
+            [table],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f"SELECT last_value, is_called FROM {sequence}")
+        last_value, is_called = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old_table)}")
+        cursor.execute(
+            f"CREATE TABLE {quote(table)} (LIKE {quote(old_table)} "
+            f"INCLUDING DEFAULTS) PARTITION BY LIST ({quote(PARTITION_KEY)})"
+        )
+        cursor.execute(
+            f"CREATE TABLE {quote(table + '_default')} "
+            f"PARTITION OF {quote(table)} DEFAULT"
+        )
+
+        cursor.execute("SELECT id FROM editions_edition ORDER BY id")
+        for (edition_id,) in cursor.fetchall():
+            add_partition(cursor, connection, table, edition_id)
+
+        cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(old_table)}")
+        cursor.execute(f"DROP TABLE {quote(old_table)}")
+
+        # indexes are built once the rows are in place
+        for definition in indexes:
+            cursor.execute(definition)
+
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ADD CONSTRAINT "
+            f"{quote(table + '_id_edition_uniq')} UNIQUE (id, {quote(PARTITION_KEY)})"
+        )
+
+        for constraint, definition in foreign_keys:
+            cursor.execute(
+                f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(constraint)} "
+                f"{definition}"
+            )
+
+        for referencing, constraint, column, has_key in incoming_keys:
+            key, on_update = PARTITION_KEY, ""
+
+            if not has_key:
+                key = add_edition_column(cursor, connection, referencing, column, table)
+                # the added column follows a referenced row that moves
+                on_update = "ON UPDATE CASCADE "
+
+            cursor.execute(
+                f"ALTER TABLE {referencing} ADD CONSTRAINT {quote(constraint)} "
+                f"FOREIGN KEY ({quote(column)}, {quote(key)}) "
+                f"REFERENCES {quote(table)} (id, {quote(PARTITION_KEY)}) "
+                f"{on_update}DEFERRABLE INITIALLY DEFERRED"
+            )
+
+        cursor.execute(f"CREATE SEQUENCE {sequence} OWNED BY {quote(table)}.id")
+        cursor.execute("SELECT setval(%s, %s, %s)", [sequence, last_value, is_called])
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ALTER COLUMN id "
+            f"SET DEFAULT nextval('{sequence}')"
+        )
+
+    logger.info(f"{table} partitioned by {PARTITION_KEY}")
+
+
+def edition_column(column):
+    """Column holding the edition of the row referenced by column"""
+    return f"{column.removesuffix('_id')}_{PARTITION_KEY}"
+
+
+def add_edition_column(cursor, connection, referencing, column, table):
+    """
+    Adds to referencing the edition of the table row its column points to,
+    filled in for the existing rows and kept current by a trigger, so its
+    foreign key can reference (id, edition_id). Returns the column name.
+    """
+    quote = connection.ops.quote_name
+    name = edition_column(column)
+    function = quote(f"{referencing}_{name}_sync")
+
+    cursor.execute(
+        "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+        "WHERE attrelid = %s::regclass AND attname = %s",
+        [table, PARTITION_KEY],
+    )
+    column_type = cursor.fetchone()[0]
+
+    cursor.execute(
+        f"ALTER TABLE {referencing} ADD COLUMN IF NOT EXISTS {quote(name)} "
+        f"{column_type}"
+    )
+    cursor.execute(
+        f"UPDATE {referencing} r SET {quote(name)} = t.{quote(PARTITION_KEY)} "
+        f"FROM {quote(table)} t WHERE t.id = r.{quote(column)}"
+    )
+    cursor.execute(
+        f"CREATE OR REPLACE FUNCTION {function}() RETURNS trigger "
+        "LANGUAGE plpgsql AS $$ BEGIN "
+        f"NEW.{quote(name)} := (SELECT {quote(PARTITION_KEY)} FROM {quote(table)} "
+        f"WHERE id = NEW.{quote(column)}); "
+        "RETURN NEW; END $$"
+    )
+    cursor.execute(f"DROP TRIGGER IF EXISTS {function} ON {referencing}")
+    cursor.execute(
+        f"CREATE TRIGGER {function} BEFORE INSERT OR UPDATE OF {quote(column)} "
+        f"ON {referencing} FOR EACH ROW EXECUTE FUNCTION {function}()"
+    )
+
+    return name
+
+
+def partition_tables(connection=None):
+    """Partitions every table in PARTITIONED_TABLES that is not yet"""
+    connection = connection or default_connection
+    partitioned = []
+
+    if connection.vendor != "postgresql":
+        return partitioned
+
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(table, connection):
+            partition_table(table, connection)
+            partitioned.append(table)
+
+    return partitioned
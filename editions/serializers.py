@@ -1,9 +1,23 @@
-from rest_framework.serializers import ModelSerializer, SerializerMethodField, CharField
+from rest_framework.serializers import (
+    CharField,
+    FloatField,
+    IntegerField,
+    ModelSerializer,
+    SerializerMethodField,
+)
 
 from collection_manager.serializers import CollectionSerializer
+from collection_manager.models import Coordinate
 from collection_manager.serializers import CoordinateSerializer, SurprisePrizeSerializer
 from promotions.serializers import PromotionSerializer
-from .models import Edition, Pack, Sticker, StickerPrize
+from .models import (
+    Edition,
+    EditionGeneration,
+    EditionStats,
+    Pack,
+    Sticker,
+    StickerPrize,
+)
 
 
 class EditionSerializer(ModelSerializer):
@@ -14,6 +28,50 @@ class EditionSerializer(ModelSerializer):
         fields = ("id", "collection", "circulation")
 
 
+class EditionGenerationSerializer(ModelSerializer):
+    status_display = CharField(source="get_status_display")
+    progress = FloatField(read_only=True)
+    rows_per_second = FloatField(read_only=True)
+    eta_seconds = IntegerField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = EditionGeneration
+        fields = (
+            "edition",
+            "status",
+            "status_display",
+            "stage",
+            "rows_done",
+            "rows_total",
+            "progress",
+            "rows_per_second",
+            "eta_seconds",
+            "error",
+            "started_at",
+            "updated_at",
+            "finished_at",
+        )
+
+
+class EditionStatsSerializer(ModelSerializer):
+    class Meta:
+        model = EditionStats
+        fields = (
+            "edition",
+            "boxes",
+            "packs",
+            "prize_packs",
+            "stickers",
+            "stickers_by_rarity",
+            "boxes_ordered",
+            "packs_sold",
+            "packs_opened",
+            "stickers_placed",
+            "invalid_boxes",
+            "updated_at",
+        )
+
+
 class StickerPrizeSerializer(ModelSerializer):
     prize = SurprisePrizeSerializer(read_only=True)
     status_display = CharField(source="get_status_display")
@@ -55,7 +113,13 @@ class StickerSerializer(ModelSerializer):
 
 
 class PackSerializer(ModelSerializer):
-    stickers = StickerSerializer(many=True, read_only=True)
+    """
+    Sealed packs list the coordinates they hold from Pack.contents, without
+    reading the sticker table; stickers are listed once the pack is open.
+    """
+
+    stickers = SerializerMethodField()
+    contents = SerializerMethodField()
 
     class Meta:
         model = Pack
@@ -63,5 +127,38 @@ class PackSerializer(ModelSerializer):
             "id",
             "is_open",
             "collector",
+            "contents",
             "stickers",
         )
+
+    def get_stickers(self, obj):
+        if not obj.is_open and obj.contents is not None:
+            return []
+
+        return StickerSerializer(obj.stickers.all(), many=True).data
+
+    def get_contents(self, obj):
+        if obj.contents is None:
+            return None
+
+        coordinates = self.get_coordinates(obj.edition_id)
+
+        return CoordinateSerializer(
+            [coordinates[number] for number in Pack.decode_contents(obj.contents)],
+            many=True,
+        ).data
+
+    def get_coordinates(self, edition_id):
+        """Coordinates of the edition's album by absolute number, once per edition"""
+        if not hasattr(self, "_coordinates"):
+            self._coordinates = {}
+
+        if edition_id not in self._coordinates:
+            self._coordinates[edition_id] = {
+                coordinate.absolute_number: coordinate
+                for coordinate in Coordinate.objects.filter(
+                    template__collections__edition=edition_id
+                )
+            }
+
+        return self._coordinates[edition_id]
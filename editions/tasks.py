@@ -0,0 +1,26 @@
+from celery import shared_task
+import logging
+from .models import EditionGeneration
+
+logger = logging.getLogger(__name__)
+
+
+# acks_late + reject_on_worker_lost: a worker crash returns the message to the
+# broker and the next worker resumes from the last committed checkpoint
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def generate_edition(generation_id):
+    from .generation import ResumableGeneration
+
+    generation = EditionGeneration.objects.select_related("edition").get(
+        id=generation_id
+    )
+
+    if not ResumableGeneration(generation).run():
+        logger.info(
+            f"Edition {generation.edition_id} is being generated by another worker"
+        )
+        return
+
+    logger.info(
+        f"Edition {generation.edition_id} generated: {generation.rows_done} rows"
+    )
@@ -0,0 +1,166 @@
+import logging
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models, transaction
+
+from .models import Box, Edition, Ownership, Pack, Sticker, bump_album_versions
+from .partitioning import drop_partition, is_partitioned
+
+logger = logging.getLogger(__name__)
+
+
+class EditionTeardown:
+    """
+    Deletes an edition without Django's cascade collector, which loads every
+    box, pack, sticker and their dependents into memory before deleting them.
+
+    Rows are removed with set-based statements over primary key ranges, in
+    dependency order: references to the stickers, packs and boxes of the
+    edition (slots, sale details, prizes, orders) are cleared or deleted
+    first, following the on_delete of each relation, then the stickers, packs
+    and boxes themselves. Collectors' ownership counts and album versions
+    are updated in the chunk that removes their stickers and packs. Every
+    chunk commits on its own, so an interrupted teardown is finished by
+    running it again. Tables
+    partitioned by edition (see editions.partitioning) drop the edition's
+    partition instead.
+    """
+
+    CHUNK_SIZE = 50000
+    # parents last, the same order the cascade collector would delete them in
+    MODELS = (Sticker, Pack, Box)
+
+    def __init__(self, edition, chunk_size=None, progress=None):
+        self.edition = edition
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+        # progress(label, rows_done, fraction) is called after every chunk
+        self.progress = progress
+
+    def get_rows(self, model):
+        return model.objects.filter(edition=self.edition)
+
+    def get_steps(self):
+        """
+        Returns (label, queryset, action) in execution order, action being
+        "delete", "cascade" (ORM delete), "drop" (the edition's partition) or
+        the name of the field to set to NULL.
+        """
+        steps = []
+
+        for model in self.MODELS:
+            rows = self.get_rows(model)
+
+            for relation in model._meta.related_objects:
+                related_model = relation.related_model
+
+                if related_model in self.MODELS or relation.many_to_many:
+                    continue
+
+                dependents = related_model._base_manager.filter(
+                    **{f"{relation.field.name}__in": rows.values("pk")}
+                )
+                label = str(related_model._meta.verbose_name_plural)
+                on_delete = relation.on_delete
+
+                if on_delete is models.SET_NULL:
+                    steps.append((label, dependents, relation.field.name))
+                elif on_delete is models.CASCADE:
+                    # rows referenced from elsewhere go through the collector
+                    action = (
+                        "cascade" if related_model._meta.related_objects else "delete"
+                    )
+                    steps.append((label, dependents, action))
+                elif on_delete is not models.DO_NOTHING:
+                    raise ImproperlyConfigured(
+                        f"{related_model._meta.label}.{relation.field.name} "
+                        f"references {model.__name__} with on_delete="
+                        f"{on_delete.__name__}, which EditionTeardown does not "
+                        "handle"
+                    )
+
+            action = "drop" if is_partitioned(model._meta.db_table) else "delete"
+            steps.append((str(model._meta.verbose_name_plural), rows, action))
+
+        return steps
+
+    def count(self):
+        """Rows each step would delete or detach, for dry runs"""
+        return {label: queryset.count() for label, queryset, _ in self.get_steps()}
+
+    def run(self):
+        """Removes the edition, returning the rows handled by each step"""
+        done = {}
+
+        for label, queryset, action in self.get_steps():
+            done[label] = self.run_step(label, queryset, action)
+
+        edition_id = self.edition.pk
+
+        # the remaining rows (stats, generation) are one per edition
+        with transaction.atomic():
+            Edition.objects.filter(pk=edition_id).delete()
+
+        cache.delete(f"edition_{edition_id}_box_violations")
+        logger.info(f"Edition {edition_id} deleted: {done}")
+
+        return done
+
+    def run_step(self, label, queryset, action):
+        if action == "drop":
+            with transaction.atomic():
+                self.release(queryset)
+                rows = drop_partition(queryset.model._meta.db_table, self.edition.pk)
+
+            if rows is not None:
+                if self.progress:
+                    self.progress(label, rows, 1)
+                return rows
+
+            # an edition without a partition keeps its rows in the default one
+            action = "delete"
+
+        bounds = queryset.aggregate(low=models.Min("pk"), high=models.Max("pk"))
+
+        if bounds["low"] is None:
+            return 0
+
+        low, high = bounds["low"], bounds["high"]
+        rows_done = 0
+
+        for start in range(low, high + 1, self.chunk_size):
+            chunk = queryset.filter(pk__gte=start, pk__lt=start + self.chunk_size)
+
+            with transaction.atomic():
+                self.release(chunk)
+
+                if action == "delete":
+                    rows_done += chunk._raw_delete(chunk.db)
+                elif action == "cascade":
+                    rows_done += chunk.delete()[0]
+                else:
+                    rows_done += chunk.update(**{action: None})
+
+            if self.progress:
+                fraction = (min(start + self.chunk_size, high + 1) - low) / (
+                    high + 1 - low
+                )
+                self.progress(label, rows_done, fraction)
+
+        return rows_done
+
+    def release(self, rows):
+        """
+        Takes the stickers in rows off the ownership counts of their
+        collectors and bumps the album versions of the collectors whose
+        stickers or packs rows holds, in the transaction that removes them,
+        so cached album snapshots stop showing them.
+        """
+        if rows.model is Sticker:
+            Ownership.release(rows)
+
+        if rows.model in (Sticker, Pack):
+            bump_album_versions(
+                rows.filter(collector__isnull=False).values("collector_id"),
+                self.edition.collection_id,
+            )
@@ -1,3 +1,4 @@
+import json
 import os
 import shutil
 from django.test.utils import override_settings
@@ -8,14 +9,17 @@ from unittest.mock import patch, MagicMock
 from decimal import Decimal
 
 from django.test import TestCase
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
 from django.core.exceptions import ValidationError
 
-from collection_manager.models import Collection
-from ..models import Edition
+from collection_manager.models import AlbumTemplate, Collection
+from ..generation import EditionPlanner
+from ..loaders import get_loader
+from ..models import Edition, Ownership, Sticker
 from .factories import EditionFactory
 from collection_manager.test.factories import CollectionFactory
 from promotions.test.factories import PromotionFactory
+from authentication.test.factories import UserFactory
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
@@ -55,6 +59,123 @@ class HandleEditionsCommandTest(TestCase):
         self.assertEqual(edition.collection, self.collection)
         self.assertEqual(edition.circulation, Decimal("1"))
 
+    def test_create_edition_with_copy_loader(self):
+        """COPY is PostgreSQL only, other databases fall back to bulk_create"""
+        with patch("builtins.input", return_value="yes"):
+            call_command(
+                "handle_editions",
+                "create",
+                collection=self.collection.id,
+                circulation=1,
+                loader="copy",
+                stdout=self.out,
+            )
+
+        output = self.out.getvalue()
+        self.assertIn("Edition created successfully", output)
+        self.assertIn(f"Loader: {get_loader('copy').name}", output)
+        self.assertIn("rows/s", output)
+        self.assertEqual(Edition.objects.first().stickers.count(), 45)
+
+    def test_create_edition_in_background(self):
+        with patch("builtins.input", return_value="yes"), patch(
+            "editions.tasks.generate_edition.delay"
+        ) as delay, self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "handle_editions",
+                "create",
+                collection=self.collection.id,
+                circulation=1,
+                background=True,
+                stdout=self.out,
+            )
+
+        edition = Edition.objects.get()
+        self.assertIn(
+            f"Edition {edition.id} queued for generation", self.out.getvalue()
+        )
+        delay.assert_called_once_with(edition.generation.pk)
+        self.assertEqual(edition.generation.status, "pending")
+        self.assertEqual(edition.stickers.count(), 0)
+
+    def test_create_edition_rejects_workers_for_single_process_editions(self):
+        for option in ("background", "virtual"):
+            with self.assertRaisesMessage(
+                CommandError, "cannot be combined with --workers"
+            ):
+                call_command(
+                    "handle_editions",
+                    "create",
+                    collection=self.collection.id,
+                    circulation=1,
+                    workers=2,
+                    stdout=self.out,
+                    **{option: True},
+                )
+
+        self.assertFalse(Edition.objects.exists())
+
+    def test_failed_sharded_creation_reports_the_teardown(self):
+        with patch("builtins.input", return_value="yes"), patch(
+            "editions.management.commands.handle_editions.ShardedGeneration.run",
+            side_effect=RuntimeError("shard lost"),
+        ):
+            call_command(
+                "handle_editions",
+                "create",
+                collection=self.collection.id,
+                circulation=1,
+                workers=2,
+                stdout=self.out,
+            )
+
+        output = self.out.getvalue()
+        self.assertIn("Error creating edition: shard lost", output)
+        self.assertIn("deleted together with the edition", output)
+        self.assertNotIn("rolled back", output)
+
+    def test_resume_generation(self):
+        with patch("editions.tasks.generate_edition.delay"):
+            with self.captureOnCommitCallbacks(execute=True):
+                edition = Edition(collection=self.collection, circulation=1)
+                edition.save(background=True)
+
+        call_command("handle_editions", "resume", edition.id, stdout=self.out)
+
+        self.assertIn(f"Edition {edition.id} generated: 61 rows", self.out.getvalue())
+        self.assertEqual(edition.stickers.count(), 45)
+        edition.generation.refresh_from_db()
+        self.assertEqual(edition.generation.status, "done")
+
+    def test_resume_edition_without_background_generation(self):
+        edition = EditionFactory(collection=self.collection)
+        call_command("handle_editions", "resume", edition.id, stdout=self.out)
+
+        self.assertIn("has no background generation", self.out.getvalue())
+
+    def test_rebuild_ownership_repairs_drifted_counts(self):
+        edition = EditionFactory(collection=self.collection)
+        user = UserFactory()
+        pack = edition.packs.order_by("id").first()
+        pack.open(user)
+        Ownership.objects.update(count=99)
+
+        call_command(
+            "handle_editions",
+            "rebuild-ownership",
+            collection=self.collection.id,
+            stdout=self.out,
+        )
+
+        self.assertIn(
+            f"Ownership of collection {self.collection.id} rebuilt",
+            self.out.getvalue(),
+        )
+        self.assertEqual(
+            sum(Ownership.objects.values_list("count", flat=True)),
+            pack.stickers.count(),
+        )
+
     def test_create_edition_cancelled(self):
         """Test cancellation of edition creation"""
         with patch("builtins.input", return_value="no"):
@@ -112,6 +233,70 @@ class HandleEditionsCommandTest(TestCase):
         # Check database
         self.assertEqual(Edition.objects.count(), 0)
 
+    def test_simulate_edition(self):
+        call_command(
+            "handle_editions",
+            "simulate",
+            collection=self.collection.id,
+            circulation=250,
+            stdout=self.out,
+        )
+
+        output = self.out.getvalue()
+        self.assertIn("Prize stickers removed: 2", output)
+        self.assertIn("Packs: 3695", output)
+        self.assertIn("Boxes: 37", output)
+        self.assertIn("- 100 packs: 36", output)
+        self.assertIn("- 95 packs: 1", output)
+        self.assertIn("Estimated generation time:", output)
+        self.assertIn("nothing was written", output)
+        self.assertEqual(Edition.objects.count(), 0)
+
+    def test_simulate_virtual_edition(self):
+        call_command(
+            "handle_editions",
+            "simulate",
+            collection=self.collection.id,
+            circulation=250,
+            virtual=True,
+            stdout=self.out,
+        )
+
+        self.assertIn("Packs: ", self.out.getvalue())
+        self.assertEqual(Edition.objects.count(), 0)
+
+    def test_export_edition_manifest(self):
+        edition = EditionFactory(collection=self.collection)
+        output_dir = tempfile.mkdtemp()
+
+        try:
+            call_command(
+                "handle_editions",
+                "export",
+                edition.id,
+                output_dir=output_dir,
+                chunk_rows=20,
+                stdout=self.out,
+            )
+            parts = [
+                name
+                for _, _, files in os.walk(output_dir)
+                for name in files
+                if name.endswith(".csv.gz")
+            ]
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+        output = self.out.getvalue()
+        self.assertEqual(len(parts), 3)
+        self.assertIn("part-00002.csv.gz: 45 rows", output)
+        self.assertIn(f"Manifest of edition {edition.id} exported", output)
+
+    def test_export_nonexistent_edition(self):
+        call_command("handle_editions", "export", 999, stdout=self.out)
+
+        self.assertIn("Edition with ID 999 does not exist", self.out.getvalue())
+
     def test_delete_edition_success(self):
         """Test successful edition deletion"""
         edition = EditionFactory(collection=self.collection)
@@ -126,6 +311,38 @@ class HandleEditionsCommandTest(TestCase):
         # Check database
         self.assertEqual(Edition.objects.count(), 0)
 
+    def test_delete_edition_dry_run(self):
+        edition = EditionFactory(collection=self.collection)
+        stickers = edition.stickers.count()
+
+        with patch("builtins.input") as mocked_input:
+            call_command(
+                "handle_editions", "delete", edition.id, dry_run=True, stdout=self.out
+            )
+
+        output = self.out.getvalue()
+        self.assertIn(f"- Stickers: {stickers}", output)
+        self.assertIn("Dry run, nothing was deleted", output)
+        mocked_input.assert_not_called()
+        self.assertEqual(edition.stickers.count(), stickers)
+
+    def test_delete_edition_reports_progress(self):
+        edition = EditionFactory(collection=self.collection)
+
+        with patch("builtins.input", return_value="y"):
+            call_command(
+                "handle_editions",
+                "delete",
+                edition.id,
+                chunk_size=10,
+                stdout=self.out,
+            )
+
+        output = self.out.getvalue()
+        self.assertIn("stickers: ", output)
+        self.assertIn("(100%)", output)
+        self.assertFalse(Sticker.objects.exists())
+
     def test_delete_edition_cancelled(self):
         """Test cancellation of edition deletion"""
         edition = EditionFactory(collection=self.collection)
@@ -147,3 +364,102 @@ class HandleEditionsCommandTest(TestCase):
         # Check output
         output = self.out.getvalue()
         self.assertIn("Edition with ID 999 does not exist", output)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkEditionsCommandTest(TestCase):
+    def setUp(self):
+        self.out = StringIO()
+
+    def test_benchmark_reports_every_stage_and_rolls_back(self):
+        output = os.path.join(TEMP_MEDIA_ROOT, "benchmark.json")
+        call_command(
+            "benchmark_editions",
+            circulations=[1, 20],
+            seed=1,
+            output=output,
+            stdout=self.out,
+        )
+
+        with open(output) as results_file:
+            results = json.load(results_file)
+
+        self.assertIn(f"Results written to {output}", self.out.getvalue())
+        self.assertEqual([run["circulation"] for run in results["runs"]], [1, 20])
+
+        run = results["runs"][1]
+        stages = {stage["stage"]: stage for stage in run["stages"]}
+        self.assertEqual(
+            list(stages),
+            list(EditionPlanner.STAGES)
+            + ["write_boxes", "write_packs", "write_stickers"],
+        )
+        self.assertEqual(stages["write_packs"]["rows"], run["packs"])
+        self.assertEqual(stages["fill_packs"]["queries"], 0)
+        self.assertGreater(stages["write_stickers"]["queries"], 0)
+        self.assertEqual(run["rows"], run["boxes"] + run["packs"] + run["stickers"])
+        self.assertGreater(run["peak_traced_kb"], 0)
+        self.assertEqual(
+            run["peak_traced_kb"],
+            max(stage["peak_traced_kb"] for stage in run["stages"]),
+        )
+
+        self.assertEqual(Edition.objects.count(), 0)
+        self.assertEqual(AlbumTemplate.objects.count(), 0)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SimulateCompletionCommandTest(TestCase):
+    def setUp(self):
+        self.out = StringIO()
+        PromotionFactory()
+        self.collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_simulate_completion(self):
+        call_command(
+            "simulate_completion",
+            self.collection.id,
+            collectors=2000,
+            seed=1,
+            stdout=self.out,
+        )
+
+        output = self.out.getvalue()
+        self.assertIn("Collectors: 2000, rescue pool: yes", output)
+        self.assertIn("- Page 1: mean ", output)
+        self.assertIn("- Album: mean ", output)
+        self.assertIn("Rescue pool availability:", output)
+
+    def test_simulate_completion_as_json(self):
+        call_command(
+            "simulate_completion",
+            self.collection.id,
+            collectors=2000,
+            no_rescue=True,
+            json=True,
+            stdout=self.out,
+        )
+
+        result = json.loads(self.out.getvalue())
+        self.assertFalse(result["rescue"])
+        self.assertEqual(set(result["album"]), {"mean", "p50", "p90", "p99"})
+        self.assertEqual(len(result["pages"]), 4)
+
+    def test_simulate_completion_of_unprinted_stickers(self):
+        call_command(
+            "simulate_completion", self.collection.id, circulation=1, stdout=self.out
+        )
+
+        self.assertIn("El álbum no se puede completar", self.out.getvalue())
+
+    def test_simulate_completion_nonexistent_collection(self):
+        call_command("simulate_completion", 999, stdout=self.out)
+
+        self.assertIn("Collection with ID 999 does not exist", self.out.getvalue())
@@ -0,0 +1,90 @@
+import shutil
+import tempfile
+
+import numpy as np
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from promotions.test.factories import PromotionFactory
+from collection_manager.test.factories import CollectionFactory
+from ..completion import CompletionSimulator
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CompletionSimulatorTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PromotionFactory()
+        cls.collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_equal_rarities_match_the_coupon_collector(self):
+        simulator = CompletionSimulator(self.collection, seed=1)
+        coordinates = len(simulator.probabilities)
+        simulator.probabilities = np.full(coordinates, 1 / coordinates)
+        stickers_per_pack = simulator.layout.STICKERS_PER_PACK
+
+        result = simulator.run(200000, rescue=False)
+        # n * H(n) stickers on average for n equally likely coordinates
+        expected = coordinates * sum(1 / k for k in range(1, coordinates + 1))
+
+        self.assertAlmostEqual(
+            result["album"]["mean"], expected / stickers_per_pack, delta=1.5
+        )
+
+    def test_report_per_page_and_album(self):
+        result = CompletionSimulator(self.collection, seed=1).run(20000, rescue=False)
+        pages = self.collection.album_template.layout.PAGES
+
+        self.assertEqual(sorted(result["pages"]), list(range(1, pages + 1)))
+        self.assertIsNone(result["rescue_availability"])
+
+        for summary in result["pages"].values():
+            self.assertLessEqual(summary["mean"], result["album"]["mean"])
+            self.assertLessEqual(summary["p50"], summary["p90"])
+            self.assertLessEqual(summary["p90"], summary["p99"])
+
+    def test_rescue_pool_shortens_completion(self):
+        without = CompletionSimulator(self.collection, seed=1).run(20000, rescue=False)
+        with_rescue = CompletionSimulator(self.collection, seed=1).run(20000)
+
+        self.assertLess(with_rescue["album"]["mean"], without["album"]["mean"])
+        self.assertLessEqual(with_rescue["rescue_availability"]["mean"], 1)
+
+    def test_completion_with_rescue_waits_for_tickets(self):
+        simulator = CompletionSimulator(self.collection, seed=1)
+        stickers_per_rescue = (
+            simulator.RESCUE_TICKETS * simulator.layout.STICKERS_PER_PACK
+        )
+        arrivals = np.array([[5.0, 100.0, 1000.0]])
+        everything = np.ones(arrivals.shape, dtype=bool)
+
+        self.assertEqual(simulator.complete(arrivals)[0], 1000)
+        # rescues the 1000 and the 100 with the tickets of the first 6 packs
+        self.assertEqual(
+            simulator.complete(arrivals, everything)[0], 2 * stickers_per_rescue
+        )
+        self.assertEqual(
+            simulator.complete(arrivals, np.array([[True, True, False]]))[0], 1000
+        )
+        self.assertEqual(
+            simulator.complete(np.array([[1.0, 2.0]]), np.ones((1, 2), dtype=bool))[0],
+            min(2.0, stickers_per_rescue),
+        )
+
+    def test_circulation_uses_printed_quotas(self):
+        with self.assertRaises(ValueError):
+            CompletionSimulator(self.collection, circulation=1)
+
+        result = CompletionSimulator(self.collection, circulation=250, seed=1).run(1000)
+
+        self.assertEqual(result["collectors"], 1000)
@@ -0,0 +1,117 @@
+import csv
+import gzip
+import io
+import shutil
+import tempfile
+from unittest import skipIf
+
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from promotions.test.factories import PromotionFactory
+from collection_manager.test.factories import CollectionFactory
+from .. import export
+from ..export import ManifestExport
+from .factories import EditionFactory
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def read_csv_parts(storage, names):
+    rows = []
+
+    for name in names:
+        with storage.open(name) as part:
+            reader = csv.DictReader(io.TextIOWrapper(gzip.open(part), "utf-8"))
+            rows.extend(reader)
+
+    return rows
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ManifestExportTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PromotionFactory()
+        cls.collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+        cls.edition = EditionFactory(collection=cls.collection, circulation=20)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.storage = FileSystemStorage(location=tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.storage.location, ignore_errors=True)
+
+    def test_csv_parts_hold_every_sticker_in_print_order(self):
+        progress = []
+        names = ManifestExport(self.edition, storage=self.storage, chunk_rows=250).run(
+            progress=lambda *args: progress.append(args)
+        )
+        rows = read_csv_parts(self.storage, names)
+        stickers = self.edition.stickers.filter(pack__isnull=False).count()
+
+        self.assertEqual(len(names), -(-stickers // 250))
+        self.assertTrue(names[0].endswith("part-00000.csv.gz"))
+        self.assertEqual(progress[-1], (names[-1], stickers))
+        self.assertEqual(len(rows), stickers)
+        self.assertEqual(list(rows[0]), list(ManifestExport.COLUMNS))
+        self.assertEqual(
+            {int(row["sticker_id"]) for row in rows},
+            set(self.edition.stickers.values_list("id", flat=True)),
+        )
+        order = [
+            (
+                int(row["box_ordinal"]),
+                int(row["pack_ordinal"]),
+                int(row["sticker_ordinal"]),
+            )
+            for row in rows
+        ]
+        self.assertEqual(order, sorted(order))
+
+    def test_virtual_edition_derives_the_stickers(self):
+        edition = EditionFactory(
+            collection=self.collection, circulation=1, is_virtual=True
+        )
+        names = ManifestExport(edition, storage=self.storage).run()
+        rows = read_csv_parts(self.storage, names)
+        pack = edition.packs.get(ordinal=1)
+        pack.materialize_stickers()
+
+        self.assertEqual(len(rows), 45)
+        self.assertEqual(rows[0]["sticker_id"], "")
+        self.assertEqual(
+            [
+                (int(row["sticker_ordinal"]), int(row["absolute_number"]))
+                for row in rows
+                if row["pack_id"] == str(pack.id)
+            ],
+            sorted(pack.stickers.values_list("ordinal", "coordinate__absolute_number")),
+        )
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            ManifestExport(self.edition, format="xlsx")
+
+    @skipIf(export.pyarrow is None, "pyarrow is not installed")
+    def test_parquet_parts(self):
+        names = ManifestExport(
+            self.edition, format="parquet", storage=self.storage
+        ).run()
+        table = export.pyarrow.parquet.read_table(self.storage.path(names[0]))
+
+        self.assertEqual(table.num_rows, self.edition.stickers.count())
+        self.assertEqual(table.column_names, list(ManifestExport.COLUMNS))
+
+    @skipIf(export.pyarrow is not None, "pyarrow is installed")
+    def test_parquet_requires_pyarrow(self):
+        with self.assertRaisesMessage(ValueError, "pyarrow"):
+            ManifestExport(self.edition, format="parquet")
@@ -0,0 +1,564 @@
+import shutil
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from promotions.test.factories import PromotionFactory
+from authentication.test.factories import UserFactory
+from collection_manager.test.factories import CollectionFactory
+from users.test.factories import CollectorFactory
+from ..generation import (
+    EditionPlanner,
+    ceil_div,
+    ResumableGeneration,
+    SeededPermutation,
+    ShardedGeneration,
+    ShardPlanner,
+    VirtualEditionPlanner,
+    write_shard,
+)
+from ..loaders import BulkCreateLoader
+from ..models import Box, Edition, EditionStats, Pack, Sticker
+from .factories import EditionFactory
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class EditionPlannerTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PromotionFactory()
+        cls.collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+        cls.layout = cls.collection.album_template.layout
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_plan_layout(self):
+        edition = EditionFactory.build(collection=self.collection, circulation=250)
+        planner = EditionPlanner(edition).plan()
+
+        self.assertEqual(planner.pack_count, 3695)
+        self.assertEqual(planner.box_count, 37)
+        self.assertEqual(planner.removed_prize_stickers, 2)
+        self.assertEqual(sum(planner.pack_has_prize), 74)
+        self.assertEqual(sorted(planner.pack_ordinals), list(range(1, 3696)))
+        self.assertEqual(sorted(planner.box_ordinals), list(range(1, 38)))
+
+        for box_packs in planner.box_packs[:-1]:
+            self.assertEqual(len(box_packs), self.layout.PACKS_PER_BOX)
+            self.assertEqual(sum(planner.pack_has_prize[pack] for pack in box_packs), 2)
+
+    def test_predict_matches_plan(self):
+        for circulation in (1, 20, 250):
+            edition = EditionFactory.build(
+                collection=self.collection, circulation=circulation
+            )
+            prediction = EditionPlanner(edition).predict()
+            planner = EditionPlanner(edition).plan()
+            stats = planner.get_stats()
+            box_fill = {}
+
+            for box_packs in planner.box_packs:
+                box_fill[len(box_packs)] = box_fill.get(len(box_packs), 0) + 1
+
+            for key in ("boxes", "packs", "prize_packs", "stickers"):
+                self.assertEqual(prediction[key], stats[key])
+            self.assertEqual(
+                prediction["removed_prize_stickers"], planner.removed_prize_stickers
+            )
+            self.assertEqual(prediction["box_fill"], box_fill)
+            self.assertEqual(
+                prediction["stickers_per_coordinate"], planner.get_sticker_limits()
+            )
+
+    def test_predict_scales_to_huge_circulations(self):
+        edition = EditionFactory.build(
+            collection=self.collection, circulation=10_000_000
+        )
+
+        with self.assertNumQueries(1):
+            prediction = EditionPlanner(edition).predict()
+
+        self.assertEqual(prediction["prize_packs"], 2 * (prediction["boxes"]))
+        self.assertGreater(prediction["removed_prize_stickers"], 0)
+        self.assertEqual(sum(prediction["box_fill"].values()), prediction["boxes"])
+
+    def test_one_prize_sticker_per_pack(self):
+        edition = EditionFactory.build(collection=self.collection, circulation=250)
+        planner = EditionPlanner(edition).plan()
+        coordinates, packs = planner.placed_stickers()
+        is_prize = np.isin(coordinates, planner.prize_coordinates)
+        stickers_per_pack = np.bincount(packs, minlength=planner.pack_count)
+        prizes_per_pack = np.bincount(packs[is_prize], minlength=planner.pack_count)
+
+        self.assertLessEqual(prizes_per_pack.max(), 1)
+        self.assertGreater(stickers_per_pack.min(), 0)
+        self.assertLessEqual(stickers_per_pack.max(), self.layout.STICKERS_PER_PACK)
+        self.assertTrue(np.array_equal(prizes_per_pack > 0, planner.pack_has_prize))
+
+    def test_fill_packs_defers_second_prize_in_a_pack(self):
+        edition = EditionFactory.build(collection=self.collection, circulation=1)
+        planner = EditionPlanner(edition)
+        prize, standard = planner.prize_coordinates[0], planner.coordinates[1].id
+        planner.sticker_coordinates = np.array(
+            [standard, prize, prize, standard, standard, standard, standard],
+            dtype=np.int64,
+        )
+        planner.create_packs()
+        planner.fill_packs()
+
+        self.assertEqual(planner.sticker_packs.tolist(), [0, 0, 1, 0, 1, 1, 2])
+        self.assertEqual(planner.pack_has_prize.tolist(), [True, True, False])
+        self.assertEqual(planner.dropped_prize_stickers, 0)
+
+    def test_seed_makes_plan_reproducible(self):
+        edition = EditionFactory.build(collection=self.collection, circulation=50)
+        first = EditionPlanner(edition, seed=7).plan()
+        second = EditionPlanner(edition, seed=7).plan()
+
+        self.assertTrue(
+            np.array_equal(first.sticker_coordinates, second.sticker_coordinates)
+        )
+        self.assertTrue(np.array_equal(first.sticker_packs, second.sticker_packs))
+        self.assertTrue(np.array_equal(first.pack_ordinals, second.pack_ordinals))
+        self.assertEqual(first.box_packs, second.box_packs)
+
+    def test_write_inserts_each_row_once(self):
+        with CaptureQueriesContext(connection) as context:
+            edition = EditionFactory(collection=self.collection, circulation=20)
+
+        statements = [query["sql"].split()[0].upper() for query in context]
+
+        self.assertNotIn("UPDATE", statements)
+        self.assertNotIn("DELETE", statements)
+        self.assertEqual(Box.objects.filter(edition=edition).count(), 3)
+        self.assertEqual(Pack.objects.filter(box__edition=edition).count(), 296)
+        self.assertEqual(
+            set(
+                Pack.objects.filter(
+                    edition=edition, stickers__coordinate__page=99
+                ).values_list("id", flat=True)
+            ),
+            set(
+                Pack.objects.filter(edition=edition, has_prize=True).values_list(
+                    "id", flat=True
+                )
+            ),
+        )
+
+        ordinals = Sticker.objects.filter(pack__box__edition=edition).values_list(
+            "ordinal", flat=True
+        )
+        self.assertEqual(sorted(ordinals), list(range(1, len(ordinals) + 1)))
+
+    def test_packs_store_their_contents(self):
+        edition = EditionFactory(collection=self.collection, circulation=20)
+        stickers = {}
+
+        for pack_id, number in (
+            Sticker.objects.filter(edition=edition)
+            .order_by("ordinal")
+            .values_list("pack_id", "coordinate__absolute_number")
+        ):
+            stickers.setdefault(pack_id, []).append(number)
+
+        for pack in edition.packs.all():
+            self.assertEqual(Pack.decode_contents(pack.contents), stickers[pack.id])
+
+    def test_contents_encoding(self):
+        for numbers in ([], [0], [24, 0, 1], [65534, 7]):
+            contents = Pack.encode_contents(numbers)
+
+            self.assertEqual(Pack.decode_contents(contents), numbers)
+
+    def test_rows_are_scoped_to_their_edition(self):
+        first = EditionFactory(collection=self.collection, circulation=2)
+        second = EditionFactory(collection=self.collection, circulation=3)
+
+        for edition in (first, second):
+            self.assertFalse(
+                Pack.objects.filter(edition=edition)
+                .exclude(box__edition=edition)
+                .exists()
+            )
+            self.assertFalse(
+                Sticker.objects.filter(edition=edition)
+                .exclude(pack__edition=edition)
+                .exists()
+            )
+            self.assertEqual(
+                edition.stickers.count(),
+                Sticker.objects.filter(pack__box__edition=edition).count(),
+            )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ResumableGenerationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PromotionFactory()
+        cls.collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_background_edition(self, circulation=20):
+        edition = Edition(collection=self.collection, circulation=circulation)
+
+        with patch("editions.tasks.generate_edition.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                edition.save(background=True)
+
+        delay.assert_called_once_with(edition.generation.pk)
+
+        return edition
+
+    def test_background_save_defers_generation(self):
+        edition = self.create_background_edition()
+
+        self.assertEqual(edition.generation.status, "pending")
+        self.assertFalse(edition.boxes.exists())
+        self.assertFalse(edition.stickers.exists())
+
+    def test_generation_writes_the_seeded_plan_in_chunks(self):
+        edition = self.create_background_edition()
+        generation = edition.generation
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(ResumableGeneration(generation, chunk_size=100).run())
+
+        planner = EditionPlanner(edition, seed=generation.seed).plan()
+        checkpoints = [
+            query
+            for query in context
+            if query["sql"].startswith('UPDATE "editions_editiongeneration"')
+        ]
+
+        self.assertEqual(generation.status, "done")
+        self.assertEqual(generation.rows_done, generation.rows_total)
+        self.assertEqual(
+            generation.rows_total,
+            planner.box_count + planner.pack_count + planner.sticker_count,
+        )
+        # one checkpoint per chunk of boxes (1), packs (3) and stickers (9)
+        self.assertEqual(len(checkpoints), 13 + 3)
+        self.assertEqual(
+            list(edition.packs.order_by("pk").values_list("ordinal", flat=True)),
+            planner.pack_ordinals[planner.get_pack_order()].tolist(),
+        )
+
+    def test_generation_forgets_violations_found_while_running(self):
+        edition = self.create_background_edition()
+        cache.set(f"edition_{edition.id}_box_violations", {1: []})
+        EditionStats.objects.update_or_create(
+            edition=edition, defaults={"invalid_boxes": 1}
+        )
+
+        ResumableGeneration(edition.generation, chunk_size=100).run()
+
+        self.assertIsNone(cache.get(f"edition_{edition.id}_box_violations"))
+        self.assertIsNone(EditionStats.objects.get(edition=edition).invalid_boxes)
+        self.assertTrue(edition.validate_distribution()[0])
+
+    def test_generation_resumes_from_last_checkpoint(self):
+        edition = self.create_background_edition()
+        generation = edition.generation
+        load = BulkCreateLoader.load
+        calls = []
+
+        def crash_on_fifth_chunk(loader, *args, **kwargs):
+            calls.append(args[0])
+
+            if len(calls) == 5:
+                raise RuntimeError("worker lost")
+
+            return load(loader, *args, **kwargs)
+
+        with patch.object(BulkCreateLoader, "load", crash_on_fifth_chunk):
+            with self.assertRaises(RuntimeError):
+                ResumableGeneration(generation, chunk_size=100).run()
+
+        generation.refresh_from_db()
+        self.assertEqual(generation.status, "failed")
+        self.assertEqual(generation.stage, "stickers")
+        self.assertEqual(generation.rows_done, 3 + 296 + 0)
+        self.assertEqual(edition.stickers.count(), 0)
+
+        self.assertTrue(ResumableGeneration(generation, chunk_size=100).run())
+
+        planner = EditionPlanner(edition, seed=generation.seed).plan()
+        ordinals = edition.stickers.values_list("ordinal", flat=True)
+
+        self.assertEqual(generation.status, "done")
+        self.assertEqual(generation.rows_at_start, 299)
+        self.assertEqual(edition.boxes.count(), 3)
+        self.assertEqual(edition.packs.count(), 296)
+        self.assertEqual(sorted(ordinals), list(range(1, planner.sticker_count + 1)))
+        self.assertEqual(
+            list(
+                edition.stickers.order_by("ordinal").values_list(
+                    "coordinate_id", flat=True
+                )
+            ),
+            planner.placed_stickers()[0].tolist(),
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ShardedGenerationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PromotionFactory()
+        cls.collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+        cls.layout = cls.collection.album_template.layout
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_shards_keep_edition_quotas(self):
+        edition = EditionFactory.build(collection=self.collection, circulation=250)
+        planner = EditionPlanner(edition, seed=3).plan()
+        shards = ShardedGeneration(edition, workers=4, seed=3).plan_shards()
+
+        counts = {}
+        for shard in shards:
+            for coordinate, count in zip(shard["coordinates"], shard["counts"]):
+                counts[coordinate] = counts.get(coordinate, 0) + count
+
+        coordinates, expected = np.unique(
+            planner.sticker_coordinates, return_counts=True
+        )
+        self.assertEqual(counts, dict(zip(coordinates.tolist(), expected.tolist())))
+        self.assertEqual(
+            sorted(sum((shard["pack_ordinals"] for shard in shards), [])),
+            list(range(1, planner.pack_count + 1)),
+        )
+        self.assertEqual(
+            sorted(sum((shard["box_ordinals"] for shard in shards), [])),
+            list(range(1, planner.box_count + 1)),
+        )
+
+        prize = planner.prize_coordinates[0]
+        for shard in shards[:-1]:
+            prizes = dict(zip(shard["coordinates"], shard["counts"]))[prize]
+            self.assertEqual(
+                prizes, len(shard["box_ordinals"]) * edition.PRIZE_PACKS_PER_BOX
+            )
+
+    def test_shard_that_keeps_dropping_prizes_fails(self):
+        edition = EditionFactory.build(collection=self.collection, circulation=30)
+        edition.save(generate=False)
+        shard = ShardedGeneration(edition, workers=3).plan_shards()[0]
+        fill_packs = EditionPlanner.fill_packs
+
+        def drop_a_prize(planner):
+            fill_packs(planner)
+            planner.dropped_prize_stickers = 1
+
+        with patch.object(EditionPlanner, "fill_packs", drop_a_prize):
+            with self.assertRaisesMessage(RuntimeError, "after 10 reshuffles"):
+                write_shard(edition.id, shard, "orm")
+
+        self.assertFalse(edition.stickers.exists())
+
+    def test_written_shards_form_a_valid_edition(self):
+        edition = EditionFactory.build(collection=self.collection, circulation=30)
+        edition.save(generate=False)
+        shards = ShardedGeneration(edition, workers=3).plan_shards()
+
+        results = [write_shard(edition.id, shard, "orm") for shard in shards]
+        planner = EditionPlanner(edition).plan()
+        ordinals = edition.stickers.values_list("ordinal", flat=True)
+
+        self.assertEqual(len(shards), 3)
+        self.assertEqual(sum(boxes for boxes, _, _ in results), planner.box_count)
+        self.assertEqual(edition.packs.count(), planner.pack_count)
+        self.assertEqual(sorted(ordinals), list(range(1, planner.sticker_count + 1)))
+        self.assertTrue(edition.validate_prize_distribution())
+        self.assertTrue(edition.validate_pack_counts())
+        self.assertTrue(edition.validate_box_integrity())
+
+
+@skipUnless(
+    connection.vendor == "postgresql", "worker processes need a shared database"
+)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ShardedGenerationProcessTestCase(TransactionTestCase):
+    def test_run_generates_shards_in_worker_processes(self):
+        PromotionFactory()
+        collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+        edition = EditionFactory.build(collection=collection, circulation=30)
+        edition.save(generate=False)
+
+        boxes, packs, stickers = ShardedGeneration(edition, workers=2).run()
+
+        self.assertEqual(edition.boxes.count(), boxes)
+        self.assertEqual(edition.packs.count(), packs)
+        self.assertEqual(edition.stickers.count(), stickers)
+        self.assertTrue(edition.validate_prize_distribution())
+
+    def test_failed_shard_tears_the_edition_down(self):
+        PromotionFactory()
+        collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+        edition = EditionFactory.build(collection=collection, circulation=30)
+        edition.save(generate=False)
+        fill_packs = ShardPlanner.fill_packs
+
+        def fail_but_last(planner):
+            if not planner.shard["is_last"]:
+                raise RuntimeError("shard lost")
+
+            fill_packs(planner)
+
+        # forked workers inherit the patch
+        with patch.object(ShardPlanner, "fill_packs", fail_but_last), patch.object(
+            Edition, "delete"
+        ) as delete:
+            with self.assertRaisesMessage(RuntimeError, "shard lost"):
+                ShardedGeneration(edition, workers=2).run()
+
+        delete.assert_not_called()
+        self.assertFalse(Edition.objects.filter(pk=edition.pk).exists())
+        self.assertFalse(Sticker.objects.filter(edition_id=edition.pk).exists())
+        self.assertFalse(Box.objects.filter(edition_id=edition.pk).exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class VirtualEditionTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PromotionFactory()
+        cls.collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+        cls.layout = cls.collection.album_template.layout
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_seeded_permutation_is_a_bijection(self):
+        for size in (1, 2, 7, 1000, 1025):
+            permutation = SeededPermutation(size, 5)
+            values = permutation(np.arange(size))
+
+            self.assertEqual(sorted(values.tolist()), list(range(size)))
+            self.assertEqual(permutation(size // 2).tolist(), [values[size // 2]])
+
+    def test_virtual_predict_matches_stats(self):
+        edition = EditionFactory(
+            collection=self.collection, circulation=250, is_virtual=True
+        )
+        planner = VirtualEditionPlanner(edition)
+        prediction = planner.predict()
+
+        for key, value in planner.get_stats().items():
+            if key != "stickers_by_rarity":
+                self.assertEqual(prediction[key], value)
+        self.assertEqual(prediction["sticker_rows"], 0)
+
+    def test_virtual_edition_stores_boxes_and_packs_only(self):
+        edition = EditionFactory(
+            collection=self.collection, circulation=250, is_virtual=True
+        )
+        planner = VirtualEditionPlanner(edition)
+
+        self.assertEqual(edition.stickers.count(), 0)
+        self.assertEqual(edition.packs.count(), planner.pack_count)
+        self.assertEqual(edition.boxes.count(), ceil_div(planner.pack_count, 100))
+        self.assertEqual(
+            sorted(edition.packs.values_list("ordinal", flat=True)),
+            list(range(1, planner.pack_count + 1)),
+        )
+
+    def test_pack_contents_keep_quotas_and_prize_rules(self):
+        edition = EditionFactory(
+            collection=self.collection, circulation=250, is_virtual=True
+        )
+        planner = VirtualEditionPlanner(edition).plan()
+        prizes = set(planner.prize_coordinates.tolist())
+        counts = {}
+        ordinals = []
+
+        for box_packs in planner.box_packs:
+            prize_packs = 0
+
+            for pack in box_packs:
+                stickers = planner.pack_stickers(pack + 1)
+                pack_prizes = sum(coordinate in prizes for coordinate, _ in stickers)
+                prize_packs += pack_prizes
+                ordinals.extend(ordinal for _, ordinal in stickers)
+
+                self.assertLessEqual(pack_prizes, 1)
+                self.assertEqual(pack_prizes, planner.pack_has_prize[pack])
+                for coordinate, _ in stickers:
+                    counts[coordinate] = counts.get(coordinate, 0) + 1
+
+            if box_packs is not planner.box_packs[-1]:
+                self.assertEqual(prize_packs, edition.PRIZE_PACKS_PER_BOX)
+
+        expected = {
+            int(coordinate): count
+            for coordinate, count in edition.sticker_quotas.items()
+            if count
+        }
+        for coordinate in prizes:
+            expected[coordinate] -= planner.removed_prize_stickers
+
+        self.assertEqual(counts, expected)
+        self.assertEqual(sorted(ordinals), list(range(1, len(ordinals) + 1)))
+        self.assertEqual(
+            planner.pack_stickers(17),
+            VirtualEditionPlanner(edition).pack_stickers(17),
+        )
+
+    def test_open_materializes_pack_stickers(self):
+        edition = EditionFactory(
+            collection=self.collection, circulation=5, is_virtual=True
+        )
+        collector = CollectorFactory(user=UserFactory())
+        pack = edition.packs.get(ordinal=3)
+
+        pack.open(collector.user)
+        pack.materialize_stickers()
+
+        stickers = pack.stickers.order_by("ordinal")
+        self.assertEqual(
+            [(sticker.coordinate_id, sticker.ordinal) for sticker in stickers],
+            VirtualEditionPlanner(edition).pack_stickers(3),
+        )
+        self.assertTrue(
+            all(sticker.collector == collector.user for sticker in stickers)
+        )
+        self.assertEqual(edition.stickers.count(), len(stickers))
+        self.assertIsNone(edition.packs.get(ordinal=4).contents)
+        self.assertEqual(
+            Pack.decode_contents(edition.packs.get(ordinal=3).contents),
+            [sticker.coordinate.absolute_number for sticker in stickers],
+        )
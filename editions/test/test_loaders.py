@@ -0,0 +1,78 @@
+from unittest import skipIf, skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from collection_manager.test.factories import CollectionFactory
+from promotions.test.factories import PromotionFactory
+from ..loaders import BulkCreateLoader, CopyLoader, get_loader
+from ..models import Box, Pack
+from .factories import EditionFactory
+
+
+class LoadersTestCase(TestCase):
+    @skipIf(connection.vendor == "postgresql", "COPY is available")
+    def test_copy_loader_falls_back_outside_postgresql(self):
+        loader = get_loader("copy")
+
+        self.assertIsInstance(loader, BulkCreateLoader)
+        self.assertIsInstance(get_loader(), BulkCreateLoader)
+
+    def test_copy_value_format(self):
+        self.assertEqual(CopyLoader.format_value(None), "\\N")
+        self.assertEqual(CopyLoader.format_value(True), "t")
+        self.assertEqual(CopyLoader.format_value(False), "f")
+        self.assertEqual(CopyLoader.format_value(12), "12")
+        self.assertEqual(CopyLoader.format_value("a\tb\\c\n"), "a\\tb\\\\c\\n")
+
+    def test_copy_loader_fills_model_defaults(self):
+        columns, defaults = CopyLoader().get_columns(
+            Pack, ["edition_id", "box_id", "ordinal"]
+        )
+
+        self.assertEqual(columns, ["edition_id", "box_id", "ordinal"])
+        self.assertIn(("is_open", False), defaults)
+        self.assertIn(("collector_id", None), defaults)
+
+    def create_empty_edition(self):
+        PromotionFactory()
+        edition = EditionFactory.build(collection=CollectionFactory())
+        edition.save_base()
+        return edition
+
+    def test_bulk_create_loader_returns_ids_in_order(self):
+        edition = self.create_empty_edition()
+        loader = BulkCreateLoader(batch_size=2)
+
+        ids = loader.load(
+            Box,
+            ["edition_id", "ordinal"],
+            ((edition.id, ordinal) for ordinal in (3, 1, 2)),
+            return_ids=True,
+        )
+
+        self.assertEqual(
+            [Box.objects.get(pk=pk).ordinal for pk in ids],
+            [3, 1, 2],
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "COPY requires PostgreSQL")
+    def test_copy_loader_returns_ids_in_order(self):
+        edition = self.create_empty_edition()
+        loader = CopyLoader(batch_size=2)
+
+        ids = loader.load(
+            Box,
+            ["edition_id", "ordinal"],
+            ((edition.id, ordinal) for ordinal in (3, 1, 2)),
+            return_ids=True,
+        )
+        loader.load(
+            Pack, ["edition_id", "box_id", "ordinal"], [(edition.id, ids[0], 1)]
+        )
+
+        self.assertEqual(
+            [Box.objects.get(pk=pk).ordinal for pk in ids],
+            [3, 1, 2],
+        )
+        self.assertFalse(Pack.objects.get(box_id=ids[0]).is_open)
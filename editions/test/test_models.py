@@ -5,11 +5,14 @@ import tempfile
 
 import datetime
 
-from unittest import skip
+from unittest import skip, skipUnless
 from unittest.mock import patch
 
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from promotions.test.factories import PromotionFactory
@@ -20,7 +23,16 @@ from collection_manager.test.factories import (
 )
 from authentication.test.factories import UserFactory
 from users.test.factories import CollectorFactory, DealerFactory
-from ..models import Box, Pack, Sticker, StickerPrize
+from ..models import (
+    Box,
+    Edition,
+    EditionGeneration,
+    EditionStats,
+    Ownership,
+    Pack,
+    Sticker,
+    StickerPrize,
+)
 from .factories import EditionFactory
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp()
@@ -123,6 +135,106 @@ class EditionTestCase(TestCase):
         self.assertEqual(surprize_prize_total, 74)
         self.assertEqual(stickers.count(), total_stickers)
 
+    def test_distribution_stats(self):
+        edition = Edition.objects.get(pk=self.edition.pk)
+
+        with self.assertNumQueries(1):
+            stats = edition.get_distribution_stats()
+
+        self.assertEqual(
+            stats,
+            {
+                "total_boxes": 37,
+                "total_packs": 3695,
+                "prize_packs": 74,
+                "standard_packs": 3621,
+            },
+        )
+        self.assertEqual(
+            Pack.objects.filter(has_prize=True).count(),
+            Pack.objects.filter(stickers__coordinate__page=99).distinct().count(),
+        )
+
+    def test_generation_records_stats(self):
+        stats = EditionStats.objects.get(edition=self.edition)
+
+        self.assertEqual(stats.boxes, 37)
+        self.assertEqual(stats.packs, 3695)
+        self.assertEqual(stats.prize_packs, 74)
+        self.assertEqual(stats.stickers, Sticker.objects.count())
+        self.assertEqual(sum(stats.stickers_by_rarity.values()), stats.stickers)
+        self.assertEqual(stats.packs_opened, 0)
+
+    def test_stats_rebuild_matches_generation(self):
+        recorded = EditionStats.objects.get(edition=self.edition)
+        EditionStats.objects.filter(edition=self.edition).delete()
+
+        rebuilt = EditionStats.rebuild(self.edition)
+
+        for field in ("boxes", "packs", "prize_packs", "stickers"):
+            self.assertEqual(getattr(rebuilt, field), getattr(recorded, field))
+        self.assertEqual(rebuilt.stickers_by_rarity, recorded.stickers_by_rarity)
+
+    def test_validation_stores_invalid_boxes(self):
+        cache.delete(f"edition_{self.edition.id}_box_violations")
+        self.edition.validate_distribution()
+
+        self.assertEqual(
+            EditionStats.objects.get(edition=self.edition).invalid_boxes, 0
+        )
+
+    def test_validation_is_not_cached_while_generating(self):
+        cache.delete(f"edition_{self.edition.id}_box_violations")
+        EditionStats.objects.filter(edition=self.edition).update(invalid_boxes=None)
+        generation = EditionGeneration.objects.create(
+            edition=self.edition, status="running", seed=1
+        )
+        self.edition.validate_distribution()
+
+        self.assertIsNone(cache.get(f"edition_{self.edition.id}_box_violations"))
+        self.assertIsNone(EditionStats.objects.get(edition=self.edition).invalid_boxes)
+
+        generation.status = "done"
+        generation.save()
+        self.edition.validate_distribution()
+
+        self.assertEqual(cache.get(f"edition_{self.edition.id}_box_violations"), {})
+
+    def test_box_violations_use_a_fixed_number_of_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            violations = self.edition.get_box_violations()
+
+        self.assertEqual(violations, {})
+        # boxes, pack aggregates per box and empty packs, whatever the box count
+        self.assertLessEqual(len(context), 3)
+
+    def test_box_violations_are_reported_per_box(self):
+        first, second = Box.objects.filter(edition=self.edition).order_by("pk")[:2]
+        moved = first.packs.filter(has_prize=True).first()
+        moved.box = second
+        moved.save()
+        emptied = second.packs.filter(has_prize=False).first()
+        emptied.stickers.all().delete()
+
+        violations = self.edition.get_box_violations()
+
+        self.assertEqual(
+            violations,
+            {
+                first.pk: [
+                    ("prize_distribution", "1 prize packs, expected 2"),
+                    ("pack_counts", "99 packs, expected 100"),
+                ],
+                second.pk: [
+                    ("prize_distribution", "3 prize packs, expected 2"),
+                    ("pack_counts", "101 packs, expected 100"),
+                    ("box_integrity", "1 packs without stickers"),
+                ],
+            },
+        )
+        self.assertFalse(self.edition.validate_prize_distribution())
+        self.assertFalse(self.edition.validate_box_integrity())
+
     def test_boxes_content(self):
         boxes = Box.objects.filter(edition=self.edition).order_by("pk")
 
@@ -715,6 +827,60 @@ class PackTestCase(TestCase):
 
                 pack_counter += 1
 
+    def test_open_increments_stats(self):
+        user = UserFactory()
+        pack = Pack.objects.all().first()
+
+        # the increment waits for the opening to commit
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            pack.open(user)
+            pack.open(user)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(EditionStats.objects.get(edition=self.edition).packs_opened, 1)
+
+    def test_open_marks_copies_in_the_same_pack_as_repeated(self):
+        user = UserFactory()
+        pack = Pack.objects.filter(has_prize=False).first()
+        stickers = list(pack.stickers.order_by("ordinal"))
+        pack.stickers.update(coordinate=stickers[0].coordinate)
+
+        pack.open(user)
+
+        first, *copies = pack.stickers.order_by("ordinal")
+        self.assertTrue(first.on_the_board)
+        self.assertFalse(first.is_repeated)
+        self.assertEqual(len(copies), len(stickers) - 1)
+
+        for sticker in copies:
+            self.assertTrue(sticker.is_repeated)
+            self.assertFalse(sticker.on_the_board)
+
+    def test_open_queries_do_not_grow_with_stickers(self):
+        user = UserFactory()
+        packs = list(Pack.objects.all()[:2])
+        packs[0].open(user)
+
+        # update pack, edition, stickers, ownership counts, bulk update,
+        # ownership insert and increment, album version, inside a savepoint;
+        # stats are incremented after the commit
+        with self.assertNumQueries(10):
+            packs[1].open(user)
+
+    @skipUnless(connection.vendor == "postgresql", "SELECT FOR UPDATE OF")
+    def test_open_many_locks_only_the_packs(self):
+        user = UserFactory()
+        Pack.objects.filter(pk__in=Pack.objects.order_by("pk")[:2]).update(
+            collector=user
+        )
+
+        with CaptureQueriesContext(connection) as context:
+            Pack.open_many(user, self.edition.collection_id)
+
+        locking = [query["sql"] for query in context if "FOR UPDATE" in query["sql"]]
+        self.assertEqual(len(locking), 1)
+        self.assertIn('FOR UPDATE OF "editions_pack"', locking[0])
+
     def test_box_open_method(self):
         user = UserFactory()
         pack = Pack.objects.all().first()
@@ -727,3 +893,88 @@ class PackTestCase(TestCase):
             if sticker.number == 0:
                 self.assertFalse(sticker.on_the_board)
                 self.assertFalse(sticker.is_repeated)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class OwnershipTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PromotionFactory()
+        cls.collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+        cls.edition = EditionFactory(collection=cls.collection)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = CollectorFactory(user=UserFactory()).user
+
+    def owned(self, user=None):
+        return Ownership.counts(user or self.user, self.collection.id)
+
+    def test_open_counts_every_copy(self):
+        pack = Pack.objects.filter(has_prize=False).first()
+        stickers = list(pack.stickers.order_by("ordinal"))
+        pack.stickers.update(coordinate=stickers[0].coordinate)
+
+        pack.open(self.user)
+        pack.open(self.user)
+
+        self.assertEqual(self.owned(), {stickers[0].coordinate_id: len(stickers)})
+
+        for sticker in pack.stickers.all():
+            self.assertTrue(sticker.check_is_repeated())
+
+    def test_rescue_moves_a_copy(self):
+        pack = Pack.objects.filter(has_prize=False).first()
+        pack.open(self.user)
+        sticker = pack.stickers.first()
+        copies = self.owned()[sticker.coordinate_id]
+        rescuer = CollectorFactory(user=UserFactory()).user
+
+        sticker.rescue(rescuer)
+
+        self.assertEqual(self.owned(rescuer), {sticker.coordinate_id: 1})
+        self.assertEqual(self.owned().get(sticker.coordinate_id, 0), copies - 1)
+        self.assertFalse(sticker.check_is_repeated())
+
+    def test_add_never_goes_below_zero(self):
+        pack = Pack.objects.filter(has_prize=False).first()
+        pack.open(self.user)
+        coordinate = pack.stickers.first().coordinate_id
+
+        Ownership.add(self.user.id, self.collection.id, {coordinate: -10})
+
+        self.assertEqual(
+            Ownership.objects.get(collector=self.user, coordinate=coordinate).count,
+            0,
+        )
+
+    def test_open_and_rescue_match_a_rebuild(self):
+        packs = list(Pack.objects.order_by("id")[:6])
+
+        for pack in packs:
+            pack.open(self.user)
+
+        repeated = Sticker.objects.filter(collector=self.user, is_repeated=True)
+
+        if repeated.exists():
+            repeated.first().rescue(CollectorFactory(user=UserFactory()).user)
+
+        expected = set(
+            Ownership.objects.values_list("collector", "coordinate", "count")
+        )
+        Ownership.rebuild(self.collection)
+
+        self.assertEqual(
+            set(Ownership.objects.values_list("collector", "coordinate", "count")),
+            expected,
+        )
+        self.assertEqual(
+            sum(self.owned().values()),
+            Sticker.objects.filter(collector=self.user).count(),
+        )
@@ -0,0 +1,176 @@
+import shutil
+import tempfile
+from unittest import mock, skipIf, skipUnless
+
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from promotions.test.factories import PromotionFactory
+from collection_manager.test.factories import CollectionFactory
+from ..generation import EditionPlanner
+from ..models import Edition, Pack, Sticker
+from ..partitioning import (
+    PARTITIONED_TABLES,
+    is_partitioned,
+    partition_name,
+    partition_tables,
+)
+from ..teardown import EditionTeardown
+from .factories import EditionFactory
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def partitions_of(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT inhrelid::regclass::text FROM pg_inherits "
+            "WHERE inhparent = %s::regclass",
+            [table],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def foreign_keys_into(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conrelid::regclass::text, pg_get_constraintdef(oid) "
+            "FROM pg_constraint WHERE contype = 'f' AND confrelid = %s::regclass",
+            [table],
+        )
+        return dict(cursor.fetchall())
+
+
+@skipIf(connection.vendor == "postgresql", "Partitioning is PostgreSQL only")
+class PartitioningUnsupportedTestCase(TestCase):
+    def test_other_databases_are_left_as_they_are(self):
+        self.assertEqual(partition_tables(), [])
+        self.assertFalse(is_partitioned("editions_sticker"))
+
+
+@skipUnless(connection.vendor == "postgresql", "Partitioning is PostgreSQL only")
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PartitioningTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PromotionFactory()
+        cls.collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+        cls.edition = EditionFactory(collection=cls.collection)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.stickers = set(Sticker.objects.values_list("id", "coordinate_id"))
+        self.last_sticker_id = max(id for id, _ in self.stickers)
+        # DDL is transactional, each test rolls the partitioning back, unless
+        # the test database was migrated with EDITIONS_PARTITIONED
+        partition_tables()
+
+    def test_rows_move_to_the_edition_partition(self):
+        for table in PARTITIONED_TABLES:
+            self.assertTrue(is_partitioned(table))
+            self.assertEqual(
+                partitions_of(table),
+                {f"{table}_default", partition_name(table, self.edition.pk)},
+            )
+
+        self.assertEqual(
+            set(Sticker.objects.values_list("id", "coordinate_id")), self.stickers
+        )
+        self.assertEqual(Pack.objects.filter(edition=self.edition).count(), 15)
+        self.assertEqual(partition_tables(), [])
+
+    def test_new_editions_get_partitions_and_new_ids(self):
+        edition = EditionFactory(collection=self.collection)
+
+        self.assertIn(
+            partition_name("editions_sticker", edition.pk),
+            partitions_of("editions_sticker"),
+        )
+        self.assertGreater(
+            edition.stickers.order_by("id").first().id, self.last_sticker_id
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "EXPLAIN SELECT * FROM editions_sticker WHERE edition_id = %s",
+                [edition.pk],
+            )
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+
+        self.assertIn(partition_name("editions_sticker", edition.pk), plan)
+        self.assertNotIn(partition_name("editions_sticker", self.edition.pk), plan)
+
+    def test_new_partitions_are_attached_before_generation(self):
+        with CaptureQueriesContext(connection) as queries:
+            with mock.patch.object(EditionPlanner, "write", side_effect=RuntimeError):
+                with self.assertRaises(RuntimeError):
+                    EditionFactory(collection=self.collection)
+
+        statements = [query["sql"] for query in queries.captured_queries]
+        self.assertFalse(any("PARTITION OF" in sql for sql in statements))
+        self.assertTrue(any("ATTACH PARTITION" in sql for sql in statements))
+
+        # the partitions outlive the rolled back edition, they were created in
+        # a transaction of their own
+        created = partitions_of("editions_sticker") - {
+            "editions_sticker_default",
+            partition_name("editions_sticker", self.edition.pk),
+        }
+        self.assertEqual(len(created), 1)
+        self.assertEqual(Edition.objects.count(), 1)
+
+    def test_incoming_foreign_keys_are_kept(self):
+        into_packs = foreign_keys_into("editions_pack")
+        into_stickers = foreign_keys_into("editions_sticker")
+
+        self.assertIn(
+            "(pack_id, edition_id) REFERENCES editions_pack(id, edition_id)",
+            into_packs["editions_sticker"],
+        )
+        self.assertIn(
+            "(pack_id, pack_edition_id) REFERENCES editions_pack(id, edition_id)",
+            into_packs["commerce_saledetail"],
+        )
+
+        for referencing in ("albums_slot", "editions_stickerprize"):
+            self.assertIn(
+                "(sticker_id, sticker_edition_id) "
+                "REFERENCES editions_sticker(id, edition_id)",
+                into_stickers[referencing],
+            )
+
+    def test_referenced_stickers_cannot_be_deleted(self):
+        sticker = self.edition.stickers.filter(coordinate__absolute_number=0).first()
+        sticker.discover_prize()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT sticker_edition_id FROM editions_stickerprize "
+                "WHERE sticker_id = %s",
+                [sticker.pk],
+            )
+            self.assertEqual(cursor.fetchone()[0], self.edition.pk)
+
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+                cursor.execute(
+                    "DELETE FROM editions_sticker WHERE id = %s", [sticker.pk]
+                )
+
+    def test_teardown_drops_the_partitions(self):
+        done = EditionTeardown(self.edition).run()
+
+        self.assertEqual(done["packs"], 15)
+        self.assertEqual(done["stickers"], len(self.stickers))
+        self.assertFalse(Edition.objects.exists())
+        self.assertFalse(Sticker.objects.exists())
+        self.assertEqual(
+            partitions_of("editions_sticker"), {"editions_sticker_default"}
+        )
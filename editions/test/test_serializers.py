@@ -41,13 +41,13 @@ class PackSerializerTest(TestCase):
         super().tearDownClass()
 
     def test_pack_serialization(self):
+        self.pack.open(self.collector.user)
         serializer = PackSerializer(instance=self.pack)
         data = serializer.data
         stickers_data = serializer.data["stickers"]
 
         self.assertEqual(data["id"], self.pack.id)
-        self.assertIsNone(data["collector"])
-        self.assertEqual(data["is_open"], False)
+        self.assertEqual(data["is_open"], True)
         self.assertTrue("stickers" in data)
         self.assertEqual(len(data["stickers"]), 3)
 
@@ -59,7 +59,6 @@ class PackSerializerTest(TestCase):
             self.assertIn("ordinal", sticker)
             self.assertIn("number", sticker)
             self.assertIn("on_the_board", sticker)
-            self.assertFalse(sticker["is_repeated"])
             self.assertIsInstance(sticker["id"], int)
             self.assertIsInstance(sticker["ordinal"], int)
             self.assertIsInstance(sticker["on_the_board"], bool)
@@ -70,9 +69,34 @@ class PackSerializerTest(TestCase):
             self.assertIsInstance(coordinate_data["absolute_number"], int)
             self.assertIsNotNone(coordinate_data["image"])
 
+        self.assertEqual(
+            [coordinate["id"] for coordinate in data["contents"]],
+            [sticker["coordinate"]["id"] for sticker in stickers_data],
+        )
+
+    def test_sealed_pack_serialization_does_not_read_stickers(self):
+        with self.assertNumQueries(1):
+            data = PackSerializer(instance=self.pack).data
+
+        self.assertIsNone(data["collector"])
+        self.assertEqual(data["is_open"], False)
+        self.assertEqual(data["stickers"], [])
+        self.assertEqual(
+            [coordinate["id"] for coordinate in data["contents"]],
+            list(
+                self.pack.stickers.order_by("ordinal").values_list(
+                    "coordinate_id", flat=True
+                )
+            ),
+        )
+
+        for coordinate_data in data["contents"]:
+            self.assertIsInstance(coordinate_data["absolute_number"], int)
+            self.assertIsNotNone(coordinate_data["image"])
+
     def test_serializer_expected_fields(self):
         serializer = PackSerializer(instance=self.pack)
-        expected_fields = {"id", "collector", "is_open", "stickers"}
+        expected_fields = {"id", "collector", "is_open", "contents", "stickers"}
 
         self.assertEqual(set(serializer.data.keys()), expected_fields)
 
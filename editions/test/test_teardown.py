@@ -0,0 +1,165 @@
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, models
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from promotions.test.factories import PromotionFactory
+from albums.models import Album, Slot
+from albums.test.factories import AlbumFactory
+from authentication.test.factories import UserFactory
+from collection_manager.test.factories import CollectionFactory
+from commerce.models import Order, SaleDetail
+from commerce.test.factories import OrderFactory, SaleFactory
+from users.test.factories import CollectorFactory, DealerFactory
+from ..models import (
+    Box,
+    Edition,
+    EditionStats,
+    Ownership,
+    Pack,
+    Sticker,
+    StickerPrize,
+)
+from ..teardown import EditionTeardown
+from .factories import EditionFactory
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class EditionTeardownTestCase(TestCase):
+    def setUp(self):
+        PromotionFactory()
+        collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+        self.edition = EditionFactory(collection=collection, circulation=20)
+        self.other = EditionFactory(collection=collection)
+        dealer = DealerFactory(user=UserFactory())
+        collector = CollectorFactory(user=UserFactory())
+        OrderFactory(dealer=dealer.user, collection=collection)
+        self.sale = SaleFactory(
+            collection=collection, dealer=dealer.user, collector=collector.user
+        )
+        self.prize_sticker = self.edition.stickers.filter(
+            coordinate__absolute_number=0
+        ).first()
+        self.prize_sticker.discover_prize()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_count_reports_every_step(self):
+        counts = EditionTeardown(self.edition).count()
+
+        self.assertEqual(counts["boxes"], 3)
+        self.assertEqual(counts["packs"], 296)
+        self.assertEqual(counts["stickers"], self.edition.stickers.count())
+        self.assertEqual(counts["orders"], 1)
+        self.assertEqual(counts["sale details"], 1)
+        self.assertEqual(counts["sticker prizes"], 1)
+        self.assertEqual(Edition.objects.count(), 2)
+
+    def test_run_removes_only_the_edition(self):
+        other_stickers = self.other.stickers.count()
+        progress = []
+
+        done = EditionTeardown(
+            self.edition,
+            chunk_size=100,
+            progress=lambda *args: progress.append(args),
+        ).run()
+
+        self.assertEqual(done["boxes"], 3)
+        self.assertEqual(done["packs"], 296)
+        self.assertFalse(Edition.objects.filter(pk=self.edition.pk).exists())
+        self.assertFalse(EditionStats.objects.filter(edition_id=self.edition.pk))
+        self.assertFalse(Box.objects.filter(edition_id=self.edition.pk).exists())
+        self.assertFalse(Pack.objects.filter(edition_id=self.edition.pk).exists())
+        self.assertFalse(Sticker.objects.filter(edition_id=self.edition.pk).exists())
+        self.assertFalse(StickerPrize.objects.exists())
+        self.assertFalse(Order.objects.exists())
+        # sale details keep the sale, as with on_delete=SET_NULL
+        self.assertIsNone(SaleDetail.objects.get(sale=self.sale).pack)
+        self.assertEqual(self.other.stickers.count(), other_stickers)
+        self.assertEqual(progress[-1][0], "boxes")
+        self.assertEqual(progress[-1][2], 1)
+
+    def test_run_uses_statements_per_chunk(self):
+        with CaptureQueriesContext(connection) as context:
+            EditionTeardown(self.edition, chunk_size=1000000).run()
+
+        # no SELECT of the stickers themselves, only bounds and deletes
+        self.assertFalse(
+            any(
+                query["sql"].startswith('SELECT "editions_sticker"."id", ')
+                for query in context.captured_queries
+            )
+        )
+
+    def test_run_takes_the_stickers_off_ownership(self):
+        collector = CollectorFactory(user=UserFactory()).user
+
+        for edition in (self.edition, self.other):
+            for pack in edition.packs.order_by("id")[:3]:
+                pack.open(collector)
+
+        album = AlbumFactory(collector=collector, collection=self.edition.collection)
+        placed = self.edition.stickers.filter(
+            collector=collector, coordinate__absolute_number__gt=0
+        ).first()
+        Slot.objects.get(
+            page__album=album, absolute_number=placed.coordinate.absolute_number
+        ).place_sticker(placed)
+
+        EditionTeardown(self.edition, chunk_size=100).run()
+
+        # rows of coordinates no longer owned stay, with no copies
+        expected = set(
+            Ownership.objects.filter(count__gt=0).values_list(
+                "collector", "coordinate", "count"
+            )
+        )
+        Ownership.rebuild(self.edition.collection)
+
+        self.assertEqual(
+            set(Ownership.objects.values_list("collector", "coordinate", "count")),
+            expected,
+        )
+
+    def test_run_bumps_the_album_versions_of_collectors(self):
+        collector = CollectorFactory(user=UserFactory()).user
+        bystander = CollectorFactory(user=UserFactory()).user
+        album = AlbumFactory(collector=collector, collection=self.edition.collection)
+        untouched = AlbumFactory(
+            collector=bystander, collection=self.edition.collection
+        )
+
+        self.edition.packs.order_by("id").first().open(collector)
+        self.other.packs.order_by("id").first().open(bystander)
+        album.refresh_from_db()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            EditionTeardown(self.edition, chunk_size=100).run()
+
+        self.assertGreater(
+            Album.current_version(collector.id, self.edition.collection_id)[1],
+            album.version,
+        )
+        untouched.refresh_from_db()
+        self.assertEqual(untouched.version, 1)
+
+    def test_unsupported_on_delete_is_reported(self):
+        relation = SaleDetail._meta.get_field("pack").remote_field
+
+        with patch.object(relation, "on_delete", models.PROTECT):
+            with self.assertRaisesMessage(
+                ImproperlyConfigured, "commerce.SaleDetail.pack references Pack"
+            ):
+                EditionTeardown(self.edition).get_steps()
@@ -14,7 +14,7 @@ from collection_manager.test.factories import CollectionFactory
 from promotions.models import Promotion
 from promotions.test.factories import PromotionFactory
 from users.test.factories import CollectorFactory
-from ..models import Sticker, Edition
+from ..models import EditionGeneration, Sticker, Edition
 from .factories import EditionFactory
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp()
@@ -198,6 +198,59 @@ class EditionViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
         self.assertEqual(response.data, expected_data)
 
+    def test_superuser_can_get_generation_progress(self):
+        edition = Edition.objects.first()
+        EditionGeneration.objects.create(
+            edition=edition,
+            seed=1,
+            status="running",
+            stage="packs",
+            rows_done=100,
+            rows_total=400,
+        )
+        superuser = UserFactory(is_superuser=True)
+        self.client.force_authenticate(user=superuser)
+        url = reverse("edition-generation", kwargs={"pk": edition.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "running")
+        self.assertEqual(response.data["stage"], "packs")
+        self.assertEqual(response.data["progress"], 0.25)
+        self.assertIsNone(response.data["eta_seconds"])
+
+    def test_only_superusers_can_get_generation_progress(self):
+        url = reverse("edition-generation", kwargs={"pk": Edition.objects.first().pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_generation_progress_not_found_for_synchronous_edition(self):
+        superuser = UserFactory(is_superuser=True)
+        self.client.force_authenticate(user=superuser)
+        url = reverse("edition-generation", kwargs={"pk": Edition.objects.first().pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_superuser_can_get_stats(self):
+        edition = Edition.objects.first()
+        superuser = UserFactory(is_superuser=True)
+        self.client.force_authenticate(user=superuser)
+        url = reverse("edition-stats", kwargs={"pk": edition.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["boxes"], edition.boxes.count())
+        self.assertEqual(response.data["packs"], edition.packs.count())
+        self.assertEqual(response.data["packs_sold"], 0)
+
+    def test_only_superusers_can_get_stats(self):
+        url = reverse("edition-stats", kwargs={"pk": Edition.objects.first().pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class RescueStickerViewTest(APITestCase):
@@ -299,3 +352,68 @@ class RescueStickerViewTest(APITestCase):
             response.data["detail"],
             'Método "GET" no permitido.',
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CompletionSimulationViewTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        PromotionFactory()
+        cls.collection = CollectionFactory(
+            album_template__with_coordinate_images=True, with_prizes_defined=True
+        )
+        cls.url = reverse(
+            "collection-completion", kwargs={"collection_id": cls.collection.id}
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_superuser_can_simulate_completion(self):
+        self.client.force_authenticate(user=UserFactory(is_superuser=True))
+        response = self.client.get(
+            self.url, {"collectors": 1000, "circulation": 250, "seed": 1}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["collectors"], 1000)
+        self.assertTrue(response.data["rescue"])
+        self.assertEqual(sorted(response.data["pages"]), [1, 2, 3, 4])
+        self.assertGreater(response.data["album"]["p99"], 0)
+
+    def test_only_superusers_can_simulate_completion(self):
+        self.client.force_authenticate(user=UserFactory())
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            response.data["detail"],
+            "Sólo los  superusuarios pueden realizar esta acción",
+        )
+
+    def test_unauthenticated_user_cannot_simulate_completion(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_simulate_completion_rejects_invalid_parameters(self):
+        self.client.force_authenticate(user=UserFactory(is_superuser=True))
+
+        for params in (
+            {"collectors": "many"},
+            {"collectors": 0},
+            {"collectors": 10000000},
+            {"circulation": 1},
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_simulate_completion_of_nonexistent_collection(self):
+        self.client.force_authenticate(user=UserFactory(is_superuser=True))
+        response = self.client.get(
+            reverse("collection-completion", kwargs={"collection_id": 999})
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
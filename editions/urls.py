@@ -1,6 +1,6 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
-from .views import EditionViewSet, RescueStickerView
+from .views import CompletionSimulationView, EditionViewSet, RescueStickerView
 
 router = DefaultRouter()
 
@@ -13,4 +13,9 @@ urlpatterns = [
         RescueStickerView.as_view(),
         name="rescue-sticker",
     ),
+    path(
+        "collections/<int:collection_id>/completion/",
+        CompletionSimulationView.as_view(),
+        name="collection-completion",
+    ),
 ]
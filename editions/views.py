@@ -10,9 +10,14 @@ from utils.exceptions import DetailedPermissionDenied
 from albums.permissions import IsAuthenticatedCollector
 from collection_manager.models import Collection
 from promotions.models import Promotion
-from .permissions import EditionPermission
-from .serializers import EditionSerializer
-from .models import Edition, Sticker
+from .completion import CompletionSimulator
+from .permissions import EditionPermission, IsSuperuser
+from .serializers import (
+    EditionGenerationSerializer,
+    EditionSerializer,
+    EditionStatsSerializer,
+)
+from .models import Edition, EditionGeneration, Sticker
 from django.core.exceptions import ValidationError as DjangoValidationError
 
 
@@ -58,6 +63,23 @@ class EditionViewSet(ReadOnlyModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @action(detail=True, methods=["get"])
+    def generation(self, request, pk=None):
+        """Progress of an edition generated in the background"""
+        try:
+            generation = EditionGeneration.objects.get(edition_id=pk)
+        except EditionGeneration.DoesNotExist:
+            raise Http404
+
+        return Response(EditionGenerationSerializer(generation).data)
+
+    @action(detail=True, methods=["get"])
+    def stats(self, request, pk=None):
+        """Rollup counters of an edition, read from a single row"""
+        edition = self.get_object()
+
+        return Response(EditionStatsSerializer(edition.get_stats()).data)
+
     def handle_exception(self, exc):
 
         if isinstance(exc, DetailedPermissionDenied):
@@ -92,3 +114,67 @@ class RescueStickerView(APIView):
             return Response(
                 {"detail": "Sticker not found"}, status=status.HTTP_404_NOT_FOUND
             )
+
+
+class CompletionSimulationView(APIView):
+    """
+    Monte-Carlo estimate of the packs needed to complete a collection,
+    see editions.completion.CompletionSimulator
+    """
+
+    permission_classes = [IsSuperuser]
+    # the simulation runs inside the request, bigger runs belong to the
+    # simulate_completion command
+    MAX_COLLECTORS = 100000
+    DEFAULT_COLLECTORS = 10000
+
+    def get(self, request, collection_id):
+        try:
+            collection = Collection.objects.select_related("album_template").get(
+                id=collection_id
+            )
+        except Collection.DoesNotExist:
+            return Response(
+                {"detail": "No encontrado."}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            collectors = int(
+                request.query_params.get("collectors", self.DEFAULT_COLLECTORS)
+            )
+            circulation = request.query_params.get("circulation")
+            circulation = int(circulation) if circulation else None
+            seed = request.query_params.get("seed")
+            seed = int(seed) if seed else None
+        except ValueError:
+            return Response(
+                {"detail": "Los parámetros deben ser números enteros"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not 0 < collectors <= self.MAX_COLLECTORS:
+            return Response(
+                {
+                    "detail": "El número de coleccionistas debe estar entre 1 y "
+                    f"{self.MAX_COLLECTORS}"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        rescue = request.query_params.get("rescue", "true").lower() != "false"
+
+        try:
+            simulator = CompletionSimulator(
+                collection, circulation=circulation, seed=seed
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(simulator.run(collectors, rescue=rescue))
+
+    def handle_exception(self, exc):
+
+        if isinstance(exc, DetailedPermissionDenied):
+            return Response({"detail": str(exc.detail)}, status=exc.status_code)
+
+        return super().handle_exception(exc)
@@ -20,6 +20,7 @@ from django.core.management.utils import get_random_secret_key
 from django.contrib.auth import password_validation
 import dotenv
 from datetime import timedelta
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -82,6 +83,34 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "America/Caracas"
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+# DatabaseScheduler adds these entries to its periodic tasks when beat starts
+CELERY_BEAT_SCHEDULE = {
+    # only creates the albums still missing, so new collectors and
+    # collections get theirs by the next morning
+    "provision-albums": {
+        "task": "albums.tasks.provision_albums",
+        "schedule": crontab(hour=3, minute=0),
+    },
+}
+
+# PostgreSQL only: partition the pack and sticker tables by edition when
+# migrating (see editions.partitioning)
+EDITIONS_PARTITIONED = getenv("EDITIONS_PARTITIONED", "False") == "True"
+
+# Caché de snapshots de álbumes: Redis en producción, memoria local en desarrollo
+if DEVELOPMENT_MODE is True:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": getenv("CACHE_URL", "redis://localhost:6379/1"),
+        }
+    }
 
 # Configuración de logging
 LOGGING = {
@@ -72,7 +72,7 @@ class Dealer(BaseProfile):
 
         query = Pack.objects.filter(
             box__order__dealer=self.user,
-            box__edition__collection_id=collection_id,
+            edition__collection_id=collection_id,
             sale__isnull=True,
         )
 